@@ -0,0 +1,125 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from photo_metadata_journal import JOURNAL_FILENAME, read_journal
+from photo_metadata_match import MatchIndex, candidate_keys, sidecar_media_name
+
+def _safe_destination(dest_root, member_name):
+    """Return dest_root/member_name, or None if the member would escape dest_root."""
+    parts = PurePosixPath(member_name.replace("\\", "/")).parts
+    if not parts or parts[0] == "/" or ".." in parts or ":" in parts[0]:
+        return None
+    return Path(dest_root, *parts)
+
+def _write_once(dest, source):
+    """Copy source into dest unless an earlier run already finished writing it.
+
+    Files are written under a ``.partial`` name and renamed when complete, so
+    an existing dest is whole (and may already have been patched).
+    """
+    if dest.exists():
+        return False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".partial")
+    with open(tmp, "wb") as out:
+        shutil.copyfileobj(source, out, 1024 * 1024)
+    os.replace(tmp, dest)
+    return True
+
+def _moved_away(dest_root):
+    """Return the relative paths of files an earlier run moved elsewhere in dest_root.
+
+    Runs move unmatched and used sidecars (and parked duplicates) through
+    the :class:`~photo_metadata_journal.FileJournal`; a move counts while
+    its destination still exists, so undone moves are extracted again.
+    """
+    path = dest_root / JOURNAL_FILENAME
+    if not path.exists():
+        return set()
+    return {src for src, dst in read_journal(path) if os.path.lexists(dest_root / dst)}
+
+def _iter_members(archive_path):
+    """Yield (name, open_member) for every regular file in one archive part.
+
+    Zip parts are read through their central directory. Tar parts are
+    streamed, so ``open_member`` is only valid until the next member.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    yield info.filename, lambda info=info: zf.open(info)
+        return
+    with tarfile.open(archive_path, "r|*") as tf:
+        for member in tf:
+            if member.isfile():
+                yield member.name, lambda member=member: tf.extractfile(member)
+
+def extract_matched_media(archive_paths, dest_root, media_exts):
+    """Build a patchable export tree in dest_root from Takeout archive parts.
+
+    The first pass reads every part's listing, streaming sidecar JSON members
+    straight into dest_root and noting the title each one refers to. Media
+    members are then extracted only when some sidecar, in any part, matches
+    them by one of the names :func:`~photo_metadata_match.candidate_keys`
+    tries, resolves to them through a
+    :class:`~photo_metadata_match.MatchIndex` over every part's media (so
+    ``img(1).jpg`` is kept for an ``img.jpg`` sidecar whose photo is
+    missing) or sits next to them. Files extracted by an earlier run are left
+    alone, and so are sidecars a run over dest_root has since moved away
+    (to ``Unmatched_Metadata`` or ``Used_Metadata``), which would otherwise
+    be processed twice. Returns ``(sidecars_written, media_extracted)``.
+    """
+    dest_root = Path(dest_root)
+    moved = _moved_away(dest_root)
+    titles = set()
+    sidecar_titles = []
+    adjacent = set()
+    media_members = {}
+    sidecars = 0
+    for part in archive_paths:
+        for name, open_member in _iter_members(part):
+            dest = _safe_destination(dest_root, name)
+            if dest is None:
+                print(f"Skipping unsafe archive member '{name}' in {part}")
+                continue
+            base = PurePosixPath(name).name
+            media_name = sidecar_media_name(base, media_exts)
+            if media_name is not None:
+                with open_member() as src:
+                    raw = src.read()
+                try:
+                    data = json.loads(raw)
+                except (ValueError, UnicodeDecodeError):
+                    data = None
+                title = data.get("title", "").lower() if isinstance(data, dict) else ""
+                titles.update(candidate_keys(base, title, media_exts))
+                sidecar_titles.append((base, title))
+                adjacent.add(str(PurePosixPath(name).with_name(media_name)))
+                if dest.relative_to(dest_root).as_posix() not in moved:
+                    _write_once(dest, io.BytesIO(raw))
+                sidecars += 1
+            elif os.path.splitext(base)[1].lower() in media_exts:
+                media_members.setdefault(part, {})[name] = base.lower()
+
+    match = MatchIndex({base for members in media_members.values() for base in members.values()}, media_exts)
+    titles.update(match.resolve(base, title) for base, title in sidecar_titles)
+    wanted = {
+        part: {name for name, base in members.items() if base in titles or name in adjacent}
+        for part, members in media_members.items()
+    }
+    extracted = 0
+    for part, names in wanted.items():
+        if not names:
+            continue
+        for name, open_member in _iter_members(part):
+            if name not in names:
+                continue
+            with open_member() as src:
+                if _write_once(_safe_destination(dest_root, name), src):
+                    extracted += 1
+    return sidecars, extracted
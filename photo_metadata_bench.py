@@ -0,0 +1,245 @@
+import json
+import os
+import platform
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import argparse
+
+from photo_metadata_patch import (
+    MEDIA_EXTENSIONS,
+    PlanContext,
+    build_url_index,
+    classify_duplicates,
+    index_duplicate_groups,
+    load_sidecars,
+    plan_sidecars,
+    scan_export,
+)
+from photo_metadata_decode import SidecarDecoder, decode_generic
+from photo_metadata_exiftool import ExifTool, ExifToolPool
+from photo_metadata_report import ReportWriter
+from photo_metadata_state import RunState
+from photo_metadata_synth import SynthConfig, generate_export
+
+PHASES = ["scan", "parse", "decode_generic", "decode", "classify", "plan", "exiftool", "report"]
+
+# Speaks exiftool's -stay_open protocol without touching any file, so the
+# exiftool phase measures dispatch overhead rather than Perl.
+EXIFTOOL_STUB = r'''
+import sys
+echo = {}
+pending = None
+for line in sys.stdin:
+    line = line.rstrip("\n")
+    if pending is not None:
+        echo.setdefault(pending, []).append(line.replace("${status}", "0"))
+        pending = None
+    elif line.startswith("-echo") and line[5:].isdigit():
+        pending = int(line[5:])
+    elif line.startswith("-execute"):
+        for n, stream in ((1, sys.stdout), (2, sys.stderr), (3, sys.stdout), (4, sys.stderr)):
+            for text in echo.get(n, []):
+                stream.write(text + "\n")
+        if not echo.get(3):
+            sys.stdout.write("    1 image files updated\n")
+        sys.stdout.write("{ready%s}\n" % line[8:])
+        sys.stdout.flush()
+        sys.stderr.flush()
+        echo = {}
+    elif line == "False":
+        break
+'''
+
+def write_exiftool_stub(directory):
+    """Write an executable exiftool stand-in into directory and return its path."""
+    path = Path(directory, "exiftool-stub")
+    path.write_text(f"#!{sys.executable}\n{EXIFTOOL_STUB}", encoding="utf-8")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+class PhaseTimer:
+    """Collect wall-clock duration and item throughput per phase."""
+
+    def __init__(self):
+        self.phases = {}
+
+    def run(self, name, func, count=None):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        items = count(result) if callable(count) else count
+        self.phases[name] = {
+            "seconds": round(seconds, 6),
+            "items": items,
+            "items_per_sec": round(items / seconds, 1) if items and seconds else None,
+        }
+        return result
+
+def benchmark_export(root, workers=4, executor_mode="threads", exiftool_workers=None, work_dir=None):
+    """Time every pipeline phase on the export at root and return the phase table."""
+    timer = PhaseTimer()
+    scan = timer.run("scan", lambda: scan_export(root, MEDIA_EXTENSIONS), lambda s: len(s.file_stats))
+    documents = timer.run("parse", lambda: load_sidecars(scan.json_paths, workers), len)
+    parsed = [data for data in documents.values() if data]
+    # Per-sidecar CPU of the plan stage's field extraction: walking each
+    # document versus the decoder compiled once per shape (a fresh one, so
+    # learning the shapes is part of the measurement).
+    timer.run("decode_generic", lambda: [decode_generic(data) for data in parsed], len)
+    decode = SidecarDecoder()
+    timer.run("decode", lambda: [decode(data) for data in parsed], len)
+
+    def classify():
+        group_urls = index_duplicate_groups(scan.media_index, build_url_index(scan.sidecar_index, documents))
+        for data in documents.values():
+            if data:
+                title = data.get("title", "").lower()
+                classify_duplicates(scan.media_index.get(title, []), data.get("url", ""),
+                                    group_urls.get(title, set()))
+        return group_urls
+
+    group_urls = timer.run("classify", classify, len(documents))
+    ctx = PlanContext(scan.media_index, group_urls, scan.file_stats, dry_run=False)
+    plans = timer.run(
+        "plan",
+        lambda: list(plan_sidecars(documents.items(), ctx, workers=workers, mode=executor_mode,
+                                   count=len(documents))),
+        len,
+    )
+    commands = [cmd for _, cmd, _ in plans if cmd]
+
+    if ExifTool is None:
+        timer.phases["exiftool"] = {"skipped": "pyexiftool not installed"}
+    else:
+        def execute():
+            with ExifToolPool(exiftool_workers or workers, executable=str(write_exiftool_stub(work_dir))) as pool:
+                futures = [pool.submit(cmd) for cmd in commands]
+            return [f.exception() for f in futures]
+        timer.run("exiftool", execute, len(commands))
+
+    def report():
+        with ReportWriter(Path(work_dir, "bench_report.csv")) as writer:
+            for rows, _, _ in plans:
+                writer.write_rows(rows)
+        return writer.count
+
+    timer.run("report", report, lambda count: count)
+    return timer.phases
+
+# Started in a fresh interpreter each, as the GUIs and scripts do; the
+# timings include interpreter startup, which "python" measures alone.
+STARTUP_IMPORTS = ["photo_metadata_state", "photo_metadata_patch", "photo_metadata_gui"]
+
+def _startup_seconds(args, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=Path(__file__).parent, capture_output=True, check=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return round(best, 6)
+
+def benchmark_startup(repeat=5, count=50):
+    """Return the best-of-repeat wall time of importing each module and of the quick CLI commands.
+
+    Tracks how long a fresh interpreter takes before it does any work, as
+    the Swift GUI and scripts pay it on every call. The CLI commands run on
+    a generated export of count photos.
+    """
+    timings = {"python": _startup_seconds(["-c", "pass"], repeat)}
+    for module in STARTUP_IMPORTS:
+        try:
+            timings[f"import {module}"] = _startup_seconds(["-c", f"import {module}"], repeat)
+        except subprocess.CalledProcessError:
+            timings[f"import {module}"] = None  # e.g. no tkinter
+    with tempfile.TemporaryDirectory() as scratch:
+        root = Path(scratch, "export")
+        generate_export(root, SynthConfig(count=count))
+        RunState(root).close()
+        timings["cli status"] = _startup_seconds(["photo_metadata_cli.py", "status", str(root)], repeat)
+        timings["cli plan"] = _startup_seconds(
+            ["photo_metadata_cli.py", "plan", str(root), "--argfile", str(Path(scratch, "plan.args"))], repeat
+        )
+    return timings
+
+def git_revision(cwd=None):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=cwd or Path(__file__).parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, work_dir=None, workers=4, executor_mode="threads", seed=0):
+    """Generate (or reuse) one synthetic export per size under work_dir and time each."""
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": workers,
+        "executor": executor_mode,
+        "runs": {},
+    }
+    results["startup"] = benchmark_startup()
+    with tempfile.TemporaryDirectory() as scratch:
+        work_dir = Path(work_dir or scratch)
+        for size in sizes:
+            root = work_dir / f"export-{size}-seed{seed}"
+            if not root.exists():
+                tmp = root.with_name(root.name + ".partial")
+                generate_export(tmp, SynthConfig(count=size, seed=seed))
+                tmp.rename(root)
+            results["runs"][str(size)] = benchmark_export(root, workers, executor_mode, work_dir=scratch)
+    return results
+
+def compare(baseline, current):
+    """Return text lines comparing phase and startup times of two result documents."""
+    lines = [f"{'size':>9} {'phase':<9} {'baseline s':>11} {'current s':>11} {'ratio':>7}"]
+    for size, phases in current["runs"].items():
+        before = baseline.get("runs", {}).get(size, {})
+        for phase in PHASES:
+            new = phases.get(phase, {}).get("seconds")
+            old = before.get(phase, {}).get("seconds")
+            if new is None or old is None:
+                continue
+            ratio = f"{new / old:.2f}x" if old else "-"
+            lines.append(f"{size:>9} {phase:<9} {old:>11.4f} {new:>11.4f} {ratio:>7}")
+    startup = [
+        (name, baseline.get("startup", {}).get(name), new) for name, new in current.get("startup", {}).items()
+    ]
+    startup = [(name, old, new) for name, old, new in startup if old is not None and new is not None]
+    if startup:
+        lines.append(f"{'startup':<33} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+        for name, old, new in startup:
+            ratio = f"{new / old:.2f}x" if old else "-"
+            lines.append(f"{name:<33} {old:>11.4f} {new:>11.4f} {ratio:>7}")
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each pipeline phase on synthetic Takeout exports")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Photo counts to benchmark (e.g. 1000 10000 100000 1000000)")
+    parser.add_argument("--work-dir", help="Keep generated exports here so later runs reuse them")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=("auto", "threads", "processes"), default="threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--startup-only", action="store_true", help="Only time imports and the quick CLI commands")
+    args = parser.parse_args()
+
+    sizes = [] if args.startup_only else args.sizes
+    results = run_benchmarks(sizes, args.work_dir, args.workers, args.executor, args.seed)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"Comparing {baseline.get('revision')} -> {results.get('revision')}")
+        print("\n".join(compare(baseline, results)))
+    else:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,85 @@
+import sys
+from collections import Counter
+
+# Front ends and scripts start a fresh interpreter for every call, so each
+# command imports only what it uses: ``status`` never loads the pipeline,
+# and ``plan`` never loads exiftool, the executors or the EXIF writer.
+
+def export_status(root):
+    """Return text lines describing the run state saved in root, or None if there is none."""
+    from datetime import datetime
+    from photo_metadata_state import summarize_state
+
+    summary = summarize_state(root)
+    if summary is None:
+        return None
+    counts, updated = summary
+    when = datetime.fromtimestamp(updated).strftime("%Y-%m-%d %H:%M:%S") if updated else "never"
+    lines = [f"{sum(counts.values())} sidecars in the run state, last updated {when}"]
+    lines += [f"  {outcome or 'none':<10} {count:>9}" for outcome, count in sorted(counts.items(), key=str)]
+    pending = counts.get("planned", 0) + counts.get("failed", 0)
+    if pending:
+        lines.append(f"{pending} sidecars still to write; running again picks them up")
+    return lines
+
+def plan_to_argfile(root, argfile, workers=1, use_state=True, content_dedup=True, xmp_sidecars=None):
+    """Plan a dry run over root and write its exiftool commands to argfile.
+
+    Nothing in the export changes; ``exiftool -@ argfile`` carries out the
+    plan later, from any directory, since every path in it is absolute. Only
+    sidecars new or changed since the last run are planned (all of them
+    without ``use_state``), and the commands a run would drop (see
+    :meth:`~photo_metadata_patch.Pipeline.decide`) are left out, so each
+    identical copy is written once. Returns the number of sidecars per
+    outcome.
+    """
+    from pathlib import Path
+    from photo_metadata_exiftool import write_argfile
+    from photo_metadata_patch import Pipeline
+
+    outcomes = Counter()
+    commands = []
+    root = Path(root).expanduser().resolve()
+    with Pipeline(root, dry_run=True, parallel_workers=workers, use_state=use_state, read_check=False,
+                  content_dedup=content_dedup, xmp_sidecars=xmp_sidecars, prune_state=False) as pipeline:
+        for planned in pipeline.plan(pipeline.index(pipeline.load(pipeline.changed()))):
+            cmd, outcome = pipeline.decide(planned) if planned.cmd else (None, planned.outcome)
+            outcomes[outcome] += 1
+            if cmd:
+                commands.append(cmd)
+    write_argfile(commands, argfile)
+    return outcomes
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Quick commands that start fast, for scripts and front ends")
+    commands = parser.add_subparsers(dest="command", required=True)
+    status = commands.add_parser("status", help="Summarize the run state saved in an export")
+    status.add_argument("root", help="Path to the Google Photos export root directory")
+    plan = commands.add_parser("plan", help="Dry run: write the exiftool commands a run would execute to an argfile")
+    plan.add_argument("root", help="Path to the Google Photos export root directory")
+    plan.add_argument("--argfile", required=True, help="File to write; apply it with 'exiftool -@ ARGFILE'")
+    plan.add_argument("--workers", type=int, default=1, help="Planning workers (default: 1, fastest for small jobs)")
+    plan.add_argument("--no-state", action="store_true", help="Plan every sidecar, not only new or changed ones")
+    plan.add_argument("--no-content-dedup", action="store_true")
+    plan.add_argument("--xmp-sidecar", action="append", metavar="EXT[:MIN_SIZE]")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        lines = export_status(args.root)
+        if lines is None:
+            print(f"Error: No saved run state in '{args.root}'.", file=sys.stderr)
+            sys.exit(1)
+        print("\n".join(lines))
+    else:
+        from photo_metadata_patch import PipelineError
+
+        try:
+            outcomes = plan_to_argfile(args.root, args.argfile, args.workers, not args.no_state,
+                                       not args.no_content_dedup, args.xmp_sidecar)
+        except (OSError, PipelineError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())) or "Nothing to plan")
+        print(f"Wrote {outcomes['planned']} exiftool commands to {args.argfile}; apply with: exiftool -@ {args.argfile}")
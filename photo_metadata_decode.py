@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+
+# Takeout sidecars come in a handful of layouts, so the compiled decoders
+# stay few; past this many an export is not Takeout-shaped and falls back
+# to the generic path instead of compiling one function per document.
+MAX_SHAPES = 256
+
+def flatten_json(y, parent_key='', sep=':'):
+    items = {}
+    for k, v in y.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.update(flatten_json(v, new_key, sep=sep))
+        else:
+            items[new_key] = v
+    return items
+
+@dataclass
+class SidecarFields:
+    """The fields the plan stage reads from one sidecar, plus the flattened document for its report row.
+
+    ``geo`` is ``(latitude, longitude, altitude)`` or None when the sidecar
+    has no usable location; ``flat`` is what :func:`flatten_json` returns.
+    """
+    __slots__ = ("title", "url", "description", "image_views", "device_type", "timestamp", "geo", "flat")
+    title: str
+    url: str
+    description: str
+    image_views: str
+    device_type: str
+    timestamp: object
+    geo: object
+    flat: dict
+
+def _nested(data, *keys):
+    for key in keys:
+        data = data.get(key, {})
+    return data
+
+def decode_generic(data):
+    """Decode one parsed sidecar by walking it key by key; the reference for compiled decoders."""
+    geo = data.get("geoDataExif", {}) or data.get("geoData", {})
+    return SidecarFields(
+        data.get("title", ""),
+        data.get("url", ""),
+        data.get("description", ""),
+        data.get("imageViews", ""),
+        _nested(data, "googlePhotosOrigin", "mobileUpload").get("deviceType", ""),
+        data.get("photoTakenTime", {}).get("timestamp") or data.get("creationTime", {}).get("timestamp"),
+        (geo.get("latitude"), geo.get("longitude"), geo.get("altitude", 0.0))
+        if "latitude" in geo and "longitude" in geo else None,
+        flatten_json(data),
+    )
+
+def sidecar_shape(data):
+    """Return a hashable description of a document's key layout: keys in order, nested dicts as ``(key, shape)``."""
+    return tuple((k, sidecar_shape(v)) if type(v) is dict else k for k, v in data.items())
+
+class ShapeMismatch(Exception):
+    """Raised by a compiled decoder handed a document of another shape."""
+
+def compile_shape(shape):
+    """Return a function decoding documents of exactly this shape into :class:`SidecarFields`.
+
+    The generated code reads every value with a constant key and builds the
+    flattened dict from a literal with precomputed column names, so none of
+    the per-document key joining, recursion or ``.get`` fallbacks of
+    :func:`decode_generic` remain. It checks the nested layouts it relies on
+    and raises :class:`ShapeMismatch` when they differ.
+    """
+    lines = []
+    entries = []
+    names = {}
+    nested = {}
+
+    def emit(shape, var, path):
+        if path:
+            keys = tuple(item[0] if type(item) is tuple else item for item in shape)
+            lines.append(f"    if type({var}) is not dict or tuple({var}) != {keys!r}: raise ShapeMismatch")
+        for item in shape:
+            name = f"v{len(names)}"
+            if type(item) is tuple:
+                key, sub = item
+                lines.append(f"    {name} = {var}[{key!r}]")
+                names[path + (key,)] = name
+                nested[path + (key,)] = sub
+                emit(sub, name, path + (key,))
+            else:
+                lines.append(f"    {name} = {var}[{item!r}]")
+                lines.append(f"    if type({name}) is dict: raise ShapeMismatch")
+                names[path + (item,)] = name
+                entries.append(f"{':'.join(path + (item,))!r}: {name}")
+
+    def value(*path, default='""'):
+        return names.get(path, default)
+
+    emit(shape, "d", ())
+    timestamps = [names[p] for p in (("photoTakenTime", "timestamp"), ("creationTime", "timestamp")) if p in names]
+    geo = "geoDataExif" if nested.get(("geoDataExif",)) else "geoData"
+    if (geo, "latitude") in names and (geo, "longitude") in names:
+        location = f"({value(geo, 'latitude')}, {value(geo, 'longitude')}, {value(geo, 'altitude', default='0.0')})"
+    else:
+        location = "None"
+    lines.append(
+        f"    return SidecarFields({value('title')}, {value('url')}, {value('description')}, {value('imageViews')}, "
+        f"{value('googlePhotosOrigin', 'mobileUpload', 'deviceType')}, {' or '.join(timestamps) or 'None'}, "
+        f"{location}, {{{', '.join(entries)}}})"
+    )
+    namespace = {"SidecarFields": SidecarFields, "ShapeMismatch": ShapeMismatch}
+    exec("def decode(d):\n" + "\n".join(lines) + "\n", namespace)
+    return namespace["decode"]
+
+class SidecarDecoder:
+    """Decode sidecars with one compiled function per document shape, learned on first sight.
+
+    Lookups go by the top-level keys alone, which is cheap to compute; the
+    compiled function checks the nested layout itself and, when it differs,
+    the full shape picks (or compiles) the right one.
+    """
+
+    def __init__(self, max_shapes=MAX_SHAPES):
+        self.max_shapes = max_shapes
+        self.by_keys = {}
+        self.by_shape = {}
+
+    def __call__(self, data):
+        keys = tuple(data)
+        decode = self.by_keys.get(keys)
+        if decode is not None:
+            try:
+                return decode(data)
+            except ShapeMismatch:
+                pass
+        shape = sidecar_shape(data)
+        decode = self.by_shape.get(shape)
+        if decode is None:
+            if len(self.by_shape) >= self.max_shapes:
+                return decode_generic(data)
+            decode = self.by_shape[shape] = compile_shape(shape)
+        self.by_keys[keys] = decode
+        return decode(data)
+
+decode_sidecar = SidecarDecoder()
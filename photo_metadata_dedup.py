@@ -0,0 +1,144 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+
+# Bytes hashed from each end of a file before deciding whether a full hash
+# is needed. Files up to twice this size are hashed whole in the first pass.
+PARTIAL_BYTES = 4096
+DUPLICATES_DIRNAME = "Duplicates"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT,
+    kind TEXT,
+    size INTEGER,
+    mtime REAL,
+    digest TEXT,
+    PRIMARY KEY (path, kind)
+);
+"""
+
+def _digest():
+    return hashlib.blake2b(digest_size=20)
+
+class HashCache:
+    """Content hashes keyed by path, valid while size and mtime are unchanged.
+
+    With a SQLite ``conn`` (normally the :class:`~photo_metadata_state.RunState`
+    connection) hashes persist across runs; otherwise they live in memory.
+    ``bytes_hashed`` counts the bytes actually read.
+    """
+
+    def __init__(self, conn=None, readonly=False, root=None):
+        self.conn = conn
+        self.readonly = readonly
+        self.root = Path(root) if root else None
+        self.bytes_hashed = 0
+        self._memory = {}
+        if conn is not None and not readonly:
+            conn.executescript(_SCHEMA)
+
+    def _key(self, path):
+        path = Path(path)
+        if self.root is not None:
+            try:
+                return path.relative_to(self.root).as_posix()
+            except ValueError:
+                pass
+        return path.as_posix()
+
+    def get(self, path, size, mtime, kind):
+        key = (self._key(path), kind)
+        found = self._memory.get(key)
+        if found is None and self.conn is not None:
+            try:
+                found = self.conn.execute(
+                    "SELECT size, mtime, digest FROM hashes WHERE path = ? AND kind = ?", key
+                ).fetchone()
+            except sqlite3.OperationalError:
+                found = None
+        if found and found[0] == size and found[1] == mtime:
+            return found[2]
+        return None
+
+    def put(self, path, size, mtime, kind, digest):
+        key = (self._key(path), kind)
+        self._memory[key] = (size, mtime, digest)
+        if self.conn is not None and not self.readonly:
+            self.conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", (*key, size, mtime, digest))
+
+    def hash(self, path, size, mtime, kind):
+        """Return the cached or freshly computed ``"partial"`` or ``"full"`` hash of path."""
+        digest = self.get(path, size, mtime, kind)
+        if digest is None:
+            digest = partial_hash(path, size) if kind == "partial" else full_hash(path)
+            self.bytes_hashed += min(size, 2 * PARTIAL_BYTES) if kind == "partial" else size
+            self.put(path, size, mtime, kind, digest)
+        return digest
+
+def partial_hash(path, size, chunk=PARTIAL_BYTES):
+    """Hash the first and last chunk bytes of path (the whole file if it is small)."""
+    h = _digest()
+    with open(path, "rb") as f:
+        if size <= 2 * chunk:
+            h.update(f.read())
+        else:
+            h.update(f.read(chunk))
+            f.seek(-chunk, 2)
+            h.update(f.read(chunk))
+    return h.hexdigest()
+
+def full_hash(path, block=1024 * 1024):
+    h = _digest()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block), b""):
+            h.update(data)
+    return h.hexdigest()
+
+def _bucket(paths, key):
+    buckets = {}
+    for path in paths:
+        value = key(path)
+        if value is not None:
+            buckets.setdefault(value, []).append(path)
+    return [group for group in buckets.values() if len(group) > 1]
+
+def find_content_groups(paths, file_stats, cache=None):
+    """Return lists of paths with identical content (each with two or more members).
+
+    Only files whose sizes (taken from ``file_stats``, as recorded by
+    :func:`photo_metadata_patch.scan_export`) match are compared. Within a
+    size bucket the first and last :data:`PARTIAL_BYTES` are hashed, and only
+    files that still collide are hashed in full. Unreadable files are left out.
+    """
+    cache = cache if cache is not None else HashCache()
+
+    def hashed(kind):
+        def key(path):
+            size, mtime = file_stats[path]
+            try:
+                return cache.hash(path, size, mtime, kind)
+            except OSError:
+                return None
+        return key
+
+    groups = []
+    for same_size in _bucket(set(paths), lambda p: file_stats[p][0]):
+        for same_ends in _bucket(same_size, hashed("partial")):
+            if file_stats[same_ends[0]][0] <= 2 * PARTIAL_BYTES:
+                groups.append(sorted(same_ends))
+                continue
+            groups.extend(sorted(group) for group in _bucket(same_ends, hashed("full")))
+    return groups
+
+def canonical_copies(groups):
+    """Map every member of each content group to the copy that should be patched.
+
+    The canonical copy is the first member of each group, which
+    :func:`find_content_groups` sorts, so re-runs pick the same one.
+    """
+    canonical = {}
+    for group in groups:
+        for path in group:
+            canonical[path] = group[0]
+    return canonical
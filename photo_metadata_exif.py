@@ -0,0 +1,402 @@
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+
+NATIVE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# TIFF field types and their sizes in bytes.
+BYTE, ASCII, SHORT, LONG, RATIONAL, UNDEFINED = 1, 2, 3, 4, 5, 7
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+MODIFY_DATE, XP_COMMENT = 0x0132, 0x9C9C
+DATE_TIME_ORIGINAL, CREATE_DATE = 0x9003, 0x9004
+EXIF_POINTER, GPS_POINTER, INTEROP_POINTER = 0x8769, 0x8825, 0xA005
+THUMB_OFFSET, THUMB_LENGTH = 0x0201, 0x0202
+GPS_VERSION, GPS_LAT_REF, GPS_LAT, GPS_LON_REF, GPS_LON, GPS_ALT_REF, GPS_ALT = range(7)
+
+MAKER_NOTE = 0x927C
+# Tags holding offsets this writer cannot relocate (most maker notes keep
+# private absolute offsets; strips, tiles and sub-IFDs point at data outside
+# the IFDs).
+UNSUPPORTED_TAGS = {MAKER_NOTE, 0x014A, 0x0111, 0x0144}
+# Maker notes whose offsets are relative to their own start, so they can move.
+RELOCATABLE_MAKER_NOTES = (b"Apple iOS\x00",)
+
+# Write flags the fast path understands; anything else goes to exiftool.
+_FLAGS = {"-overwrite_original_in_place", "-overwrite_original"}
+_TAGS = {
+    "AllDates", "XPComment", "GPSLatitude", "GPSLongitude", "GPSAltitude",
+    "GPSLatitudeRef", "GPSLongitudeRef", "GPSAltitudeRef",
+}
+
+EXIF_HEADER = b"Exif\x00\x00"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class UnsupportedFile(Exception):
+    """Raised when a file needs exiftool instead of the native writer."""
+
+class Entry:
+    """One IFD entry with its value bytes in the file's byte order."""
+    __slots__ = ("type", "count", "data")
+
+    def __init__(self, type, count, data):
+        self.type = type
+        self.count = count
+        self.data = data
+
+def _ascii(text):
+    data = text.encode("ascii") + b"\x00"
+    return Entry(ASCII, len(data), data)
+
+def _long(bo, value):
+    return Entry(LONG, 1, struct.pack(bo + "I", value))
+
+def _rationals(bo, pairs):
+    return Entry(RATIONAL, len(pairs), b"".join(struct.pack(bo + "II", n, d) for n, d in pairs))
+
+def _read_ifd(tiff, offset, bo):
+    try:
+        (count,) = struct.unpack_from(bo + "H", tiff, offset)
+        entries = {}
+        for i in range(count):
+            pos = offset + 2 + 12 * i
+            tag, type, n = struct.unpack_from(bo + "HHI", tiff, pos)
+            if type not in TYPE_SIZES:
+                raise UnsupportedFile(f"unknown TIFF type {type} in tag 0x{tag:04x}")
+            length = TYPE_SIZES[type] * n
+            if length <= 4:
+                data = tiff[pos + 8:pos + 8 + length]
+            else:
+                (value_offset,) = struct.unpack_from(bo + "I", tiff, pos + 8)
+                data = tiff[value_offset:value_offset + length]
+                if len(data) != length:
+                    raise UnsupportedFile(f"truncated value for tag 0x{tag:04x}")
+            entries[tag] = Entry(type, n, data)
+        (next_offset,) = struct.unpack_from(bo + "I", tiff, offset + 2 + 12 * count)
+    except struct.error:
+        raise UnsupportedFile("truncated IFD")
+    return entries, next_offset
+
+def _pointer(bo, entries, tag):
+    data = entries[tag].data
+    if len(data) != 4:
+        raise UnsupportedFile(f"unexpected pointer in tag 0x{tag:04x}")
+    return struct.unpack(bo + "I", data)[0]
+
+def parse_tiff(tiff):
+    """Parse an EXIF TIFF block into ``(byte_order, ifds, thumbnail)``.
+
+    ``ifds`` maps ``"ifd0"``, ``"exif"``, ``"interop"``, ``"gps"`` and
+    ``"ifd1"`` to ``{tag: Entry}``. Raises :class:`UnsupportedFile` for
+    layouts that cannot be rewritten safely.
+    """
+    if len(tiff) < 8:
+        raise UnsupportedFile("truncated TIFF header")
+    if tiff[:4] == b"II*\x00":
+        bo = "<"
+    elif tiff[:4] == b"MM\x00*":
+        bo = ">"
+    else:
+        raise UnsupportedFile("not a TIFF header")
+    ifds = {}
+    ifds["ifd0"], next_offset = _read_ifd(tiff, struct.unpack_from(bo + "I", tiff, 4)[0], bo)
+    if EXIF_POINTER in ifds["ifd0"]:
+        ifds["exif"], _ = _read_ifd(tiff, _pointer(bo, ifds["ifd0"], EXIF_POINTER), bo)
+        if INTEROP_POINTER in ifds["exif"]:
+            ifds["interop"], _ = _read_ifd(tiff, _pointer(bo, ifds["exif"], INTEROP_POINTER), bo)
+    if GPS_POINTER in ifds["ifd0"]:
+        ifds["gps"], _ = _read_ifd(tiff, _pointer(bo, ifds["ifd0"], GPS_POINTER), bo)
+    thumbnail = None
+    if next_offset:
+        ifds["ifd1"], extra = _read_ifd(tiff, next_offset, bo)
+        if extra:
+            raise UnsupportedFile("more than two IFDs")
+        if THUMB_OFFSET in ifds["ifd1"]:
+            start = _pointer(bo, ifds["ifd1"], THUMB_OFFSET)
+            length = _pointer(bo, ifds["ifd1"], THUMB_LENGTH) if THUMB_LENGTH in ifds["ifd1"] else 0
+            thumbnail = tiff[start:start + length]
+    for entries in ifds.values():
+        found = UNSUPPORTED_TAGS.intersection(entries)
+        if MAKER_NOTE in found and entries[MAKER_NOTE].data.startswith(RELOCATABLE_MAKER_NOTES):
+            found.discard(MAKER_NOTE)
+        if found:
+            raise UnsupportedFile(f"cannot relocate tag 0x{min(found):04x}")
+    return bo, ifds, thumbnail
+
+def _ifd_size(entries):
+    return 6 + 12 * len(entries) + sum(len(e.data) + len(e.data) % 2 for e in entries.values() if len(e.data) > 4)
+
+def build_tiff(bo, ifds, thumbnail=None):
+    """Serialise ifds (as returned by :func:`parse_tiff`) into a TIFF block."""
+    ifds = {name: dict(entries) for name, entries in ifds.items()}
+    if thumbnail is not None:
+        ifds.setdefault("ifd1", {})
+    pointers = [("ifd0", "exif", EXIF_POINTER), ("ifd0", "gps", GPS_POINTER), ("exif", "interop", INTEROP_POINTER)]
+    for parent, child, tag in pointers:
+        if child in ifds:
+            ifds[parent][tag] = _long(bo, 0)
+        else:
+            ifds.get(parent, {}).pop(tag, None)
+    if thumbnail is not None:
+        ifds["ifd1"][THUMB_OFFSET] = _long(bo, 0)
+        ifds["ifd1"][THUMB_LENGTH] = _long(bo, len(thumbnail))
+
+    order = [name for name in ("ifd0", "exif", "interop", "gps", "ifd1") if name in ifds]
+    offsets = {}
+    position = 8
+    for name in order:
+        offsets[name] = position
+        position += _ifd_size(ifds[name])
+    for parent, child, tag in pointers:
+        if child in ifds:
+            ifds[parent][tag] = _long(bo, offsets[child])
+    if thumbnail is not None:
+        ifds["ifd1"][THUMB_OFFSET] = _long(bo, position)
+
+    out = bytearray(b"II*\x00" if bo == "<" else b"MM\x00*")
+    out += struct.pack(bo + "I", 8)
+    for name in order:
+        entries = ifds[name]
+        value_offset = offsets[name] + 6 + 12 * len(entries)
+        header = bytearray(struct.pack(bo + "H", len(entries)))
+        values = bytearray()
+        for tag in sorted(entries):
+            entry = entries[tag]
+            header += struct.pack(bo + "HHI", tag, entry.type, entry.count)
+            if len(entry.data) <= 4:
+                header += entry.data.ljust(4, b"\x00")
+            else:
+                header += struct.pack(bo + "I", value_offset + len(values))
+                values += entry.data + b"\x00" * (len(entry.data) % 2)
+        next_ifd = offsets["ifd1"] if name == "ifd0" and "ifd1" in offsets else 0
+        out += header + struct.pack(bo + "I", next_ifd) + values
+    if thumbnail is not None:
+        out += thumbnail
+    return bytes(out)
+
+def _dms(value):
+    """Return degrees, minutes and seconds rationals for abs(value)."""
+    micro = round(abs(value) * 3600 * 1000000)
+    degrees, micro = divmod(micro, 3600 * 1000000)
+    minutes, micro = divmod(micro, 60 * 1000000)
+    return [(degrees, 1), (minutes, 1), (micro, 1000000)]
+
+def _mandatory(bo, name):
+    """Entries exiftool adds when it creates IFD ``name`` from scratch."""
+    if name == "ifd0":
+        return {
+            0x011A: _rationals(bo, [(72, 1)]),
+            0x011B: _rationals(bo, [(72, 1)]),
+            0x0128: Entry(SHORT, 1, struct.pack(bo + "H", 2)),
+            0x0213: Entry(SHORT, 1, struct.pack(bo + "H", 1)),
+        }
+    if name == "exif":
+        return {
+            0x9000: Entry(UNDEFINED, 4, b"0232"),
+            0x9101: Entry(UNDEFINED, 4, bytes([1, 2, 3, 0])),
+            0xA000: Entry(UNDEFINED, 4, b"0100"),
+            0xA001: Entry(SHORT, 1, struct.pack(bo + "H", 0xFFFF)),
+        }
+    return {GPS_VERSION: Entry(BYTE, 4, bytes([2, 3, 0, 0]))}
+
+def _ifd(bo, ifds, name):
+    if not ifds.get(name):
+        ifds[name] = _mandatory(bo, name)
+    return ifds[name]
+
+def apply_tags(bo, ifds, tags):
+    """Set the tags parsed by :func:`parse_command` in ifds.
+
+    IFDs created here get the same mandatory entries exiftool adds.
+    """
+    ifd0 = _ifd(bo, ifds, "ifd0")
+    if "AllDates" in tags:
+        date = _ascii(tags["AllDates"])
+        exif = _ifd(bo, ifds, "exif")
+        ifd0[MODIFY_DATE] = date
+        exif[DATE_TIME_ORIGINAL] = date
+        exif[CREATE_DATE] = date
+    if "XPComment" in tags:
+        if tags["XPComment"]:
+            data = tags["XPComment"].encode("utf-16-le") + b"\x00\x00"
+            ifd0[XP_COMMENT] = Entry(BYTE, len(data), data)
+        else:
+            ifd0.pop(XP_COMMENT, None)
+    coordinates = [(GPS_LAT_REF, GPS_LAT, "GPSLatitude", "NS"), (GPS_LON_REF, GPS_LON, "GPSLongitude", "EW")]
+    if any(name in tags for _, _, name, _ in coordinates) or "GPSAltitude" in tags:
+        gps = _ifd(bo, ifds, "gps")
+        # Like exiftool, the hemisphere comes from the signed Ref value when given.
+        for ref_tag, tag, name, refs in coordinates:
+            if name in tags:
+                value = tags[name]
+                gps[ref_tag] = _ascii(refs[tags.get(name + "Ref", value) < 0])
+                gps[tag] = _rationals(bo, _dms(value))
+        if "GPSAltitude" in tags:
+            value = tags["GPSAltitude"]
+            gps[GPS_ALT_REF] = Entry(BYTE, 1, bytes([tags.get("GPSAltitudeRef", value) < 0]))
+            gps[GPS_ALT] = _rationals(bo, [(round(abs(value) * 1000), 1000)])
+
+def parse_command(cmd):
+    """Return ``(path, tags)`` if the native writer can run cmd, else None."""
+    if not cmd or Path(cmd[-1]).suffix.lower() not in NATIVE_EXTENSIONS:
+        return None
+    tags = {}
+    for arg in cmd[:-1]:
+        if arg in _FLAGS:
+            continue
+        name, sep, value = arg[1:].partition("=")
+        if not arg.startswith("-") or not sep or name not in _TAGS:
+            return None
+        if name.startswith("GPS"):
+            try:
+                value = float(value)
+            except ValueError:
+                return None
+        elif name == "AllDates":
+            try:
+                value.encode("ascii")
+            except UnicodeEncodeError:
+                return None
+        tags[name] = value
+    return Path(cmd[-1]), tags
+
+def _jpeg_exif(src, tags):
+    """Read JPEG headers from src; return (segments before SOS/EOI, marker) with EXIF updated."""
+    if src.read(2) != b"\xff\xd8":
+        raise UnsupportedFile("not a JPEG")
+    segments = []
+    while True:
+        marker = src.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise UnsupportedFile("corrupt JPEG marker")
+        code = marker[1]
+        while code == 0xFF:
+            code = src.read(1)[0]
+        if code in (0xDA, 0xD9):
+            break
+        (length,) = struct.unpack(">H", src.read(2))
+        payload = src.read(length - 2)
+        if len(payload) != length - 2:
+            raise UnsupportedFile("truncated JPEG segment")
+        segments.append((code, payload))
+
+    exif = [i for i, (c, payload) in enumerate(segments) if c == 0xE1 and payload.startswith(EXIF_HEADER)]
+    if len(exif) > 1:
+        raise UnsupportedFile("multiple EXIF segments")
+    if exif:
+        bo, ifds, thumbnail = parse_tiff(segments[exif[0]][1][len(EXIF_HEADER):])
+    else:
+        bo, ifds, thumbnail = ">", {"ifd0": {}}, None
+    apply_tags(bo, ifds, tags)
+    payload = EXIF_HEADER + build_tiff(bo, ifds, thumbnail)
+    if len(payload) + 2 > 0xFFFF:
+        raise UnsupportedFile("EXIF segment too large")
+    if exif:
+        segments[exif[0]] = (0xE1, payload)
+    else:
+        # EXIF follows any JFIF APP0 segment, as exiftool places it.
+        index = 0
+        while index < len(segments) and segments[index][0] == 0xE0:
+            index += 1
+        segments.insert(index, (0xE1, payload))
+    return segments, code
+
+def _write_jpeg(src, out, tags):
+    segments, code = _jpeg_exif(src, tags)
+    out.write(b"\xff\xd8")
+    for segment_code, payload in segments:
+        out.write(bytes([0xFF, segment_code]) + struct.pack(">H", len(payload) + 2) + payload)
+    out.write(bytes([0xFF, code]))
+    shutil.copyfileobj(src, out, 1024 * 1024)
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def _write_png(src, out, tags):
+    if src.read(8) != PNG_SIGNATURE:
+        raise UnsupportedFile("not a PNG")
+    # Headers only: chunk data is skipped with seek so IDAT is never read here.
+    chunks = []
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            raise UnsupportedFile("truncated PNG")
+        length, kind = struct.unpack(">I4s", header)
+        start = src.tell()
+        if kind in (b"tEXt", b"zTXt", b"iTXt"):
+            keyword = src.read(min(length, 80)).split(b"\x00", 1)[0]
+            if keyword.lower().startswith(b"raw profile type exif") or keyword.lower() == b"raw profile type app1":
+                raise UnsupportedFile("EXIF stored in a text chunk")
+        chunks.append((kind, start - 8, length))
+        src.seek(start + length + 4)
+        if kind == b"IEND":
+            break
+    first_idat = next((i for i, (kind, _, _) in enumerate(chunks) if kind == b"IDAT"), None)
+    exif = [i for i, (kind, _, _) in enumerate(chunks) if kind == b"eXIf"]
+    if first_idat is None or len(exif) > 1 or (exif and exif[0] > first_idat):
+        raise UnsupportedFile("unsupported PNG chunk layout")
+
+    if exif:
+        _, offset, length = chunks[exif[0]]
+        src.seek(offset + 8)
+        bo, ifds, thumbnail = parse_tiff(src.read(length))
+    else:
+        bo, ifds, thumbnail = ">", {"ifd0": {}}, None
+    apply_tags(bo, ifds, tags)
+    new_chunk = _png_chunk(b"eXIf", build_tiff(bo, ifds, thumbnail))
+
+    out.write(PNG_SIGNATURE)
+    for i, (kind, offset, length) in enumerate(chunks[:first_idat]):
+        if kind == b"eXIf":
+            out.write(new_chunk)
+            continue
+        src.seek(offset)
+        out.write(src.read(length + 12))
+    if not exif:
+        out.write(new_chunk)
+    src.seek(chunks[first_idat][1])
+    shutil.copyfileobj(src, out, 1024 * 1024)
+
+def write_tags(path, tags):
+    """Rewrite the EXIF of a JPEG or PNG at path in place with tags.
+
+    Only the EXIF segment (JPEG APP1) or chunk (PNG eXIf) is rebuilt, and
+    the rest of the file is streamed through unchanged. Other EXIF tags are
+    kept. The new file is written to a temporary file first and then copied
+    over the original, so the original keeps its inode as with exiftool's
+    ``-overwrite_original_in_place``. Raises :class:`UnsupportedFile` without
+    touching the file when exiftool is needed instead, including for
+    truncated or malformed files.
+    """
+    path = Path(path)
+    writer = _write_png if path.suffix.lower() == ".png" else _write_jpeg
+    fd, tmp = tempfile.mkstemp(prefix=".native-", dir=path.parent)
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as out:
+            try:
+                writer(src, out, tags)
+            except (IndexError, struct.error, ValueError) as e:
+                raise UnsupportedFile(f"malformed file: {e}") from e
+        with open(tmp, "rb") as new, open(path, "r+b") as dest:
+            shutil.copyfileobj(new, dest, 1024 * 1024)
+            dest.truncate()
+    finally:
+        os.unlink(tmp)
+
+def write_native(cmd):
+    """Apply an exiftool command with the native writer if possible.
+
+    Returns True when the file was written, False when cmd or the file
+    needs exiftool.
+    """
+    parsed = parse_command(cmd)
+    if parsed is None:
+        return False
+    try:
+        write_tags(*parsed)
+    except UnsupportedFile:
+        return False
+    return True
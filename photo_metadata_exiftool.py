@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+import time
+
+# pyexiftool, subprocess, the executors and queue are imported when first
+# needed: scripts that only plan or report never pay for them.
+
+def _exiftool_class():
+    """Return pyexiftool's ExifTool class, importing it on first use, or None if it is not installed."""
+    try:
+        return globals()["ExifTool"]
+    except KeyError:
+        pass
+    try:
+        from exiftool import ExifTool
+    except ImportError:  # graceful fallback for environments without pyexiftool
+        ExifTool = None
+    globals()["ExifTool"] = ExifTool
+    return ExifTool
+
+def __getattr__(name):
+    if name == "ExifTool":
+        return _exiftool_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class ExifToolError(Exception):
+    """Raised when exiftool reports a failure for a single file."""
+
+def exiftool_unavailable(executable=None):
+    """Return a message explaining why exiftool cannot run, or None if it can."""
+    import shutil
+
+    if not shutil.which(executable or "exiftool"):
+        return "'exiftool' not found. Please install exiftool and ensure it is in your PATH."
+    if _exiftool_class() is None:
+        return "pyexiftool not installed"
+    return None
+
+def _check_result(et, output):
+    status = getattr(et, "last_status", 0)
+    stderr = getattr(et, "last_stderr", "") or ""
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+    if status or "weren't updated due to errors" in (output or ""):
+        raise ExifToolError(stderr.strip() or (output or "").strip() or f"exit status {status}")
+
+class ExifToolPool:
+    """Persistent ``-stay_open`` exiftool processes fed one file at a time.
+
+    Each worker thread owns one exiftool process and takes whole file
+    commands off a shared bounded queue, so callers can :meth:`submit`
+    commands while they are still being planned. Every submission returns a
+    :class:`concurrent.futures.Future` that resolves to ``None`` on success or
+    raises :class:`ExifToolError`. ``on_latency`` is called with the seconds
+    each exiftool invocation took. ``fast_path``, if given, is tried first
+    with each command and returns True when it wrote the file itself (see
+    :func:`photo_metadata_exif.write_native`).
+
+    With a :class:`~photo_metadata_tuning.ConcurrencyTuner`, the pool starts
+    with ``tuner.workers`` processes and starts or retires processes as the
+    tuner's decision changes.
+    """
+
+    def __init__(self, workers=1, executable=None, queue_size=None, on_latency=None, fast_path=None,
+                 tuner=None):
+        self.tuner = tuner
+        self.workers = max(1, int(tuner.workers if tuner is not None else workers))
+        self.executable = executable
+        self.on_latency = on_latency
+        self.fast_path = fast_path
+        import queue
+
+        capacity = tuner.maximum if tuner is not None else self.workers
+        self._queue = queue.Queue(maxsize=queue_size or capacity * 32)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._active = 0
+        self._retire = 0
+        self._closing = False
+        self._resize(self.workers)
+
+    def _resize(self, count):
+        with self._lock:
+            started = 0
+            while self._active < count:
+                thread = threading.Thread(
+                    target=self._worker, name=f"exiftool-{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                self._active += 1
+                started += 1
+                thread.start()
+            self._retire = self._active - count
+            closing = self._closing
+        # close() has already queued a stop for every earlier worker.
+        for _ in range(started if closing else 0):
+            self._queue.put(None)
+
+    def _retiring(self):
+        with self._lock:
+            if self._retire > 0 and not self._closing:
+                self._retire -= 1
+                self._active -= 1
+                return True
+            return False
+
+    def _open(self):
+        exiftool = _exiftool_class()
+        if self.executable:
+            return exiftool(executable=self.executable)
+        return exiftool()
+
+    def _worker(self):
+        start_error = None
+        try:
+            et = self._open()
+            et.__enter__()
+        except Exception as e:
+            et = None
+            start_error = ExifToolError(f"Could not start exiftool: {e}")
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                cmd, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                started = time.perf_counter()
+                self._run(et, start_error, cmd, future)
+                if self.tuner is not None and self.tuner.observe(time.perf_counter() - started):
+                    self._resize(self.tuner.workers)
+                if self._retiring():
+                    break
+        finally:
+            if et is not None:
+                et.__exit__(None, None, None)
+
+    def _run(self, et, start_error, cmd, future):
+        if self.fast_path is not None:
+            try:
+                handled = self.fast_path(cmd)
+            except Exception as e:
+                future.set_exception(ExifToolError(f"Native write failed: {e}"))
+                return
+            if handled:
+                future.set_result(None)
+                return
+        if et is None:
+            future.set_exception(start_error)
+            return
+        try:
+            start = time.perf_counter()
+            output = et.execute(*[c.encode() for c in cmd])
+            if self.on_latency is not None:
+                self.on_latency(time.perf_counter() - start)
+            _check_result(et, output)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e if isinstance(e, ExifToolError) else ExifToolError(str(e)))
+
+    def submit(self, cmd):
+        """Queue one exiftool command (ending in its target file) and return a Future."""
+        from concurrent.futures import Future
+        future = Future()
+        self._queue.put((list(cmd), future))
+        return future
+
+    def close(self):
+        """Let queued commands finish, then stop every exiftool process."""
+        with self._lock:
+            self._closing = True
+            active = self._active
+        for _ in range(active):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Tags read back before writing, in the family-1 group form that
+# ``exiftool -G1`` reports. Composite GPS values are signed decimals.
+READ_TAGS = [
+    "ExifIFD:DateTimeOriginal", "ExifIFD:CreateDate", "IFD0:ModifyDate", "IFD0:XPComment",
+    "Composite:GPSLatitude", "Composite:GPSLongitude", "Composite:GPSAltitude",
+    "QuickTime:CreateDate", "Keys:CreationDate", "UserData:Comment",
+]
+_NUMERIC_TAGS = {"Composite:GPSLatitude": 1e-6, "Composite:GPSLongitude": 1e-6, "Composite:GPSAltitude": 0.01}
+
+# What each write argument sets, in READ_TAGS terms.
+_WRITE_TARGETS = {
+    "AllDates": ["ExifIFD:DateTimeOriginal", "ExifIFD:CreateDate", "IFD0:ModifyDate"],
+    "XPComment": ["IFD0:XPComment"],
+    "GPSLatitude": ["Composite:GPSLatitude"],
+    "GPSLongitude": ["Composite:GPSLongitude"],
+    "GPSAltitude": ["Composite:GPSAltitude"],
+    # The hemisphere is part of the signed Composite values above.
+    "GPSLatitudeRef": [],
+    "GPSLongitudeRef": [],
+    "GPSAltitudeRef": [],
+    "QuickTime:CreateDate": ["QuickTime:CreateDate"],
+    "Keys:CreationDate": ["Keys:CreationDate"],
+    "UserData:Comment": ["UserData:Comment"],
+}
+
+def read_tags(paths, executable=None, batch_size=500, workers=1):
+    """Read READ_TAGS for paths with bulk ``exiftool -json`` calls.
+
+    Files are passed through an argfile in batches of batch_size, with up to
+    workers batches running at once. Returns a mapping of each path (as a
+    string) to its tags; files exiftool could not read are left out.
+    """
+    import subprocess
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    paths = [str(p) for p in paths]
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+    def read_batch(batch):
+        with tempfile.NamedTemporaryFile("w", suffix=".args", encoding="utf-8", delete=False) as argfile:
+            argfile.write("\n".join(batch) + "\n")
+        try:
+            cmd = [executable or "exiftool", "-json", "-G1", "-charset", "filename=utf8"]
+            cmd += [f"-{tag}#" if tag in _NUMERIC_TAGS else f"-{tag}" for tag in READ_TAGS]
+            cmd += ["-@", argfile.name]
+            out = subprocess.run(cmd, capture_output=True, check=False).stdout
+        except OSError:
+            return []
+        finally:
+            os.unlink(argfile.name)
+        try:
+            return json.loads(out.decode("utf-8", "replace") or "[]")
+        except ValueError:
+            return []
+
+    current = {}
+    if not batches:
+        return current
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+        for records in executor.map(read_batch, batches):
+            for record in records:
+                current[record.pop("SourceFile")] = record
+    return current
+
+def planned_tags(cmd):
+    """Return the READ_TAGS values cmd would write, or None if it writes anything else."""
+    planned = {}
+    for arg in cmd[:-1]:
+        if not arg.startswith("-") or "=" not in arg:
+            continue
+        name, value = arg[1:].split("=", 1)
+        targets = _WRITE_TARGETS.get(name)
+        if targets is None:
+            return None
+        for tag in targets:
+            planned[tag] = value
+    return planned
+
+def _same(tag, planned, current):
+    if current is None:
+        return False
+    if tag in _NUMERIC_TAGS:
+        try:
+            return abs(float(planned) - float(current)) <= _NUMERIC_TAGS[tag]
+        except (TypeError, ValueError):
+            return False
+    return str(current).strip() == planned.strip()
+
+def already_written(cmd, current):
+    """Return True if the file cmd targets already carries every value cmd writes."""
+    planned = planned_tags(cmd)
+    if not planned or current is None:
+        return False
+    return all(_same(tag, value, current.get(tag)) for tag, value in planned.items())
+
+def _argfile_line(arg):
+    if "\n" in arg or "\r" in arg or "\t" in arg or arg != arg.strip() or arg.startswith("#"):
+        escaped = arg.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+        return "#[CSTR]" + escaped
+    return arg
+
+def write_argfile(commands, path):
+    """Write commands to an argfile that ``exiftool -@ path`` runs one after another; return how many.
+
+    Arguments go one per line, with ``-execute`` between commands.
+    Arguments exiftool would read differently (line breaks, surrounding
+    blanks, a leading ``#``) are written as ``#[CSTR]`` C-string lines.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as argfile:
+        for cmd in commands:
+            if count:
+                argfile.write("-execute\n")
+            argfile.writelines(_argfile_line(arg) + "\n" for arg in cmd)
+            count += 1
+    return count
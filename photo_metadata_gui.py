@@ -1,7 +1,9 @@
 import sys
+import queue
 import shutil
+import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 
 # Support flexible project structure by adding potential parent
@@ -12,7 +14,8 @@ for candidate in [SCRIPT_DIR, SCRIPT_DIR.parent, SCRIPT_DIR.parent.parent]:
         sys.path.insert(0, str(candidate))
         break
 
-from photo_metadata_patch import process_metadata_files, check_directory_writable
+from photo_metadata_metrics import describe_progress
+from photo_metadata_patch import RunCancelled, check_directory_writable, run_pipeline
 
 
 def check_environment():
@@ -25,29 +28,58 @@ def check_environment():
     return "\n".join(errors)
 
 
-def run_process(root_dir, dry_run, workers, output):
+PHASE_LABELS = {
+    "scan": "Scanning export",
+    "parse": "Reading sidecars",
+    "dedup": "Comparing duplicates",
+    "read": "Reading current tags",
+    "apply": "Writing metadata",
+}
+
+
+def run_process(root_dir, dry_run, workers, output, events, cancel):
+    """Run the pipeline on a worker thread, posting its progress and outcome to events.
+
+    Tk may only be touched from the main thread, so everything goes through
+    the queue: ``("progress", phase, done, total, elapsed)`` while running,
+    then one of ``("done", summary)``, ``("cancelled", None)`` or
+    ``("error", message)``.
+    """
     try:
-        csv_path = process_metadata_files(
-            root_dir, dry_run=dry_run, parallel_workers=workers, output_path=output
+        summary = run_pipeline(
+            root_dir,
+            dry_run=dry_run,
+            parallel_workers=workers,
+            output_path=output,
+            on_progress=lambda *progress: events.put(("progress",) + progress),
+            cancel=cancel,
         )
-        messagebox.showinfo("Done", f"Finished. CSV log at: {csv_path}")
-    except SystemExit:
-        # process_metadata_files may call sys.exit on error
-        pass
+    except RunCancelled:
+        events.put(("cancelled", None))
     except Exception as e:
-        messagebox.showerror("Error", str(e))
+        # PipelineError (bad folder, unwritable report) or an unexpected failure
+        events.put(("error", str(e)))
+    else:
+        events.put(("done", summary))
 
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Google Photos Metadata Patcher")
-        self.geometry("500x200")
+        self.geometry("500x300")
 
         self.root_var = tk.StringVar()
         self.output_var = tk.StringVar()
         self.dry_run_var = tk.BooleanVar(value=False)
         self.workers_var = tk.IntVar(value=4)
+        self.phase_var = tk.StringVar(value="Idle")
+        self.rate_var = tk.StringVar()
+
+        self.events = queue.Queue()
+        self.cancel = threading.Event()
+        self.worker = None
+        self.close_when_done = False
 
         tk.Label(self, text="Google Photos Export Folder:").pack(anchor="w", padx=10, pady=5)
         frm1 = tk.Frame(self)
@@ -67,7 +99,19 @@ class App(tk.Tk):
         tk.Label(frm3, text="Workers:").pack(side="left", padx=(20, 5))
         tk.Spinbox(frm3, from_=1, to=16, textvariable=self.workers_var, width=5).pack(side="left")
 
-        tk.Button(self, text="Run", command=self.on_run).pack(pady=10)
+        tk.Label(self, textvariable=self.phase_var).pack(anchor="w", padx=10)
+        self.progress = ttk.Progressbar(self, mode="determinate", maximum=1)
+        self.progress.pack(fill="x", padx=10, pady=5)
+        tk.Label(self, textvariable=self.rate_var).pack(anchor="w", padx=10)
+
+        frm4 = tk.Frame(self)
+        frm4.pack(pady=10)
+        self.run_button = tk.Button(frm4, text="Run", command=self.on_run)
+        self.run_button.pack(side="left", padx=5)
+        self.cancel_button = tk.Button(frm4, text="Cancel", command=self.on_cancel, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def browse_root(self):
         path = filedialog.askdirectory(title="Select Google Photos export root")
@@ -94,14 +138,90 @@ class App(tk.Tk):
         if error:
             messagebox.showerror("Missing Dependency", error)
             return
-        run_process(
-            root_dir,
-            dry_run=self.dry_run_var.get(),
-            workers=self.workers_var.get(),
-            output=self.output_var.get() or None,
+        self.cancel.clear()
+        self.run_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.phase_var.set("Starting...")
+        self.rate_var.set("")
+        self.worker = threading.Thread(
+            target=run_process,
+            args=(
+                root_dir,
+                self.dry_run_var.get(),
+                self.workers_var.get(),
+                self.output_var.get() or None,
+                self.events,
+                self.cancel,
+            ),
+            daemon=True,
         )
-        self.destroy()
-
+        self.worker.start()
+        self.after(100, self.poll_events)
+
+    def on_cancel(self):
+        # The worker stops at the next file; writes already started are completed.
+        self.cancel.set()
+        self.cancel_button.config(state="disabled")
+        self.phase_var.set("Cancelling after the files in progress...")
+
+    def on_close(self):
+        if self.worker is not None and self.worker.is_alive():
+            self.close_when_done = True
+            self.on_cancel()
+        else:
+            self.destroy()
+
+    def poll_events(self):
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == "progress":
+                self.show_progress(*event[1:])
+            else:
+                self.finish(kind, event[1])
+                return
+        self.after(100, self.poll_events)
+
+    def show_progress(self, phase, done, total, elapsed):
+        if self.cancel.is_set():
+            return
+        self.phase_var.set(PHASE_LABELS.get(phase, phase))
+        if total is None:
+            self.progress.config(mode="indeterminate")
+            self.progress.start()
+        else:
+            self.progress.stop()
+            self.progress.config(mode="determinate", maximum=max(total, 1), value=done)
+        self.rate_var.set(describe_progress(done, total, elapsed))
+
+    def finish(self, kind, result):
+        self.worker = None
+        self.progress.stop()
+        self.run_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        if self.close_when_done:
+            self.destroy()
+            return
+        if kind == "done":
+            self.phase_var.set("Finished")
+            if result.failures:
+                messagebox.showwarning(
+                    "Done with errors",
+                    f"Exiftool failed for {result.failures} file(s). CSV log at: {result.report_path}",
+                )
+            else:
+                messagebox.showinfo("Done", f"Finished. CSV log at: {result.report_path}")
+        elif kind == "cancelled":
+            self.phase_var.set("Cancelled")
+            messagebox.showinfo(
+                "Cancelled", "Stopped. Finished files are saved; running again resumes the rest."
+            )
+        else:
+            self.phase_var.set("Failed")
+            messagebox.showerror("Error", result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+import errno
+import json
+import os
+import sys
+from pathlib import Path
+
+JOURNAL_FILENAME = ".photo_metadata_journal.jsonl"
+# Moves are journaled and carried out this many at a time.
+BATCH_SIZE = 256
+
+def move_file(src, dst):
+    """Rename src to dst, copying only when they are on different filesystems; never overwrite dst."""
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "Destination exists", os.fspath(dst))
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        import shutil
+
+        shutil.move(os.fspath(src), os.fspath(dst))
+
+class FileJournal:
+    """Journal of file moves in the export root, carried out in batches.
+
+    :meth:`move` queues a move; every ``batch_size`` moves (and on
+    :meth:`flush`) the batch is appended to the journal and synced *before*
+    any file moves, then the moves run and a line recording which failed
+    closes the batch. A crash therefore never moves a file the journal does
+    not know about, and :func:`undo` can put everything back. Paths are
+    stored relative to the root, like the run state. Each batch carries a
+    random id, so runs sharing an export (such as shards) can append to the
+    same journal.
+
+    Each destination directory is created once, and moves are plain renames
+    unless they cross filesystems.
+    """
+
+    def __init__(self, root, filename=JOURNAL_FILENAME, batch_size=BATCH_SIZE):
+        self.root = Path(root)
+        self.path = self.root / filename
+        self.batch_size = batch_size
+        self.pending = []
+        self.created = set()
+
+    def _relative(self, path):
+        return Path(path).relative_to(self.root).as_posix()
+
+    def move(self, src, dst):
+        """Queue moving src to dst; return the results of the batch this completed, if any (see :meth:`flush`)."""
+        self.pending.append((Path(src), Path(dst)))
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Journal and carry out the queued moves; return ``(src, dst, error or None)`` for each."""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return []
+        batch_id = os.urandom(6).hex()
+        with open(self.path, "a", encoding="utf-8") as journal:
+            moves = [[self._relative(src), self._relative(dst)] for src, dst in batch]
+            journal.write(json.dumps({"op": "move", "batch": batch_id, "moves": moves}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+            results = []
+            for parent in {dst.parent for _, dst in batch} - self.created:
+                try:
+                    parent.mkdir(parents=True, exist_ok=True)
+                    self.created.add(parent)
+                except OSError:
+                    pass  # reported by the moves into it
+            for src, dst in batch:
+                try:
+                    move_file(src, dst)
+                    results.append((src, dst, None))
+                except OSError as e:
+                    results.append((src, dst, e))
+            failed = [i for i, (*_, error) in enumerate(results) if error is not None]
+            journal.write(json.dumps({"op": "done", "batch": batch_id, "failed": failed}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        return results
+
+def read_journal(path):
+    """Return the journaled moves in order as ``(src, dst)`` relative paths, leaving out the ones that failed.
+
+    The moves of a batch cut short by a crash are all returned: :func:`undo`
+    checks which of them actually happened.
+    """
+    batches = {}
+    with open(path, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if entry.get("op") == "move":
+                batches[entry["batch"]] = [tuple(m) for m in entry["moves"]]
+            elif entry.get("op") == "done" and entry["batch"] in batches:
+                failed = set(entry["failed"])
+                moves = batches[entry["batch"]]
+                batches[entry["batch"]] = [m for i, m in enumerate(moves) if i not in failed]
+    return [move for moves in batches.values() for move in moves]
+
+def undo(root, filename=JOURNAL_FILENAME):
+    """Move every journaled file back, newest move first; return ``(restored, conflicts)``.
+
+    A move whose destination is gone is left alone (it never happened or
+    was undone already). When something exists again at the original
+    location, the file is not moved back, and those conflicting moves are
+    kept in the journal so a later undo can retry them; otherwise the
+    journal is removed. Directories the moves leave empty are removed.
+    """
+    root = Path(root)
+    path = root / filename
+    if not path.exists():
+        raise FileNotFoundError(errno.ENOENT, "No file journal", os.fspath(path))
+    restored = 0
+    conflicts = []
+    emptied = set()
+    for src, dst in reversed(read_journal(path)):
+        source, target = root / src, root / dst
+        if not os.path.lexists(target):
+            continue
+        if os.path.lexists(source):
+            conflicts.append((src, dst))
+            continue
+        source.parent.mkdir(parents=True, exist_ok=True)
+        move_file(target, source)
+        emptied.add(target.parent)
+        restored += 1
+    for directory in sorted(emptied, key=lambda p: len(p.parts), reverse=True):
+        while directory != root and root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+            directory = directory.parent
+    if conflicts:
+        conflicts.reverse()
+        path.write_text(json.dumps({"op": "move", "batch": "undo", "moves": conflicts}) + "\n"
+                        + json.dumps({"op": "done", "batch": "undo", "failed": []}) + "\n", encoding="utf-8")
+    else:
+        path.unlink()
+    return restored, len(conflicts)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or undo the file moves of earlier runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="List the journaled moves, oldest first")
+    show.add_argument("root", help="Path to the Google Photos export root directory")
+    revert = commands.add_parser("undo", help="Move every journaled file back where it was")
+    revert.add_argument("root", help="Path to the Google Photos export root directory")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "show":
+            for src, dst in read_journal(Path(args.root, JOURNAL_FILENAME)):
+                print(f"{src} -> {dst}")
+        else:
+            restored, conflicts = undo(args.root)
+            print(f"Moved {restored} file(s) back")
+            if conflicts:
+                print(f"{conflicts} file(s) left in place because their original location is taken again; "
+                      f"they stay in the journal", file=sys.stderr)
+                sys.exit(1)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
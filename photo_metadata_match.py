@@ -0,0 +1,88 @@
+import os
+import re
+
+SIDECAR_SUFFIX = ".supplemental-metadata.json"
+SUPPLEMENTAL = "supplemental-metadata"
+# Takeout cuts longer file name stems to this many characters, keeping the extension.
+MAX_STEM_LENGTH = 47
+EDITED_SUFFIX = "-edited"
+
+_COUNTER = re.compile(r"\(\d+\)$")
+
+def sidecar_media_name(name, media_exts):
+    """Return the name of the media file a sidecar file name belongs to, or None if name is no sidecar.
+
+    Besides ``IMG.JPG.supplemental-metadata.json`` this accepts the suffix
+    cut short by Takeout's name length limit (``IMG.JPG.supplemental-me.json``),
+    the older ``IMG.JPG.json`` form (for media_exts only), and duplicate
+    counters, which Takeout moves from the media name to the end of the
+    sidecar name: ``IMG.JPG.supplemental-metadata(1).json`` belongs to ``IMG(1).JPG``.
+    """
+    if not name.endswith(".json"):
+        return None
+    stem = name[:-len(".json")]
+    counter = _COUNTER.search(stem)
+    if counter:
+        stem = stem[:counter.start()]
+    base, dot, suffix = stem.rpartition(".")
+    if not (dot and suffix and SUPPLEMENTAL.startswith(suffix)):
+        if os.path.splitext(stem)[1].lower() not in media_exts:
+            return None
+        base = stem
+    if counter:
+        root, ext = os.path.splitext(base)
+        return f"{root}{counter.group()}{ext}"
+    return base
+
+def strip_counter(name):
+    """Return name without the ``(n)`` counter before its extension: ``img(1).jpg`` -> ``img.jpg``."""
+    root, ext = os.path.splitext(name)
+    counter = _COUNTER.search(root)
+    return root[:counter.start()] + ext if counter else name
+
+def candidate_keys(sidecar_name, title, media_exts):
+    """Return the lowercase media names a sidecar may match, most specific first.
+
+    The name the sidecar's own file name stands for comes first, since it
+    is the only key that tells apart same-titled photos Takeout numbered
+    with ``(n)``. Then the title itself, the title cut to Takeout's length
+    limit, and the ``-edited`` copy Google Photos exports next to (or
+    instead of) the original.
+    """
+    keys = []
+    media = sidecar_media_name(sidecar_name, media_exts)
+    if media:
+        keys.append(media.lower())
+    if title:
+        keys.append(title)
+        root, ext = os.path.splitext(title)
+        if len(root) > MAX_STEM_LENGTH:
+            keys.append(root[:MAX_STEM_LENGTH] + ext)
+        keys.append(root + EDITED_SUFFIX + ext)
+    return keys
+
+class MatchIndex:
+    """Resolve sidecars to :class:`~photo_metadata_patch.ExportScan` media index keys despite Takeout's name mangling.
+
+    Built in one pass over the media index: besides the names themselves it
+    only needs each numbered name ``img(1).jpg`` under ``img.jpg``, for
+    sidecars whose unnumbered photo is missing. A lookup probes a handful
+    of keys (see :func:`candidate_keys`), so it costs the same on any size
+    of library.
+    """
+
+    def __init__(self, media_index, media_exts):
+        self.media_index = media_index
+        self.media_exts = media_exts
+        self.counters = {}
+        for key in media_index:
+            stripped = strip_counter(key)
+            if stripped != key:
+                self.counters.setdefault(stripped, key)
+
+    def resolve(self, sidecar_name, title):
+        """Return the media index key a sidecar matches, or its title if none does."""
+        for key in candidate_keys(sidecar_name, title, self.media_exts):
+            if key in self.media_index:
+                return key
+        return self.counters.get(title, title)
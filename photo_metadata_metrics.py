@@ -0,0 +1,138 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Upper bounds (seconds) of the exiftool latency histogram buckets; the last
+# bucket collects everything slower.
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+class ProgressReporter:
+    """Progress bar that redraws at most every ``interval`` seconds.
+
+    Drawing a line per file costs real time on runs with hundreds of
+    thousands of items, so updates in between redraws only bump a counter.
+    The final update always draws.
+    """
+
+    def __init__(self, total, prefix="", interval=0.5, length=40, draw=None):
+        self.total = total
+        self.prefix = prefix
+        self.interval = interval
+        self.length = length
+        self.count = 0
+        self.started = time.monotonic()
+        self._last_draw = None
+        self._draw = draw or self._print
+
+    def update(self, count=None):
+        self.count = self.count + 1 if count is None else count
+        now = time.monotonic()
+        if self._last_draw is None or self.count >= self.total or now - self._last_draw >= self.interval:
+            self._last_draw = now
+            self._draw(self.count, self.total, now - self.started)
+
+    def _print(self, count, total, elapsed):
+        fraction = count / float(total) if total else 1.0
+        filled = int(self.length * fraction)
+        bar = '█' * filled + '-' * (self.length - filled)
+        rate = f" {count / elapsed:.0f}/s" if elapsed > 0 else ""
+        print(f'\r{self.prefix} |{bar}| {100 * fraction:.1f}% ({count}/{total}){rate}', end='\r')
+        if count >= total:
+            print()
+
+def describe_progress(count, total, elapsed):
+    """Return ``"count/total · N files/s · ETA h:mm:ss"`` for a phase in progress.
+
+    The rate and ETA are left out until there is something to measure, and
+    the ETA while ``total`` is unknown.
+    """
+    text = f"{count}/{total}" if total is not None else f"{count}"
+    if count and elapsed > 0:
+        rate = count / elapsed
+        text += f" · {rate:.1f} files/s"
+        if total is not None and total > count:
+            remaining = int((total - count) / rate)
+            text += f" · ETA {remaining // 3600}:{remaining // 60 % 60:02}:{remaining % 60:02}"
+    return text
+
+class Metrics:
+    """Thread-safe per-phase timings, counters and an exiftool latency histogram.
+
+    Each phase records its duration, item count and items per second plus
+    any counters added to it (bytes stat'ed, bytes read, parse failures...).
+    ``concurrency`` holds the worker count chosen for each tuned stage.
+    :meth:`to_dict` returns a JSON-serialisable summary.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.concurrency = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _phase(self, name):
+        return self.phases.setdefault(name, {"seconds": 0.0, "items": 0})
+
+    @contextmanager
+    def phase(self, name, items=None):
+        """Time the enclosed block as phase ``name`` (accumulating if re-entered)."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                phase = self._phase(name)
+                phase["seconds"] += elapsed
+                if items is not None:
+                    phase["items"] += items
+
+    def add(self, name, counter, amount=1):
+        """Add amount to a counter of phase ``name``."""
+        with self._lock:
+            phase = self._phase(name)
+            phase[counter] = phase.get(counter, 0) + amount
+
+    def observe_exiftool(self, seconds):
+        """Record the latency of one exiftool invocation."""
+        with self._lock:
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+
+    def to_dict(self):
+        with self._lock:
+            phases = {}
+            for name, phase in self.phases.items():
+                phase = dict(phase)
+                phase["seconds"] = round(phase["seconds"], 6)
+                if phase["items"] and phase["seconds"]:
+                    phase["items_per_sec"] = round(phase["items"] / phase["seconds"], 1)
+                phases[name] = phase
+            calls = sum(self.latency_counts)
+            labels = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+            return {
+                "started": self.started,
+                "wall_seconds": round(time.time() - self.started, 6),
+                "phases": phases,
+                "concurrency": dict(self.concurrency),
+                "exiftool_latency": {
+                    "calls": calls,
+                    "mean_seconds": round(self.latency_total / calls, 6) if calls else None,
+                    "max_seconds": round(self.latency_max, 6),
+                    "histogram": dict(zip(labels, self.latency_counts)),
+                },
+            }
+
+    def write(self, path):
+        """Write :meth:`to_dict` as JSON to path and return the path."""
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        return path
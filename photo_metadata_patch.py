@@ -1,58 +1,137 @@
 import os
 import json
-import csv
-import shutil
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import deque
 import sys
-import argparse
-import shlex
-try:
-    from exiftool import ExifTool
-except ImportError:  # graceful fallback for environments without pyexiftool
-    ExifTool = None
-
-def flatten_json(y, parent_key='', sep=':'):
-    items = {}
-    for k, v in y.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.update(flatten_json(v, new_key, sep=sep))
-        else:
-            items[new_key] = v
-    return items
+from dataclasses import dataclass, field
+from photo_metadata_state import RunState, STATE_FILENAME
+from photo_metadata_exiftool import ExifToolError, ExifToolPool, already_written, exiftool_unavailable, read_tags
+from photo_metadata_report import ReportWriter, REPORT_FORMATS
+from photo_metadata_metrics import Metrics, ProgressReporter
+from photo_metadata_tuning import AUTO, locality_order, make_tuner, parse_worker_count, tuned_map
+from photo_metadata_dedup import DUPLICATES_DIRNAME, HashCache, canonical_copies, find_content_groups
+from photo_metadata_match import SIDECAR_SUFFIX, MatchIndex, sidecar_media_name
+from photo_metadata_decode import decode_sidecar, flatten_json
+from photo_metadata_journal import FileJournal
+
+# The executors, argparse, the native EXIF writer and pyexiftool (see
+# photo_metadata_exiftool) are imported by the code that uses them, so a
+# fresh interpreter that only plans or checks status starts quickly.
 
 def check_directory_writable(path):
     """Return True if we can create and delete a temp file in path."""
-    test_file = Path(path) / ".write_test"
+    import tempfile
+
     try:
-        with open(test_file, "w") as f:
+        # A unique name, so concurrent runs (e.g. shards) checking the same folder don't collide.
+        fd, test_file = tempfile.mkstemp(prefix=".write_test", dir=path)
+        with os.fdopen(fd, "w") as f:
             f.write("test")
-        test_file.unlink()
+        os.unlink(test_file)
         return True
     except Exception:
         return False
 
-def print_progress_bar(iteration, total, prefix='', length=40):
-    percent = f"{100 * (iteration / float(total)):.1f}"
-    filled_length = int(length * iteration // total)
-    bar = '█' * filled_length + '-' * (length - filled_length)
-    print(f'\r{prefix} |{bar}| {percent}% ({iteration}/{total})', end='\r')
-    if iteration == total:
-        print()
+# Runs with at least this many sidecars plan on worker processes in "auto" mode.
+PROCESS_POOL_THRESHOLD = 5000
+DEFAULT_CHUNK_SIZE = 64
+MEDIA_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.mp4', '.mov', '.heic'}
+USED_METADATA_DIRNAME = "Used_Metadata"
+
+class PipelineError(Exception):
+    """A run cannot start: a bad option, a missing or unwritable folder, or no saved run state."""
+
+class RunCancelled(Exception):
+    """A run stopped because its ``cancel`` event was set; the work finished so far is saved."""
+
+@dataclass
+class ExportScan:
+    """Indexes built by a single pass over an export tree.
+
+    ``media_index`` maps lowercase filenames to media paths, ``sidecar_index``
+    maps a media path to the sidecar JSON sitting next to it, and
+    ``file_stats`` keeps the ``(size, mtime)`` of every indexed file so later
+    stages never need to stat them again. ``inodes`` holds their inode
+    numbers for :func:`photo_metadata_tuning.locality_order`.
+    """
+    media_index: dict = field(default_factory=dict)
+    sidecar_index: dict = field(default_factory=dict)
+    json_paths: list = field(default_factory=list)
+    file_stats: dict = field(default_factory=dict)
+    inodes: dict = field(default_factory=dict)
+
+def _scan_directory(directory, media_exts):
+    """List one directory: return its subdirectories and ``(entry, media_name, stat)`` of indexable files.
+
+    ``media_name`` is the name of the media file a sidecar belongs to (see
+    :func:`~photo_metadata_match.sidecar_media_name`), or None for media.
+    """
+    subdirs = []
+    files = []
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return subdirs, files
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                name = entry.name
+                media_name = sidecar_media_name(name, media_exts)
+                if media_name is None and os.path.splitext(name)[1].lower() not in media_exts:
+                    continue
+                files.append((entry, media_name, entry.stat()))
+            except OSError:
+                continue
+    return subdirs, files
+
+def _walk(pending, media_exts):
+    while pending:
+        directory = pending.pop()
+        yield directory, _scan_directory(directory, media_exts)
+
+def scan_export(root_dir, media_exts, exclude=(), tuner=None):
+    """Walk root_dir once with os.scandir, indexing media and sidecar JSON together.
+
+    Directories in ``exclude`` are skipped. With a
+    :class:`~photo_metadata_tuning.ConcurrencyTuner` running more than one
+    worker, directories are listed concurrently.
+    """
+    scan = ExportScan()
+    exclude = {os.fspath(p) for p in exclude}
+    pending = deque([os.fspath(root_dir)])
+    if tuner is not None and not (tuner.settled and tuner.workers == 1):
+        listings = tuned_map(partial(_scan_directory, media_exts=media_exts), pending, tuner)
+    else:
+        listings = _walk(pending, media_exts)
+    for directory, (subdirs, files) in listings:
+        pending.extend(d for d in subdirs if d not in exclude)
+        media_names = {}
+        sidecar_names = {}
+        for entry, media_name, st in files:
+            name = entry.name
+            path = Path(entry.path)
+            scan.file_stats[path] = (st.st_size, st.st_mtime)
+            scan.inodes[path] = st.st_ino
+            if media_name is not None:
+                sidecar_names[media_name] = path
+                scan.json_paths.append(path)
+            else:
+                media_names[name] = path
+                scan.media_index.setdefault(name.lower(), []).append(path)
+        for name, media_path in media_names.items():
+            sidecar = sidecar_names.get(name)
+            if sidecar is not None:
+                scan.sidecar_index[media_path] = sidecar
+    return scan
 
 def index_media_files(root_dir, media_exts):
     """Return a mapping of filename to paths for all media files under root_dir."""
-    media_index = {}
-    for root, _, files in os.walk(root_dir):
-        for file in files:
-            ext = Path(file).suffix.lower()
-            if ext in media_exts:
-                key = file.lower()
-                full_path = Path(root) / file
-                media_index.setdefault(key, []).append(full_path)
-    return media_index
+    return scan_export(root_dir, media_exts).media_index
 
 def load_json_metadata(json_path):
     """Load a JSON file and return the parsed data or None on failure."""
@@ -62,281 +141,1438 @@ def load_json_metadata(json_path):
     except json.JSONDecodeError:
         return None
 
-def get_duplicate_type(matches, metadata_url, media_index):
-    """Determine if a set of files are duplicates based on metadata URLs."""
-    urls_seen = []
-    for match in matches:
-        match_json_path = match.parent / (match.name + ".supplemental-metadata.json")
-        if match_json_path.exists():
-            match_data = load_json_metadata(match_json_path)
-            urls_seen.append(match_data.get("url", "") if match_data else "")
-        else:
-            urls_seen.append(metadata_url)
-    if urls_seen.count(metadata_url) == len(matches):
+def load_records(json_paths, parallel_workers=4, tuner=None):
+    """Load stage: yield a :class:`SidecarRecord` for each path as it is parsed.
+
+    With a :class:`~photo_metadata_tuning.ConcurrencyTuner` that is still
+    tuning, records come in the order parsing finishes and its worker count
+    is used instead of parallel_workers.
+    """
+    if tuner is not None:
+        if not tuner.settled:
+            for path, data in tuned_map(load_json_metadata, json_paths, tuner):
+                yield SidecarRecord(path, data)
+            return
+        parallel_workers = tuner.workers
+    if parallel_workers <= 1:
+        for path in json_paths:
+            yield SidecarRecord(path, load_json_metadata(path))
+        return
+    from concurrent.futures import ThreadPoolExecutor
+
+    json_paths = list(json_paths)
+    with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
+        for path, data in zip(json_paths, executor.map(load_json_metadata, json_paths)):
+            yield SidecarRecord(path, data)
+
+def load_sidecars(json_paths, parallel_workers=4, tuner=None):
+    """Parse every sidecar in json_paths once and return a path -> data mapping (see :func:`load_records`)."""
+    return {record.path: record.data for record in load_records(json_paths, parallel_workers, tuner)}
+
+def build_url_index(sidecar_index, documents):
+    """Map each media path whose adjacent sidecar was parsed to that sidecar's url."""
+    url_index = {}
+    for media_path, sidecar in sidecar_index.items():
+        if sidecar in documents:
+            data = documents[sidecar]
+            url_index[media_path] = data.get("url", "") if data else ""
+    return url_index
+
+def index_duplicate_groups(media_index, url_index):
+    """Return the distinct sidecar urls of every filename group in one linear pass."""
+    return {
+        key: {url_index[p] for p in paths if p in url_index}
+        for key, paths in media_index.items()
+    }
+
+def classify_duplicates(matches, metadata_url, group_urls):
+    """Classify matches given the distinct urls of their adjacent sidecars.
+
+    Matches without a sidecar count as agreeing with ``metadata_url``.
+    """
+    if group_urls <= {metadata_url}:
         return "Exact Duplicate" if len(matches) > 1 else "Unique"
     return "Misleading Duplicate"
 
-def apply_metadata_batch(batch_commands, dry_run):
-    """Execute a batch of exiftool commands or preview them when dry_run."""
+def get_duplicate_type(matches, metadata_url, media_index, sidecar_index=None, url_index=None):
+    """Determine if a set of files are duplicates based on metadata URLs.
+
+    When ``sidecar_index`` from :func:`scan_export` is given it is used to find
+    each match's sidecar instead of probing the filesystem, and a prebuilt
+    ``url_index`` avoids parsing those sidecars again.
+    """
+    if url_index is not None:
+        return classify_duplicates(
+            matches, metadata_url, {url_index[m] for m in matches if m in url_index}
+        )
+    urls_seen = set()
+    for match in matches:
+        if sidecar_index is not None:
+            match_json_path = sidecar_index.get(match)
+        else:
+            match_json_path = match.parent / (match.name + SIDECAR_SUFFIX)
+            if not match_json_path.exists():
+                match_json_path = None
+        if match_json_path is not None:
+            match_data = load_json_metadata(match_json_path)
+            urls_seen.add(match_data.get("url", "") if match_data else "")
+    return classify_duplicates(matches, metadata_url, urls_seen)
+
+def apply_metadata_batch(batch_commands, dry_run, workers=1):
+    """Execute a batch of exiftool commands or preview them when dry_run.
+
+    Returns a mapping of each command's target file to ``None`` on success or
+    an error message on failure.
+    """
     if not batch_commands:
-        return True
+        return {}
 
     print(f"Prepared {len(batch_commands)} exiftool commands")
     if dry_run:
+        import shlex
+
         print("\n--- Batch Commands Preview ---")
         for cmd in batch_commands:
             print(" ".join(shlex.quote(c) for c in cmd))
-        return True
+        return {cmd[-1]: None for cmd in batch_commands}
 
-    if not shutil.which("exiftool"):
-        print(
-            "Error: 'exiftool' not found. Please install exiftool and ensure it is in your PATH.",
-            file=sys.stderr,
-        )
-        return False
+    error = exiftool_unavailable()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return {cmd[-1]: error for cmd in batch_commands}
 
-    if ExifTool is None:
-        print("Error: pyexiftool not installed", file=sys.stderr)
-        return False
+    print(f"Executing exiftool with {len(batch_commands)} commands")
+    with ExifToolPool(workers) as pool:
+        futures = [(cmd[-1], pool.submit(cmd)) for cmd in batch_commands]
+    results = {}
+    for target, future in futures:
+        error = future.exception()
+        results[target] = str(error) if error else None
+        if error:
+            print(f"Exiftool error for {target}: {error}", file=sys.stderr)
+    return results
 
+def default_report_path(output_path=None, report_format="csv"):
+    """Return the report location, defaulting to the Desktop."""
+    if output_path:
+        return Path(output_path).expanduser()
+    return Path.home() / "Desktop" / f"metadata_report.{report_format}"
+
+def open_report(log_csv_path, report_format="csv"):
+    """Return a :class:`~photo_metadata_report.ReportWriter` for log_csv_path.
+
+    Raises :class:`PipelineError` if the report cannot be written.
+    """
+    log_csv_path.parent.mkdir(parents=True, exist_ok=True)
+    if not check_directory_writable(log_csv_path.parent):
+        raise PipelineError(
+            f"Cannot write to '{log_csv_path.parent}'. Close other apps that might lock the files."
+        )
     try:
-        print(f"Executing exiftool with {len(batch_commands)} commands")
-        with ExifTool() as et:
-            for cmd in batch_commands:
-                et.execute(*[c.encode() for c in cmd])
-        return True
+        return ReportWriter(log_csv_path, report_format)
     except Exception as e:
-        print(f"Exiftool batch error: {e}", file=sys.stderr)
-        return False
+        raise PipelineError(f"Failed to write {report_format.upper()} log: {e}")
 
-def process_metadata_files(project_root, dry_run=True, parallel_workers=4, output_path=None):
-    """Process all JSON metadata files under project_root."""
-    root_path = Path(project_root).expanduser()
-    if not root_path.exists():
-        print(f"Error: Project root '{root_path}' does not exist.", file=sys.stderr)
-        sys.exit(1)
+def write_csv_report(log_rows, log_csv_path, report_format="csv"):
+    """Write report rows to log_csv_path using the union of their keys as header."""
+    with open_report(log_csv_path, report_format) as report:
+        report.write_rows(row for row in log_rows if isinstance(row, dict))
 
-    if not check_directory_writable(root_path):
-        print(
-            f"Error: Unable to write to '{root_path}'. Close other apps that might lock the files.",
-            file=sys.stderr,
-        )
-        sys.exit(1)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
 
-    homeless_json_dir = root_path / "Unmatched_Metadata"
-    homeless_json_dir.mkdir(parents=True, exist_ok=True)
+def parse_xmp_policy(specs):
+    """Turn ``EXT[:MIN_SIZE]`` strings (e.g. ``.mov``, ``heic:20M``) into {ext: min_bytes}.
 
-    media_extensions = {'.jpg', '.jpeg', '.png', '.mp4', '.mov', '.heic'}
-    media_index = index_media_files(root_path, media_extensions)
+    Media with a listed extension and at least that many bytes get an XMP
+    sidecar instead of an in-place rewrite.
+    """
+    policy = {}
+    for spec in specs or ():
+        ext, _, size = spec.partition(":")
+        ext = "." + ext.lower().lstrip(".")
+        size = size.strip().upper().rstrip("B")
+        unit = size[-1:] if size[-1:] in SIZE_UNITS else ""
+        try:
+            policy[ext] = int(float(size[:len(size) - len(unit)] or 0) * SIZE_UNITS[unit])
+        except ValueError:
+            raise ValueError(f"Invalid XMP sidecar size in '{spec}'")
+    return policy
 
-    log_rows = []
-    csv_headers = ["JSON Filename", "Matched Media", "Title", "URL", "Match Type",
-                   "Modified?", "File Size in bytes", "Notes", "Missing Fields"]
+def uses_xmp_sidecar(ext, size, policy):
+    """Return True if a media file with this extension and size gets an XMP sidecar."""
+    return ext in policy and (size or 0) >= policy[ext]
 
-    batch_commands = []
+def xmp_sidecar_path(media_path):
+    """Return the ``<name>.xmp`` sidecar path Apple Photos picks up for media_path."""
+    return media_path.with_suffix(".xmp")
 
-    def process_json(json_path):
-        nonlocal batch_commands
-        file = json_path.name
-        data = load_json_metadata(json_path)
-        if not data:
-            row = {
-                "JSON Filename": file,
-                "Matched Media": "",
-                "Title": "",
-                "URL": "",
-                "Match Type": "",
-                "Modified?": "No",
-                "File Size in bytes": "",
-                "Notes": "Invalid JSON",
-                "Missing Fields": "ALL",
-            }
-            return [row]
-
-        title = data.get("title", "").lower()
-        url = data.get("url", "")
-        desc = data.get("description", "")
-        image_views = data.get("imageViews", "")
-        device_type = data.get("googlePhotosOrigin", {}).get("mobileUpload", {}).get("deviceType", "")
-        timestamp = data.get("photoTakenTime", {}).get("timestamp") or data.get("creationTime", {}).get("timestamp")
-        geo = data.get("geoDataExif", {}) or data.get("geoData", {})
-
-        missing_fields = []
-        if not timestamp:
-            missing_fields.append("timestamp")
-        if not title:
-            missing_fields.append("title")
-        inject_geo = "latitude" in geo and "longitude" in geo
-        if not inject_geo:
-            geo = {}
-            missing_fields.append("geo")
-
-        matched_files = media_index.get(title, [])
-        match_type = "No Match"
-        modified = "No"
-        note = ""
-
-        if not matched_files:
-            try:
-                shutil.move(str(json_path), homeless_json_dir / file)
-                note = "No matching media file found; moved JSON"
-            except Exception as e:
-                note = f"Failed to move JSON: {e}"
+def shared_xmp_sidecars(media_paths):
+    """Return the media paths whose :func:`xmp_sidecar_path` another file in the same folder also maps to.
+
+    A Live Photo's ``IMG_0001.HEIC`` and ``IMG_0001.MOV`` (or any two files
+    sharing a stem) would write the same ``IMG_0001.xmp``, and Photos would
+    attach the last one written to both. Names are compared case-insensitively,
+    as on the default macOS file system.
+    """
+    by_sidecar = {}
+    for path in media_paths:
+        by_sidecar.setdefault(str(xmp_sidecar_path(path)).lower(), []).append(path)
+    return {path for paths in by_sidecar.values() if len(paths) > 1 for path in paths}
+
+@dataclass
+class PlanContext:
+    """Read-only lookups the match, classify and plan stages need; picklable for worker processes.
+
+    With ``content_dedup``, duplicates are classified by content: ``canonical``
+    maps each byte-identical copy to the one copy that gets patched.
+    ``xmp_policy`` is a :func:`parse_xmp_policy` mapping. ``keys`` maps
+    the sidecars that match media by something other than their lowercased
+    title (see :class:`~photo_metadata_match.MatchIndex`) to their media
+    index key. Media in ``xmp_shared`` (see :func:`shared_xmp_sidecars`)
+    are written in place even when the policy asks for an XMP sidecar.
+    """
+    media_index: dict
+    group_urls: dict
+    file_stats: dict
+    dry_run: bool = True
+    content_dedup: bool = False
+    canonical: dict = field(default_factory=dict)
+    xmp_policy: dict = field(default_factory=dict)
+    keys: dict = field(default_factory=dict)
+    xmp_shared: set = field(default_factory=set)
+
+# Records passed between the pipeline stages, one per sidecar. They declare
+# __slots__ by hand (dataclass(slots=True) needs Python 3.10) to keep
+# per-sidecar memory small.
+
+@dataclass
+class SidecarRecord:
+    """A sidecar JSON file and its parsed content (None if it is not valid JSON)."""
+    __slots__ = ("path", "data")
+    path: Path
+    data: object
+
+@dataclass
+class MatchRecord:
+    """A sidecar with its media index key and the media files of that name.
+
+    ``title`` is the lowercased title, unless Takeout stored the media under
+    another name (see :attr:`PlanContext.keys`).
+    """
+    __slots__ = ("path", "data", "title", "matches")
+    path: Path
+    data: object
+    title: str
+    matches: list
+
+@dataclass
+class ClassifiedRecord:
+    """A matched sidecar and its duplicate class.
+
+    ``target`` is the one media file to patch, or None when nothing may be
+    patched (no match, or duplicates that must be left alone).
+    """
+    __slots__ = ("path", "data", "title", "matches", "match_type", "target")
+    path: Path
+    data: object
+    title: str
+    matches: list
+    match_type: str
+    target: object
+
+@dataclass
+class PlannedRecord:
+    """Report rows, exiftool command (or None) and run state outcome planned for one sidecar.
+
+    ``title`` is the media index key of :class:`MatchRecord`.
+    """
+    __slots__ = ("path", "title", "rows", "cmd", "outcome")
+    path: Path
+    title: str
+    rows: list
+    cmd: object
+    outcome: str
+
+@dataclass
+class ResultRecord:
+    """Final outcome of one sidecar; ``error`` is the exiftool error of a failed write."""
+    __slots__ = ("path", "title", "rows", "cmd", "outcome", "error")
+    path: Path
+    title: str
+    rows: list
+    cmd: object
+    outcome: str
+    error: object
+
+def match_sidecar(record, ctx):
+    """Match stage for one :class:`SidecarRecord`: look its key up in ``ctx.media_index``."""
+    data = record.data
+    title = data.get("title", "").lower() if data else ""
+    key = ctx.keys.get(record.path, title)
+    return MatchRecord(record.path, data, key, ctx.media_index.get(key, []) if data else [])
+
+def classify_match(record, ctx):
+    """Classify stage for one :class:`MatchRecord`: pick its duplicate class and target file."""
+    matches = record.matches
+    if not record.data or not matches:
+        match_type = "No Match" if record.data else ""
+        return ClassifiedRecord(record.path, record.data, record.title, matches, match_type, None)
+
+    url = record.data.get("url", "")
+    match_type = classify_duplicates(matches, url, ctx.group_urls.get(record.title, set()))
+    copies = {ctx.canonical.get(m, m) for m in matches}
+    if ctx.content_dedup and len(matches) > 1:
+        # Byte-identical copies are one photo: patch the canonical copy once.
+        match_type = "Exact Duplicate" if len(copies) == 1 else "Misleading Duplicate"
+    target = None
+    if match_type == "Unique" or (ctx.content_dedup and len(copies) == 1):
+        target = copies.pop() if len(matches) > 1 else matches[0]
+    return ClassifiedRecord(record.path, record.data, record.title, matches, match_type, target)
+
+def plan_match(record, ctx):
+    """Plan stage for one :class:`ClassifiedRecord`: build its report rows and exiftool command.
+
+    An ``"unmatched"`` outcome asks the apply stage to move the sidecar to
+    ``Unmatched_Metadata``; nothing here touches the filesystem.
+    """
+    file = record.path.name
+    data = record.data
+    if not data:
+        row = {
+            "JSON Filename": file,
+            "Matched Media": "",
+            "Title": "",
+            "URL": "",
+            "Match Type": "",
+            "Modified?": "No",
+            "File Size in bytes": "",
+            "Notes": "Invalid JSON",
+            "Missing Fields": "ALL",
+        }
+        return PlannedRecord(record.path, "", [row], None, "invalid")
+
+    fields = decode_sidecar(data)
+    title = fields.title.lower()
+    url = fields.url
+    timestamp = fields.timestamp
+    flat_json = fields.flat
+
+    missing_fields = []
+    if not timestamp:
+        missing_fields.append("timestamp")
+    if not title:
+        missing_fields.append("title")
+    if fields.geo is None:
+        missing_fields.append("geo")
+
+    matched_files = record.matches
+    match_type = record.match_type
+    modified = "No"
+    note = ""
+
+    if not matched_files:
+        row = {
+            "JSON Filename": file,
+            "Matched Media": "",
+            "Title": title,
+            "URL": url,
+            "Match Type": match_type,
+            "Modified?": modified,
+            "File Size in bytes": "",
+            "Notes": note,
+            "Missing Fields": ", ".join(missing_fields),
+            **flat_json,
+        }
+        return PlannedRecord(record.path, record.title, [row], None, "unmatched")
 
-            flat_json = flatten_json(data)
-            row = {
+    if record.target is None:
+        rows = []
+        for match in matched_files:
+            size = ctx.file_stats[match][0]
+            rows.append({
                 "JSON Filename": file,
-                "Matched Media": "",
+                "Matched Media": match.name,
                 "Title": title,
                 "URL": url,
                 "Match Type": match_type,
                 "Modified?": modified,
-                "File Size in bytes": "",
-                "Notes": note,
+                "File Size in bytes": size,
+                "Notes": f"Skipped overwrite due to {match_type.lower()}",
                 "Missing Fields": ", ".join(missing_fields),
                 **flat_json,
-            }
-            return [row]
-
-        match_type = get_duplicate_type(matched_files, url, media_index)
-
-        if match_type != "Unique":
-            rows = []
-            flat_json = flatten_json(data)
-            for match in matched_files:
-                size = match.stat().st_size
-                rows.append({
-                    "JSON Filename": file,
-                    "Matched Media": match.name,
-                    "Title": title,
-                    "URL": url,
-                    "Match Type": match_type,
-                    "Modified?": modified,
-                    "File Size in bytes": size,
-                    "Notes": f"Skipped overwrite due to {match_type.lower()}",
-                    "Missing Fields": ", ".join(missing_fields),
-                    **flat_json,
-                })
-            return rows
-
-        match = matched_files[0]
-        size = match.stat().st_size
-        if timestamp:
-            dt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y:%m:%d %H:%M:%S")
-            comment = f"{url} {desc} Device:{device_type} Views:{image_views}".strip()
-            ext = match.suffix.lower()
-            cmd = ['-overwrite_original_in_place']
-
-            if ext in {'.mp4', '.mov'}:
-                cmd += [
-                    f'-QuickTime:CreateDate={dt}',
-                    f'-Keys:CreationDate={dt}',
-                    f'-UserData:Comment={comment}'
-                ]
-            elif ext in {'.heic', '.jpg', '.jpeg', '.png'}:
+            })
+        return PlannedRecord(record.path, record.title, rows, None, "skipped")
+
+    match = record.target
+    size = ctx.file_stats[match][0]
+    cmd = None
+    if timestamp:
+        dt = datetime.utcfromtimestamp(int(timestamp)).strftime("%Y:%m:%d %H:%M:%S")
+        comment = f"{url} {fields.description} Device:{fields.device_type} Views:{fields.image_views}".strip()
+        ext = match.suffix.lower()
+        xmp = uses_xmp_sidecar(ext, size, ctx.xmp_policy)
+        shared = xmp and match in ctx.xmp_shared
+        xmp = xmp and not shared
+        # An XMP sidecar may not exist yet, so it is written (or created) normally.
+        cmd = ['-overwrite_original' if xmp else '-overwrite_original_in_place']
+
+        if xmp:
+            cmd += [
+                f'-XMP-exif:DateTimeOriginal={dt}',
+                f'-XMP-xmp:CreateDate={dt}',
+                f'-XMP-exif:UserComment={comment}'
+            ]
+        elif ext in {'.mp4', '.mov'}:
+            cmd += [
+                f'-QuickTime:CreateDate={dt}',
+                f'-Keys:CreationDate={dt}',
+                f'-UserData:Comment={comment}'
+            ]
+        elif ext in {'.heic', '.jpg', '.jpeg', '.png'}:
+            cmd += [
+                f'-AllDates={dt}',
+                f'-XPComment={comment}'
+            ]
+
+        if fields.geo is not None:
+            lat, lon, alt = fields.geo
+            group = 'XMP-exif:' if xmp else ''
+            cmd += [
+                f'-{group}GPSLatitude={lat}',
+                f'-{group}GPSLongitude={lon}',
+                f'-{group}GPSAltitude={alt}'
+            ]
+            if not xmp and ext in {'.heic', '.jpg', '.jpeg', '.png'}:
+                # EXIF stores unsigned coordinates; exiftool takes the
+                # hemisphere from the signed value given to each Ref tag.
                 cmd += [
-                    f'-AllDates={dt}',
-                    f'-XPComment={comment}'
+                    f'-GPSLatitudeRef={lat}',
+                    f'-GPSLongitudeRef={lon}',
+                    f'-GPSAltitudeRef={alt}'
                 ]
+        else:
+            note = "Metadata queued without GPS"
+
+        cmd.append(str(xmp_sidecar_path(match) if xmp else match))
+  # Ensure we have at least one metadata field *before* the file path
+        if not any(arg.startswith('-') for arg in cmd[:-1]):
+            cmd = None
+            note = "Metadata skipped: no valid operations"
+        modified = "Yes" if not ctx.dry_run else "No"
+        note = "Metadata queued" if not ctx.dry_run and not note else note
+        if ctx.dry_run:
+            note = "Dry run only"
+        if xmp:
+            note = f"{note}; XMP sidecar {xmp_sidecar_path(match).name}"
+        elif shared:
+            note = f"{note}; written in place, another file shares {xmp_sidecar_path(match).name}"
+        if len(matched_files) > 1:
+            note = f"{note}; patching one of {len(matched_files)} identical copies"
+
+    for key in ["title", "url"]:
+        flat_json.pop(key, None)
+    row = {
+        "JSON Filename": file,
+        "Matched Media": match.name,
+        "Title": title,
+        "URL": url,
+        "Match Type": match_type,
+        "Modified?": modified,
+        "File Size in bytes": size,
+        "Notes": note,
+        "Missing Fields": ", ".join(missing_fields),
+        **flat_json  # injects all flattened JSON keys except duplicates
+    }
+    return PlannedRecord(record.path, record.title, [row], cmd, "planned" if cmd else "skipped")
+
+def plan_record(record, ctx):
+    """Run the match, classify and plan stages on one :class:`SidecarRecord`.
+
+    This is a pure function of its arguments so it can run in a worker process.
+    """
+    return plan_match(classify_match(match_sidecar(record, ctx), ctx), ctx)
+
+def plan_sidecar(json_path, data, ctx):
+    """Return (rows, exiftool command or None, state outcome) for one parsed sidecar."""
+    planned = plan_record(SidecarRecord(json_path, data), ctx)
+    return planned.rows, planned.cmd, planned.outcome
+
+def match_records(records, ctx):
+    """Match stage: yield a :class:`MatchRecord` for each :class:`SidecarRecord`."""
+    for record in records:
+        yield match_sidecar(record, ctx)
+
+def classify_records(records, ctx):
+    """Classify stage: yield a :class:`ClassifiedRecord` for each :class:`MatchRecord`."""
+    for record in records:
+        yield classify_match(record, ctx)
+
+def plan_records(records, ctx):
+    """Plan stage: yield a :class:`PlannedRecord` for each :class:`ClassifiedRecord`."""
+    for record in records:
+        yield plan_match(record, ctx)
+
+def plan_chunk(ctx, records):
+    """Plan a chunk of :class:`SidecarRecord`, returning their :class:`PlannedRecord` in order."""
+    return [plan_record(record, ctx) for record in records]
+
+_worker_context = None
 
-            if inject_geo:
+def _init_plan_worker(ctx):
+    global _worker_context
+    _worker_context = ctx
+
+def _plan_chunk_in_worker(records):
+    return plan_chunk(_worker_context, records)
+
+def choose_executor(mode, count, workers):
+    """Resolve ``mode`` ("auto", "threads" or "processes") for a run of count sidecars.
+
+    Worker processes only pay off once the planning work outweighs the cost
+    of starting them and pickling each chunk, so small runs stay on threads.
+    """
+    if mode != "auto":
+        return mode
+    if workers > 1 and (os.cpu_count() or 1) > 1 and count >= PROCESS_POOL_THRESHOLD:
+        return "processes"
+    return "threads"
+
+def iter_chunks(items, size):
+    """Yield lists of up to size items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def plan_parallel(records, ctx, workers=4, mode="auto", chunk_size=None, count=None):
+    """Yield a :class:`PlannedRecord` for each :class:`SidecarRecord`, in order.
+
+    The match, classify and plan stages run on chunks of records in a thread
+    or process pool chosen by :func:`choose_executor`; worker processes
+    receive ``ctx`` once. At most two chunks per worker are in flight, so
+    records are read from the input only as fast as results are consumed,
+    and closing the generator drops the chunks not yet started.
+    """
+    mode = choose_executor(mode, count or 0, workers)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if mode == "threads" and workers <= 1:
+        for chunk in iter_chunks(records, chunk_size):
+            yield from plan_chunk(ctx, chunk)
+        return
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    if mode == "processes":
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_plan_worker, initargs=(ctx,)
+        )
+        run = _plan_chunk_in_worker
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        run = partial(plan_chunk, ctx)
+    # Executor.map would submit every chunk before yielding the first result.
+    in_flight = deque()
+    with executor:
+        try:
+            for chunk in iter_chunks(records, chunk_size):
+                in_flight.append(executor.submit(run, chunk))
+                if len(in_flight) >= 2 * workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+def plan_sidecars(items, ctx, workers=4, mode="auto", chunk_size=None, count=None):
+    """Yield :func:`plan_sidecar` results for ``(json_path, data)`` items, in order (see :func:`plan_parallel`)."""
+    records = (SidecarRecord(json_path, data) for json_path, data in items)
+    for planned in plan_parallel(records, ctx, workers, mode, chunk_size, count):
+        yield planned.rows, planned.cmd, planned.outcome
+
+def report_records(records, writer):
+    """Report stage: write the rows of each record to a report writer and pass the record on."""
+    for record in records:
+        writer.write_rows(record.rows)
+        yield record
+
+class Pipeline:
+    """The stages of one run over an export, as generators of per-sidecar records.
+
+    :meth:`results` chains them all: sidecars unchanged since the last run
+    are passed on from the run state, and the others go through
+    :meth:`load`, :meth:`index`, :meth:`plan` and :meth:`apply`. The stages
+    can also be chained by hand to filter records or watch them go by::
+
+        with Pipeline(root, dry_run=False) as pipeline:
+            records = pipeline.index(pipeline.load(pipeline.changed()))
+            planned = (p for p in pipeline.plan(records) if p.title.endswith(".jpg"))
+            for result in pipeline.apply(planned):
+                ...
+
+    Classification compares a sidecar with every other sidecar of its title,
+    so :meth:`index` reads all of its input before planning starts; from
+    there on records stream one at a time. Problems that keep a run from
+    starting raise :class:`PipelineError`. Options are those of
+    :func:`process_metadata_files`.
+
+    ``on_progress(phase, done, total, elapsed)`` is called, a few times a
+    second at most and from the thread running the pipeline, as the scan,
+    parse, dedup, read and apply phases advance (``total`` is None while the
+    scan has not finished); it replaces the console progress bar. When the
+    ``cancel`` event (anything with ``is_set()``, such as a
+    :class:`threading.Event`) is set, the run stops at the next sidecar:
+    writes already handed to exiftool are completed and recorded, nothing
+    new is started, and :class:`RunCancelled` is raised.
+    """
+
+    def __init__(self, project_root, dry_run=True, parallel_workers=4, use_state=True,
+                 exiftool_workers=None, executor_mode="auto", chunk_size=None, profile_out=None,
+                 content_dedup=True, move_duplicates=False, read_check=True, xmp_sidecars=None,
+                 native_writer=True, scan_workers=None, parse_workers=None, scan=None,
+                 state_filename=STATE_FILENAME, prune_state=True, on_progress=None, cancel=None,
+                 move_used_metadata=False):
+        self.root = Path(project_root).expanduser()
+        try:
+            self.xmp_policy = parse_xmp_policy(xmp_sidecars)
+        except ValueError as e:
+            raise PipelineError(str(e))
+        if not self.root.exists():
+            raise PipelineError(f"Project root '{self.root}' does not exist.")
+        # Dry runs, and plans that never reach apply, leave the export as it is.
+        if not dry_run and not check_directory_writable(self.root):
+            raise PipelineError(
+                f"Unable to write to '{self.root}'. Close other apps that might lock the files."
+            )
+        self.dry_run = dry_run
+        self.executor_mode = executor_mode
+        self.chunk_size = chunk_size
+        self.profile_out = profile_out
+        self.content_dedup = content_dedup
+        self.move_duplicates = move_duplicates
+        self.move_used_metadata = move_used_metadata
+        self.read_check = read_check
+        self.native_writer = native_writer
+        self.prune_state = prune_state
+        self.on_progress = on_progress
+        self.cancel = cancel
+
+        self.unmatched_dir = self.root / "Unmatched_Metadata"
+        if not dry_run:
+            self.unmatched_dir.mkdir(parents=True, exist_ok=True)
+        self.duplicates_dir = self.root / DUPLICATES_DIRNAME
+        self.used_dir = self.root / USED_METADATA_DIRNAME
+        self.journal = FileJournal(self.root)
+
+        auto = parallel_workers == AUTO
+        self.plan_workers = (os.cpu_count() or 1) if auto else parallel_workers
+        self.scan_tuner = make_tuner("scan", scan_workers if scan_workers is not None else (AUTO if auto else 1))
+        self.parse_tuner = make_tuner("parse", parse_workers if parse_workers is not None else parallel_workers)
+        self.exiftool_tuner = make_tuner(
+            "exiftool", exiftool_workers if exiftool_workers is not None else parallel_workers
+        )
+
+        self.metrics = Metrics()
+        self.walked = scan is None
+        self._scan = scan
+        self._scanned = False
+        self._changed = None
+        self._unchanged = None
+        self.state = RunState(self.root, readonly=dry_run, filename=state_filename) if use_state else None
+        self.ctx = None
+        self.exec_error = None
+        self.current_tags = None
+        self.failures = 0
+        self.used_pool = False
+        self._seen = set()
+        self._patched = set()
+        self._moved = set()
+        self._written = {}
+        self._reserved = set()
+        self._move_results = []
+        self._waiting = {}
+        self._finished = False
+
+    def cancelled(self):
+        """Return True once the ``cancel`` event is set."""
+        return self.cancel is not None and self.cancel.is_set()
+
+    def _check_cancel(self):
+        if self.cancelled():
+            raise RunCancelled("Cancelled")
+
+    def _progress(self, phase, total, prefix=None):
+        """Return a :class:`ProgressReporter` for phase; without ``on_progress`` only prefixed phases draw a bar."""
+        if self.on_progress is not None:
+            draw = lambda count, total, elapsed: self.on_progress(phase, count, total, elapsed)
+        elif prefix is not None:
+            draw = None
+        else:
+            draw = lambda count, total, elapsed: None
+        return ProgressReporter(total, prefix=prefix or "", draw=draw)
+
+    def scan(self):
+        """Scan stage: return the :class:`ExportScan` of the export, walking it on first use."""
+        if not self._scanned:
+            self._check_cancel()
+            if self.on_progress is not None:
+                self.on_progress("scan", 0, None, 0.0)
+            with self.metrics.phase("scan"):
+                if self._scan is None:
+                    self._scan = scan_export(
+                        self.root, MEDIA_EXTENSIONS, exclude=[self.duplicates_dir, self.used_dir],
+                        tuner=self.scan_tuner
+                    )
+            scan = self._scan
+            self.metrics.add("scan", "items", len(scan.file_stats))
+            self.metrics.add("scan", "files_stated", len(scan.file_stats))
+            self.metrics.add("scan", "bytes_stated", sum(st[0] for st in scan.file_stats.values()))
+            self._scanned = True
+            self._progress("scan", len(scan.file_stats)).update(len(scan.file_stats))
+        return self._scan
+
+    def _split(self):
+        if self._changed is not None:
+            return
+        scan = self.scan()
+        state = self.state
+        self._changed, self._unchanged = [], []
+        for json_path in locality_order(scan.json_paths, scan.inodes):
+            if state is not None and state.is_current(json_path, scan):
+                self._unchanged.append(json_path)
+            else:
+                self._changed.append(json_path)
+        self._seen = set(scan.json_paths)
+        if self._unchanged:
+            print(f"Skipping {len(self._unchanged)} sidecars unchanged since the last run")
+
+    def changed(self):
+        """Return the sidecars that need processing, in directory and inode order."""
+        self._split()
+        return self._changed
+
+    def unchanged(self):
+        """Yield a ``"current"`` :class:`ResultRecord`, with the rows saved in the run state, for each sidecar unchanged since the last run."""
+        self._split()
+        for json_path in self._unchanged:
+            record = self.state.records[self.state.key(json_path)]
+            yield ResultRecord(
+                json_path, record["title"], self.state.rows_for(json_path), None, "current", None
+            )
+
+    def load(self, json_paths):
+        """Load stage: yield a :class:`SidecarRecord` for each sidecar as it is parsed."""
+        # cProfile does not follow worker threads, so a profiled parse runs in this one.
+        tuner = make_tuner("parse", 1) if self.profile_out else self.parse_tuner
+        return load_records(json_paths, tuner=tuner)
+
+    def _parse_and_index(self, records):
+        scan = self.scan()
+        media_index = scan.media_index
+        # Parse each sidecar exactly once: the ones being processed plus any
+        # sidecar next to a media file they match, which is only needed for its url.
+        with self.metrics.phase("parse"):
+            progress = self._progress("parse", len(self.changed()))
+            progress.update(0)
+            collected = []
+            for record in records:
+                self._check_cancel()
+                collected.append(record)
+                progress.update()
+            records = collected
+            url_documents = {record.path: record.data for record in records}
+            matcher = MatchIndex(media_index, MEDIA_EXTENSIONS)
+            keys = {}
+            titles = set()
+            for record in records:
+                if record.data:
+                    title = record.data.get("title", "").lower()
+                    key = matcher.resolve(record.path.name, title)
+                    if key != title:
+                        keys[record.path] = key
+                    titles.add(key)
+            neighbours = {
+                scan.sidecar_index[p]
+                for title in titles
+                for p in media_index.get(title, [])
+                if p in scan.sidecar_index
+            }
+            neighbours = locality_order(neighbours - url_documents.keys(), scan.inodes)
+            tuner = make_tuner("parse", 1) if self.profile_out else self.parse_tuner
+            url_documents.update((r.path, r.data) for r in load_records(neighbours, tuner=tuner))
+        self.metrics.add("parse", "items", len(url_documents))
+        self.metrics.add("parse", "bytes_read", sum(scan.file_stats.get(p, (0,))[0] for p in url_documents))
+        self.metrics.add("parse", "parse_failures", sum(1 for data in url_documents.values() if data is None))
+        with self.metrics.phase("classify", len(url_documents)):
+            group_urls = index_duplicate_groups(media_index, build_url_index(scan.sidecar_index, url_documents))
+        return records, titles, keys, group_urls
+
+    def index(self, records):
+        """Read every :class:`SidecarRecord` and build the lookups the later stages need.
+
+        The sidecars next to matched media are parsed for their urls,
+        same-named media are hashed for content dedup and, with
+        ``read_check``, the current tags of the files that may be patched
+        are read. Returns the records as a list for :meth:`plan`.
+        """
+        if self.profile_out:
+            import cProfile
+            profiler = cProfile.Profile()
+            records, titles, keys, group_urls = profiler.runcall(self._parse_and_index, records)
+            profiler.dump_stats(str(Path(self.profile_out).expanduser()))
+            print(f"Parse stage profile written to {self.profile_out}")
+        else:
+            records, titles, keys, group_urls = self._parse_and_index(records)
+        scan = self.scan()
+        media_index = scan.media_index
+
+        canonical = {}
+        if self.content_dedup:
+            candidates = {p for t in titles for p in media_index.get(t, []) if len(media_index[t]) > 1}
+            hash_cache = HashCache(
+                self.state.conn if self.state is not None else None, readonly=self.dry_run, root=self.root
+            )
+            self._check_cancel()
+            progress = self._progress("dedup", len(candidates))
+            progress.update(0)
+            with self.metrics.phase("dedup", len(candidates)):
+                canonical = canonical_copies(find_content_groups(candidates, scan.file_stats, hash_cache))
+            self.metrics.add("dedup", "bytes_read", hash_cache.bytes_hashed)
+            progress.update(len(candidates))
+
+        # Only ship the lookups these sidecars can hit to the planning workers.
+        file_stats = {p: scan.file_stats[p] for t in titles for p in media_index.get(t, [])}
+        xmp_shared = set()
+        if self.xmp_policy:
+            every_media = (p for paths in media_index.values() for p in paths)
+            xmp_shared = shared_xmp_sidecars(every_media) & file_stats.keys()
+        self.ctx = PlanContext(
+            media_index={t: media_index[t] for t in titles if t in media_index},
+            group_urls={t: group_urls[t] for t in titles if t in group_urls},
+            file_stats=file_stats,
+            dry_run=self.dry_run,
+            content_dedup=self.content_dedup,
+            canonical=canonical,
+            xmp_policy=self.xmp_policy,
+            keys=keys,
+            xmp_shared=xmp_shared,
+        )
+
+        self.exec_error = None if self.dry_run else exiftool_unavailable()
+        if self.exec_error:
+            print(f"Error: {self.exec_error}", file=sys.stderr)
+        if self.read_check and not self.dry_run and not self.exec_error:
+            targets = set()
+            for t in titles:
+                matches = media_index.get(t, [])
+                copies = {canonical.get(m, m) for m in matches}
+                if len(matches) == 1 or (self.content_dedup and len(copies) == 1):
+                    targets.update(copies)
+            self._check_cancel()
+            progress = self._progress("read", len(targets))
+            progress.update(0)
+            with self.metrics.phase("read", len(targets)):
+                # A tuning pool has not measured anything yet: read with one process per CPU.
+                tuner = self.exiftool_tuner
+                read_workers = tuner.workers if tuner.settled else (os.cpu_count() or 1)
+                self.current_tags = read_tags(locality_order(targets, scan.inodes), workers=read_workers)
+            progress.update(len(targets))
+        return records
+
+    def plan(self, records):
+        """Plan stage: yield a :class:`PlannedRecord` for each record :meth:`index` returned.
+
+        Records are taken off the list as they are planned, so their parsed
+        JSON is freed as the run goes.
+        """
+        count = len(records)
+        records.reverse()
+        return plan_parallel(
+            (records.pop() for _ in range(count)),
+            self.ctx,
+            workers=self.plan_workers,
+            mode=self.executor_mode,
+            chunk_size=self.chunk_size,
+            count=count,
+        )
+
+    def _title_media(self, title):
+        return [p for p in self.scan().media_index.get(title, []) if p not in self._moved]
+
+    def _media_stats(self, title):
+        """Return ``(size, mtime)`` of the media of title, as left by the writes of this run."""
+        stats = self.scan().file_stats
+        return {p: self._written.get(p) or stats.get(p, ("", None)) for p in self._title_media(title)}
+
+    def _move(self, src, dst):
+        """Queue a move in the :class:`~photo_metadata_journal.FileJournal`; results come out of :meth:`_settle_moves`."""
+        self._move_results.extend(self.journal.move(src, dst))
+
+    def _settle_moves(self):
+        """Yield the :class:`ResultRecord` of each unmatched sidecar whose journaled move has run."""
+        results, self._move_results = self._move_results, []
+        for src, dst, error in results:
+            waiting = self._waiting.pop(src, None)
+            if waiting is None:
+                if error is not None:
+                    self._moved.discard(src)
+                    print(f"Failed to move '{src}': {error}", file=sys.stderr)
+                continue
+            title, rows, json_stat = waiting
+            json_path = src
+            outcome = "unmatched"
+            if error is None:
+                rows[0]["Notes"] = "No matching media file found; moved JSON"
+                # Renames keep size and mtime, so the scanned stat still applies
+                self._seen.discard(src)
+                json_path = dst
+                self._seen.add(json_path)
+            else:
+                rows[0]["Notes"] = f"Failed to move JSON: {error}"
+                outcome = "failed"
+            yield self._finish_unmatched(json_path, json_stat, title, rows, outcome)
+
+    def _finish_unmatched(self, json_path, json_stat, title, rows, outcome):
+        """Record the outcome of one unmatched sidecar and return its :class:`ResultRecord`."""
+        if self.state is not None:
+            self.state.record(json_path, json_stat, title, self._media_stats(title), None, outcome, rows)
+        return ResultRecord(json_path, title, rows, None, outcome, None)
+
+    def _unmatched_destination(self, json_path):
+        """Return a free path in Unmatched_Metadata for json_path, keeping its file name.
+
+        Sidecars go straight into the folder; when another one of the same
+        name is there (or on its way there), the sidecar's folders under the
+        export root are recreated inside it, then numbered folders are tried.
+        The name is kept because matching reads the media name from it.
+        """
+        relative = json_path.relative_to(self.root)
+        candidates = [self.unmatched_dir / json_path.name, self.unmatched_dir / relative]
+        n = 2
+        while True:
+            for dst in candidates:
+                if dst not in self._reserved and not os.path.lexists(dst):
+                    self._reserved.add(dst)
+                    return dst
+            candidates = [self.unmatched_dir / str(n) / relative]
+            n += 1
+
+    def _park_duplicates(self, title, keep):
+        """Queue moving the identical copies of keep into the Duplicates folder; return how many."""
+        count = 0
+        for p in self._title_media(title):
+            if p == keep or self.ctx.canonical.get(p) != keep:
+                continue
+            self._move(p, self.duplicates_dir / p.relative_to(self.root))
+            self._moved.add(p)
+            count += 1
+        return count
+
+    def _clean_up(self, json_path, outcome):
+        """Queue moving a sidecar whose metadata is written into the Used_Metadata folder."""
+        if outcome == "done" and self.move_used_metadata and not self.dry_run:
+            self._move(json_path, self.used_dir / json_path.relative_to(self.root))
+
+    def _finish(self, json_path, title, cmd, rows, future):
+        """Record the exiftool outcome of one submitted command."""
+        if future is not None and future.cancelled():
+            # Never started: the run state keeps it planned, so the next run writes it.
+            rows[0]["Modified?"] = "No"
+            rows[0]["Notes"] = "Cancelled before writing"
+            return ResultRecord(json_path, title, rows, cmd, "cancelled", None)
+        error = self.exec_error if future is None else future.exception()
+        if error:
+            self.failures += 1
+            rows[0]["Modified?"] = "No"
+            rows[0]["Notes"] = f"Exiftool error: {error}"
+            print(f"Exiftool error for {cmd[-1]}: {error}", file=sys.stderr)
+        outcome = "failed" if error else "done"
+        self._clean_up(json_path, outcome)
+        state = self.state
+        if state is not None:
+            media_stats = {}
+            for p in self._title_media(title):
                 try:
-                    lat = geo.get("latitude")
-                    lon = geo.get("longitude")
-                    alt = geo.get("altitude", 0.0)
-                    cmd += [
-                        f'-GPSLatitude={lat}',
-                        f'-GPSLongitude={lon}',
-                        f'-GPSAltitude={alt}'
-                    ]
-                except Exception as e:
-                    inject_geo = False
-                    note = f"Metadata queued but skipped GPS (error: {e})"
+                    st = os.stat(p)
+                    media_stats[p] = (st.st_size, st.st_mtime)
+                except OSError:
+                    media_stats[p] = ("", None)
+            if not error:
+                # The other sidecars of this title (skipped identical copies)
+                # must see the written media too, or the next run finds them
+                # changed and, the copies no longer being identical, classifies
+                # them as misleading duplicates.
+                self._written.update(media_stats)
+                state.refresh_media(title, media_stats)
+            state.record(
+                json_path,
+                state.records[state.key(json_path)]["json_stat"],
+                title,
+                media_stats,
+                cmd,
+                outcome,
+                rows,
+            )
+        return ResultRecord(json_path, title, rows, cmd, outcome, error)
+
+    def _write_without_exiftool(self, native, cmd):
+        """Write cmd with the native writer when exiftool cannot run; return a done Future."""
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            if native(cmd):
+                future.set_result(None)
             else:
-                note = "Metadata queued without GPS" if not note else note
+                future.set_exception(ExifToolError(self.exec_error))
+        except Exception as e:
+            future.set_exception(ExifToolError(f"Native write failed: {e}"))
+        return future
+
+    def decide(self, record):
+        """Return the ``(cmd, outcome)`` to carry out for a matched :class:`PlannedRecord`.
 
-            cmd.append(str(match))
-      # Ensure we have at least one metadata field *before* the file path
-            if any(arg.startswith('-') for arg in cmd[:-1]):
-                batch_commands.append(cmd)
+        The command is dropped (and the record's notes say why) when the file
+        already carries the planned values, when it is an identical copy
+        already patched for another sidecar, or when a previous run wrote the
+        same command and the media is unchanged since. Called once per record,
+        in order, by :meth:`apply` and by anything else that carries out the
+        plan, such as :func:`photo_metadata_cli.plan_to_argfile`.
+        """
+        rows, cmd, outcome = record.rows, record.cmd, record.outcome
+        current_tags = self.current_tags
+        if cmd and current_tags is not None and already_written(cmd, current_tags.get(cmd[-1])):
+            cmd = None
+            outcome = "done"
+            rows[0]["Modified?"] = "No"
+            rows[0]["Notes"] = "Already correct"
+        if cmd and rows[0]["Match Type"] == "Exact Duplicate":
+            if cmd[-1] in self._patched:
+                cmd = None
+                outcome = "skipped"
+                rows[0]["Modified?"] = "No"
+                rows[0]["Notes"] = "Identical copy already patched for another sidecar"
             else:
-                note = "Metadata skipped: no valid operations"
-            modified = "Yes" if not dry_run else "No"
-            note = "Metadata queued" if not dry_run and not note else note
-            if dry_run:
-                note = "Dry run only"
-
-        flat_json = flatten_json(data)
-        for key in ["title", "url"]:
-            flat_json.pop(key, None)
-        row = {
-            "JSON Filename": file,
-            "Matched Media": match.name,
-            "Title": title,
-            "URL": url,
-            "Match Type": match_type,
-            "Modified?": modified,
-            "File Size in bytes": size,
-            "Notes": note,
-            "Missing Fields": ", ".join(missing_fields),
-            **flat_json  # injects all flattened JSON keys except duplicates
-        }
-        return [row]
+                self._patched.add(cmd[-1])
+                if self.move_duplicates and not self.dry_run:
+                    count = self._park_duplicates(record.title, Path(cmd[-1]))
+                    if count:
+                        rows[0]["Notes"] += f"; moved {count} copies to {DUPLICATES_DIRNAME}"
+        if cmd and self.state is not None and self.state.already_applied(record.path, cmd, self.scan()):
+            cmd = None
+            outcome = "done"
+            rows[0]["Notes"] = "Already applied in a previous run"
+        return cmd, outcome
 
+    def apply(self, planned):
+        """Apply stage: carry out each :class:`PlannedRecord` and yield its :class:`ResultRecord`.
 
-    json_paths = []
-    for root, _, files in os.walk(root_path):
-        for file in files:
-            if file.endswith(".supplemental-metadata.json"):
-                json_paths.append(Path(root) / file)
+        Unmatched sidecars are moved to ``Unmatched_Metadata`` (and, with
+        ``move_duplicates`` and ``move_used_metadata``, identical copies and
+        sidecars whose metadata is written to their folders) through the
+        :class:`~photo_metadata_journal.FileJournal`, in batches; an
+        unmatched sidecar is yielded once its batch has run. The commands
+        :meth:`decide` keeps stream to the exiftool pool, and their results are
+        yielded in submission order as the writes complete. Dry runs print
+        the commands once the input is exhausted.
 
-    with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
-        total = len(json_paths)
-        for i, result in enumerate(executor.map(process_json, json_paths), 1):
-            print_progress_bar(i, total, prefix="Processing")
-            log_rows.extend(result)
+        Once the ``cancel`` event is set, queued writes that have not started
+        are dropped (yielded as ``"cancelled"``), the ones in progress finish,
+        and :class:`RunCancelled` is raised.
+        """
+        scan = self.scan()
+        state = self.state
+        dry_run = self.dry_run
+        pool = native = None
+        if not dry_run and not self.exec_error:
+            from photo_metadata_exif import write_native
 
-    success = apply_metadata_batch(batch_commands, dry_run)
-    all_keys = set()
-    for row in log_rows:
-        if isinstance(row, dict):
-            all_keys.update(row.keys())
+            pool = ExifToolPool(
+                self.exiftool_tuner.workers,
+                on_latency=self.metrics.observe_exiftool,
+                fast_path=write_native if self.native_writer else None,
+                tuner=self.exiftool_tuner,
+            )
+            self.used_pool = True
+        elif not dry_run and self.native_writer:
+            from photo_metadata_exif import write_native
 
-    fieldnames = sorted(all_keys)
+            native = write_native
+        batch_commands = []
+        submitted = deque()
+        total = len(self.changed())
+        stopped = False
+        try:
+            progress = self._progress("apply", total, prefix="Processing")
+            # Planning is lazy, so chunks planned while writes stream count here too.
+            with self.metrics.phase("apply", total):
+                for i, record in enumerate(planned, 1):
+                    if self.cancelled():
+                        for *_, future in submitted:
+                            if future is not None:
+                                future.cancel()
+                        stopped = True
+                        break
+                    progress.update(i)
+                    json_path, title, rows = record.path, record.title, record.rows
+                    cmd, outcome = record.cmd, record.outcome
+                    if outcome == "unmatched":
+                        json_stat = scan.file_stats.get(json_path)
+                        if self.unmatched_dir in json_path.parents:
+                            # An earlier run moved it here already.
+                            rows[0]["Notes"] = "No matching media file found; already in Unmatched_Metadata"
+                            yield self._finish_unmatched(json_path, json_stat, title, rows, outcome)
+                        else:
+                            self._waiting[json_path] = (title, rows, json_stat)
+                            self._move(json_path, self._unmatched_destination(json_path))
+                        yield from self._settle_moves()
+                        continue
+                    cmd, outcome = self.decide(record)
+                    json_stat = scan.file_stats.get(json_path)
+                    if state is not None:
+                        state.record(
+                            json_path,
+                            json_stat,
+                            title,
+                            self._media_stats(title),
+                            cmd,
+                            outcome,
+                            rows,
+                        )
+                    if not cmd or dry_run:
+                        if cmd:
+                            batch_commands.append(cmd)
+                        else:
+                            self._clean_up(json_path, outcome)
+                        yield ResultRecord(json_path, title, rows, cmd, outcome, None)
+                        yield from self._settle_moves()
+                        continue
+                    if pool is not None:
+                        future = pool.submit(cmd)
+                    elif native is not None:
+                        future = self._write_without_exiftool(native, cmd)
+                    else:
+                        future = None
+                    submitted.append((json_path, title, cmd, rows, future))
+                    # Pass files on as their writes complete, in submission order.
+                    while submitted and (submitted[0][4] is None or submitted[0][4].done()):
+                        yield self._finish(*submitted.popleft())
+                    yield from self._settle_moves()
+        finally:
+            if hasattr(planned, "close"):
+                planned.close()
+            if pool is not None:
+                pool.close()
+            if state is not None:
+                # Keep what was planned even if interrupted, so the next run resumes.
+                state.commit()
 
-    log_csv_path = Path(output_path).expanduser() if output_path else Path.home() / "Desktop" / "metadata_report.csv"
-    log_csv_path.parent.mkdir(parents=True, exist_ok=True)
-    if not check_directory_writable(log_csv_path.parent):
-        print(
-            f"Error: Cannot write to '{log_csv_path.parent}'. Close other apps that might lock the files.",
-            file=sys.stderr,
+        if dry_run and not stopped:
+            apply_metadata_batch(batch_commands, dry_run)
+
+        while submitted:
+            yield self._finish(*submitted.popleft())
+        self._move_results.extend(self.journal.flush())
+        yield from self._settle_moves()
+        if state is not None:
+            state.commit()
+        if stopped:
+            raise RunCancelled("Cancelled")
+        self._finished = True
+
+    def results(self):
+        """Yield a :class:`ResultRecord` for every sidecar of the export, running every stage."""
+        yield from self.unchanged()
+        records = self.index(self.load(self.changed()))
+        yield from self.apply(self.plan(records))
+
+    def tuners(self):
+        """Return the concurrency tuners of the stages that ran."""
+        return (
+            ([self.scan_tuner] if self.walked else [])
+            + [self.parse_tuner]
+            + ([self.exiftool_tuner] if self.used_pool else [])
         )
-        sys.exit(1)
-    try:
-        with open(log_csv_path, "w", newline="", encoding="utf-8") as log_file:
-            writer = csv.DictWriter(log_file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(log_rows)
 
-    except Exception as e:
-        print(f"Failed to write CSV log: {e}", file=sys.stderr)
+    def close(self):
+        """Save the run state; once :meth:`apply` has finished, forget sidecars that no longer exist."""
+        if self.state is not None:
+            if self._finished and not self.dry_run and self.prune_state:
+                self.state.prune(self._seen)
+            self.state.close()
+            self.state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@dataclass
+class RunSummary:
+    """What :func:`run_pipeline` did: where the report is, how many sidecars and failed writes."""
+    __slots__ = ("report_path", "sidecars", "failures", "metrics")
+    report_path: Path
+    sidecars: int
+    failures: int
+    metrics: object
+
+def run_pipeline(project_root, output_path=None, report_format="csv", report_only=False,
+                 archives=None, metrics_out=None, sinks=(), **options):
+    """Run every stage of a :class:`Pipeline` over project_root and write the report.
+
+    Each :class:`ResultRecord` is passed to every callable in ``sinks`` once
+    its rows are in the report. Raises :class:`PipelineError` when the run
+    cannot start and :class:`RunCancelled` when it was cancelled (the report
+    then holds the sidecars finished so far); failed exiftool writes are
+    counted in the returned :class:`RunSummary`. Other options are those of :class:`Pipeline`, and
+    the rest are described in :func:`process_metadata_files`.
+    """
+    root_path = Path(project_root).expanduser()
+    if archives:
+        from photo_metadata_archive import extract_matched_media
+        root_path.mkdir(parents=True, exist_ok=True)
+        sidecar_count, media_count = extract_matched_media(archives, root_path, MEDIA_EXTENSIONS)
+        print(f"Read {sidecar_count} sidecars from {len(archives)} archive part(s); "
+              f"extracted {media_count} matched media files")
+    if not root_path.exists():
+        raise PipelineError(f"Project root '{root_path}' does not exist.")
+
+    log_csv_path = default_report_path(output_path, report_format)
+    if report_only:
+        state_filename = options.get("state_filename", STATE_FILENAME)
+        with RunState(root_path, readonly=True, filename=state_filename) as state:
+            if state.conn is None:
+                raise PipelineError(f"No saved run state in '{root_path}'.")
+            write_csv_report(state.iter_rows(), log_csv_path, report_format)
+        return RunSummary(log_csv_path, 0, 0, None)
+
+    sidecars = 0
+    with Pipeline(root_path, **options) as pipeline:
+        report = open_report(log_csv_path, report_format)
+        results = pipeline.results()
+        try:
+            for result in report_records(results, report):
+                sidecars += 1
+                for sink in sinks:
+                    sink(result)
+        finally:
+            results.close()
+            pipeline.close()
+            with pipeline.metrics.phase("report"):
+                report.close()
+    metrics = pipeline.metrics
+    metrics.add("report", "items", report.count)
+
+    tuners = pipeline.tuners()
+    for tuner in tuners:
+        metrics.concurrency[tuner.stage] = tuner.to_dict()
+    if any(tuner.pinned is None for tuner in tuners):
+        chosen = " ".join(f"--{tuner.stage}-workers {tuner.chosen}" for tuner in tuners)
+        print(f"Worker counts chosen for this storage (pin them with): {chosen}")
+
+    if metrics_out:
+        print(f"Metrics written to {metrics.write(metrics_out)}")
+    return RunSummary(log_csv_path, sidecars, pipeline.failures, metrics)
+
+def process_metadata_files(project_root, dry_run=True, parallel_workers=4, output_path=None,
+                           use_state=True, report_only=False, exiftool_workers=None,
+                           archives=None, report_format="csv", executor_mode="auto",
+                           chunk_size=None, metrics_out=None, profile_out=None,
+                           content_dedup=True, move_duplicates=False, read_check=True,
+                           xmp_sidecars=None, native_writer=True, scan_workers=None,
+                           parse_workers=None, scan=None, state_filename=STATE_FILENAME,
+                           prune_state=True, on_progress=None, cancel=None, move_used_metadata=False):
+    """Process all JSON metadata files under project_root.
+
+    This is the command-line entry point over :func:`run_pipeline`: it
+    prints the error and exits when the run cannot start or an exiftool
+    write failed, and returns the report path otherwise.
+
+    Outside of dry runs, exiftool commands are streamed to a pool of
+    ``exiftool_workers`` stay-open processes (default: ``parallel_workers``)
+    as soon as each sidecar is planned, so planning and writing overlap.
+    Every sidecar is still parsed before the first write, because
+    duplicates are classified across all sidecars of a title. Planning runs in chunks of ``chunk_size`` sidecars on a thread or process
+    pool of ``parallel_workers``; ``executor_mode`` "auto" picks processes
+    for large runs (see :func:`choose_executor`).
+
+    Unless ``use_state`` is False, outcomes are persisted in a
+    :class:`~photo_metadata_state.RunState` in the export root so a later run
+    only handles new or changed sidecar/media pairs and resumes interrupted
+    work. ``report_only`` rebuilds the CSV from that store without scanning.
+
+    ``archives`` is an optional list of Takeout ``.zip``/``.tgz`` parts; the
+    sidecars and only the media they match are extracted into project_root
+    (see :func:`photo_metadata_archive.extract_matched_media`) before processing.
+
+    Report rows are streamed to disk as soon as each sidecar's outcome is
+    known, so memory does not grow with the library; ``report_format`` picks
+    a ``csv``, ``jsonl`` or indexed ``sqlite`` report.
+
+    ``metrics_out`` writes per-phase timings, throughput, I/O counters and an
+    exiftool latency histogram (see :class:`~photo_metadata_metrics.Metrics`)
+    as JSON at the end of the run; ``profile_out`` dumps a cProfile of the
+    parse stage, which then runs single-threaded.
+
+    With ``content_dedup``, media sharing a title are compared by content
+    (see :func:`photo_metadata_dedup.find_content_groups`) and only one copy
+    of each byte-identical group is patched; ``move_duplicates`` moves the
+    other copies into a ``Duplicates`` folder in the export root, and
+    ``move_used_metadata`` moves sidecars whose metadata was written into a
+    ``Used_Metadata`` folder, for cleaning up later. Those moves and the
+    ones to ``Unmatched_Metadata`` are journaled first (see
+    :class:`~photo_metadata_journal.FileJournal`), and
+    ``python3 photo_metadata_journal.py undo ROOT`` puts the files back.
+
+    With ``read_check``, the current tags of every file that may be patched
+    are read first in bulk (see :func:`photo_metadata_exiftool.read_tags`)
+    and files that already carry the planned values are not rewritten.
+
+    ``xmp_sidecars`` is a list of ``EXT[:MIN_SIZE]`` rules (see
+    :func:`parse_xmp_policy`); matching media get a ``.xmp`` sidecar written
+    next to them instead of being rewritten.
+
+    With ``native_writer``, JPEG and PNG dates, comments and GPS are written
+    in-process by :func:`photo_metadata_exif.write_native`, which rebuilds
+    only the EXIF block; other files and layouts it cannot rewrite safely
+    still go to exiftool. Without exiftool, only those writes fail.
+
+    ``parallel_workers`` may be ``"auto"``: planning then uses one worker per
+    CPU, and the scan, parse and exiftool stages each tune their own worker
+    count from the throughput and latency of their first seconds (see
+    :class:`~photo_metadata_tuning.ConcurrencyTuner`). ``scan_workers``,
+    ``parse_workers`` and ``exiftool_workers`` pin (or auto-tune) one stage;
+    by default they follow ``parallel_workers``, except that the scan stays
+    single-threaded unless tuned. The chosen counts are printed and saved in
+    the metrics so they can be pinned on later runs. Sidecars are processed
+    in directory and inode order (see :func:`~photo_metadata_tuning.locality_order`).
+
+    A prebuilt :class:`ExportScan` (one shard of a manifest, see
+    :mod:`photo_metadata_shard`) can be passed as ``scan`` to process only
+    those files without walking the export; ``state_filename`` then keeps
+    the shard's run state apart from other shards. Without ``prune_state``,
+    run state entries of sidecars outside this run are kept (as when
+    :mod:`photo_metadata_watch` processes a few new files at a time).
+
+    ``on_progress`` and ``cancel`` let a front end follow and stop the run
+    from another thread (see :class:`Pipeline`); a cancelled run exits with
+    an error after saving the files it finished.
+    """
+    try:
+        summary = run_pipeline(
+            project_root,
+            output_path=output_path,
+            report_format=report_format,
+            report_only=report_only,
+            archives=archives,
+            metrics_out=metrics_out,
+            dry_run=dry_run,
+            parallel_workers=parallel_workers,
+            use_state=use_state,
+            exiftool_workers=exiftool_workers,
+            executor_mode=executor_mode,
+            chunk_size=chunk_size,
+            profile_out=profile_out,
+            content_dedup=content_dedup,
+            move_duplicates=move_duplicates,
+            read_check=read_check,
+            xmp_sidecars=xmp_sidecars,
+            native_writer=native_writer,
+            scan_workers=scan_workers,
+            parse_workers=parse_workers,
+            scan=scan,
+            state_filename=state_filename,
+            prune_state=prune_state,
+            on_progress=on_progress,
+            cancel=cancel,
+            move_used_metadata=move_used_metadata,
+        )
+    except PipelineError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except RunCancelled:
+        print("Cancelled; finished files are saved and the next run resumes the rest.", file=sys.stderr)
         sys.exit(1)
 
-    if not success:
-        print("Exiftool batch failed. Exiting with error.", file=sys.stderr)
+    if summary.failures:
+        print(f"Exiftool failed for {summary.failures} file(s). Exiting with error.", file=sys.stderr)
         sys.exit(1)
 
-    return log_csv_path
+    return summary.report_path
 
 if __name__ == "__main__":
+    import argparse
+
     parser = argparse.ArgumentParser(description="Apply Google Photos metadata to media files")
     parser.add_argument("root", help="Path to the Google Photos export root directory")
+    parser.add_argument("--from-archives", nargs="+", metavar="PART",
+                        help="Takeout .zip/.tgz parts to read; matched files are extracted into root")
     parser.add_argument("--dry-run", action="store_true", help="Show operations without running exiftool")
-    parser.add_argument("--workers", type=int, default=4, help="Number of parallel worker threads")
-    parser.add_argument("--output", help="Path to output CSV (default: ~/Desktop/metadata_report.csv)")
+    parser.add_argument("--workers", type=parse_worker_count, default=AUTO,
+                        help="Number of parallel workers, or 'auto' to tune each stage to the storage (default)")
+    parser.add_argument("--scan-workers", type=parse_worker_count,
+                        help="Directories listed concurrently, or 'auto' (default: 1, or auto with --workers auto)")
+    parser.add_argument("--parse-workers", type=parse_worker_count,
+                        help="Sidecars read concurrently, or 'auto' (default: same as --workers)")
+    parser.add_argument("--executor", choices=("auto", "threads", "processes"), default="auto",
+                        help="Plan sidecars on threads or processes (default: processes for large runs)")
+    parser.add_argument("--chunk-size", type=int,
+                        help=f"Sidecars per planning task (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--exiftool-workers", type=parse_worker_count,
+                        help="Number of stay-open exiftool processes, or 'auto' (default: same as --workers)")
+    parser.add_argument("--output", help="Path to output report (default: ~/Desktop/metadata_report.<format>)")
+    parser.add_argument("--report-format", choices=REPORT_FORMATS, default="csv",
+                        help="Report format: csv, jsonl, or an indexed sqlite database (default: csv)")
+    parser.add_argument("--no-state", action="store_true",
+                        help="Ignore and do not update the saved run state; process every sidecar")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Rebuild the CSV report from the saved run state without processing")
+    parser.add_argument("--metrics-out", metavar="PATH",
+                        help="Write per-phase timings and exiftool latency histogram as JSON")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Dump a cProfile of the parse stage (view with python -m pstats PATH)")
+    parser.add_argument("--no-content-dedup", action="store_true",
+                        help="Classify duplicates by sidecar url only instead of by file content")
+    parser.add_argument("--move-duplicates", action="store_true",
+                        help=f"Move identical copies of patched files into a {DUPLICATES_DIRNAME} folder")
+    parser.add_argument("--move-used-metadata", action="store_true",
+                        help=f"Move sidecars whose metadata was written into a {USED_METADATA_DIRNAME} folder")
+    parser.add_argument("--no-read-check", action="store_true",
+                        help="Rewrite every matched file without first checking its current tags")
+    parser.add_argument("--xmp-sidecar", action="append", metavar="EXT[:MIN_SIZE]",
+                        help="Write an XMP sidecar instead of rewriting media with this extension "
+                             "at least MIN_SIZE big (e.g. .mov, .heic:20M); repeatable")
+    parser.add_argument("--no-native-writer", action="store_true",
+                        help="Send JPEG and PNG files to exiftool instead of the built-in EXIF writer")
     args = parser.parse_args()
 
-    process_metadata_files(args.root, dry_run=args.dry_run, parallel_workers=args.workers, output_path=args.output)
+    process_metadata_files(
+        args.root,
+        dry_run=args.dry_run,
+        parallel_workers=args.workers,
+        output_path=args.output,
+        use_state=not args.no_state,
+        report_only=args.report_only,
+        exiftool_workers=args.exiftool_workers,
+        scan_workers=args.scan_workers,
+        parse_workers=args.parse_workers,
+        archives=args.from_archives,
+        report_format=args.report_format,
+        executor_mode=args.executor,
+        chunk_size=args.chunk_size,
+        metrics_out=args.metrics_out,
+        profile_out=args.profile,
+        content_dedup=not args.no_content_dedup,
+        move_duplicates=args.move_duplicates,
+        move_used_metadata=args.move_used_metadata,
+        read_check=not args.no_read_check,
+        xmp_sidecars=args.xmp_sidecar,
+        native_writer=not args.no_native_writer,
+    )
 
 # Example usage:
 # process_metadata_files("sample/filepath/here", dry_run=True, parallel_workers=8)
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+REPORT_FORMATS = ("csv", "jsonl", "sqlite")
+
+# Columns every report row carries; the SQLite report stores them as real
+# (indexed) columns and keeps the flattened sidecar fields in a JSON column.
+CORE_COLUMNS = [
+    "JSON Filename", "Matched Media", "Title", "URL", "Match Type",
+    "Modified?", "File Size in bytes", "Notes", "Missing Fields",
+]
+INDEXED_COLUMNS = ["JSON Filename", "Matched Media", "Title", "Match Type", "Modified?"]
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+class ReportWriter:
+    """Write report rows to disk as they are produced.
+
+    Memory use does not depend on the number of rows. ``csv`` reports spill
+    rows to a JSON Lines file next to the output while collecting the column
+    names, and write the CSV from that spill file on :meth:`close`; ``jsonl``
+    and ``sqlite`` reports are written directly. Rows written before a crash
+    stay on disk. :meth:`write_rows` may be called from several threads.
+    """
+
+    def __init__(self, output_path, fmt="csv"):
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format '{fmt}'")
+        self.path = Path(output_path)
+        self.fmt = fmt
+        self.count = 0
+        self._lock = threading.Lock()
+        self._fieldnames = set()
+        self._conn = None
+        self._file = None
+        if fmt == "sqlite":
+            if self.path.exists():
+                self.path.unlink()
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            columns = ", ".join(f"{_quote(c)} TEXT" for c in CORE_COLUMNS)
+            self._conn.execute(f"CREATE TABLE report (id INTEGER PRIMARY KEY, {columns}, data TEXT)")
+            self._insert = (
+                f"INSERT INTO report ({', '.join(_quote(c) for c in CORE_COLUMNS)}, data) "
+                f"VALUES ({', '.join('?' for _ in CORE_COLUMNS)}, ?)"
+            )
+        else:
+            self._spill_path = self.path.with_name(self.path.name + ".rows.jsonl") if fmt == "csv" else self.path
+            self._file = open(self._spill_path, "w", encoding="utf-8")
+
+    def write_rows(self, rows):
+        """Append rows (dicts) to the report."""
+        with self._lock:
+            for row in rows:
+                if self._conn is not None:
+                    extra = {k: v for k, v in row.items() if k not in CORE_COLUMNS}
+                    self._conn.execute(
+                        self._insert,
+                        [row.get(c, "") for c in CORE_COLUMNS] + [json.dumps(extra, default=str)],
+                    )
+                else:
+                    self._fieldnames.update(row.keys())
+                    self._file.write(json.dumps(row, default=str) + "\n")
+                self.count += 1
+                if self.count % 1000 == 0:
+                    self.flush()
+
+    def flush(self):
+        if self._conn is not None:
+            self._conn.commit()
+        elif self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """Finish the report and return its path."""
+        if self._conn is not None:
+            for column in INDEXED_COLUMNS:
+                name = "report_" + column.lower().replace(" ", "_").replace("?", "")
+                self._conn.execute(f"CREATE INDEX {name} ON report ({_quote(column)})")
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+            if self.fmt == "csv":
+                self._write_csv()
+        return self.path
+
+    def _write_csv(self):
+        import csv
+
+        tmp = self.path.with_name(self.path.name + ".partial")
+        with open(self._spill_path, "r", encoding="utf-8") as spill, \
+                open(tmp, "w", newline="", encoding="utf-8") as log_file:
+            writer = csv.DictWriter(log_file, fieldnames=sorted(self._fieldnames))
+            writer.writeheader()
+            for line in spill:
+                writer.writerow(json.loads(line))
+        os.replace(tmp, self.path)
+        os.remove(self._spill_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_report(path, fmt=None):
+    """Yield the rows of a report written by :class:`ReportWriter`.
+
+    ``fmt`` defaults to the file's suffix. CSV values come back as strings.
+    """
+    path = Path(path)
+    fmt = fmt or path.suffix.lstrip(".").lower()
+    if fmt == "csv":
+        import csv
+
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "sqlite":
+        conn = sqlite3.connect(str(path))
+        try:
+            columns = ", ".join(_quote(c) for c in CORE_COLUMNS)
+            for values in conn.execute(f"SELECT {columns}, data FROM report ORDER BY id"):
+                row = dict(zip(CORE_COLUMNS, values[:-1]))
+                row.update(json.loads(values[-1]) if values[-1] else {})
+                yield row
+        finally:
+            conn.close()
+    else:
+        raise ValueError(f"Unknown report format '{fmt}'")
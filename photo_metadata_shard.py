@@ -0,0 +1,308 @@
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+import argparse
+
+from photo_metadata_dedup import DUPLICATES_DIRNAME, HashCache
+from photo_metadata_match import MatchIndex
+from photo_metadata_patch import (
+    MEDIA_EXTENSIONS,
+    USED_METADATA_DIRNAME,
+    ExportScan,
+    PipelineError,
+    default_report_path,
+    load_sidecars,
+    process_metadata_files,
+    scan_export,
+    write_csv_report,
+)
+from photo_metadata_report import REPORT_FORMATS, read_report
+from photo_metadata_state import STATE_FILENAME, RunState
+from photo_metadata_tuning import AUTO, make_tuner, parse_worker_count
+
+MANIFEST_VERSION = 1
+
+def parse_shard(spec):
+    """Parse ``i/N`` (shards are numbered from 1) into ``(i, N)``."""
+    index, sep, count = str(spec).partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}' (expected i/N, e.g. 2/8)")
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}' (expected i/N with 1 <= i <= N)")
+    return index, count
+
+def shard_state_filename(index, count):
+    """Name of the run state a shard keeps in the export root, next to the main one."""
+    stem, suffix = os.path.splitext(STATE_FILENAME)
+    return f"{stem}.shard-{index}-of-{count}{suffix}"
+
+def shard_report_path(manifest_path, index, count, report_format="csv"):
+    """Default report location of a shard: next to the manifest."""
+    manifest_path = Path(manifest_path)
+    return manifest_path.with_name(f"{manifest_path.stem}.shard-{index}-of-{count}.{report_format}")
+
+def _relative(path, root):
+    return Path(path).relative_to(root).as_posix()
+
+def plan_manifest(root, manifest_path, shards, workers=AUTO):
+    """Scan the export at root and write a manifest split into shards.
+
+    Each manifest line after the header is one group: the sidecars matching
+    one media name (see :class:`~photo_metadata_match.MatchIndex`) together
+    with every media file of that name and the sidecar next to each. Duplicate classification and content dedup only ever compare
+    members of one group, so groups are never split; they are assigned,
+    largest first, to the least loaded shard. Paths are stored relative to
+    root, so the export may be mounted elsewhere when a shard runs.
+    Returns the number of sidecars in each shard.
+    """
+    root = Path(root).expanduser()
+    if not root.exists():
+        raise FileNotFoundError(f"Project root '{root}' does not exist.")
+    scan = scan_export(root, MEDIA_EXTENSIONS, exclude=[root / DUPLICATES_DIRNAME, root / USED_METADATA_DIRNAME])
+    documents = load_sidecars(scan.json_paths, tuner=make_tuner("parse", workers))
+
+    matcher = MatchIndex(scan.media_index, MEDIA_EXTENSIONS)
+    groups = {}
+    for json_path in scan.json_paths:
+        data = documents.get(json_path)
+        title = matcher.resolve(json_path.name, data.get("title", "").lower()) if isinstance(data, dict) else ""
+        # Sidecars that match nothing by name or title stand alone.
+        key = title or f"\0{json_path}"
+        groups.setdefault(key, {"title": title, "sidecars": []})["sidecars"].append(json_path)
+
+    loads = [(0, index) for index in range(1, shards + 1)]
+    sizes = dict.fromkeys(range(1, shards + 1), 0)
+    lines = []
+    for key, group in sorted(groups.items(), key=lambda kv: (-len(kv[1]["sidecars"]), kv[0])):
+        media = scan.media_index.get(group["title"], []) if group["title"] else []
+        load, index = heapq.heappop(loads)
+        heapq.heappush(loads, (load + len(group["sidecars"]) + len(media), index))
+        sizes[index] += len(group["sidecars"])
+        lines.append({
+            "shard": index,
+            "title": group["title"],
+            "sidecars": sorted(_relative(p, root) for p in group["sidecars"]),
+            "media": sorted(
+                [_relative(p, root), _relative(scan.sidecar_index[p], root) if p in scan.sidecar_index else None]
+                for p in media
+            ),
+        })
+
+    manifest_path = Path(manifest_path).expanduser()
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_name(manifest_path.name + ".partial")
+    with open(tmp, "w", encoding="utf-8") as f:
+        header = {
+            "manifest": MANIFEST_VERSION,
+            "root": str(root.resolve()),
+            "shards": shards,
+            "created": time.time(),
+            "groups": len(lines),
+            "sidecars": len(scan.json_paths),
+        }
+        f.write(json.dumps(header) + "\n")
+        for line in sorted(lines, key=lambda line: (line["shard"], line["title"], line["sidecars"])):
+            f.write(json.dumps(line) + "\n")
+    os.replace(tmp, manifest_path)
+    return sizes
+
+def read_manifest_header(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+    if header.get("manifest") != MANIFEST_VERSION:
+        raise ValueError(f"'{manifest_path}' is not a version {MANIFEST_VERSION} manifest")
+    return header
+
+def load_shard(manifest_path, index, root=None):
+    """Return ``(root, scan)`` for shard index, statting only the files it lists.
+
+    root overrides the export location recorded in the manifest. Files that
+    disappeared since planning are left out.
+    """
+    header = read_manifest_header(manifest_path)
+    if not 1 <= index <= header["shards"]:
+        raise ValueError(f"Shard {index} is out of range: the manifest has {header['shards']} shards")
+    root = Path(root or header["root"]).expanduser()
+    scan = ExportScan()
+
+    def stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        scan.file_stats[path] = (st.st_size, st.st_mtime)
+        scan.inodes[path] = st.st_ino
+        return True
+
+    with open(manifest_path, encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            group = json.loads(line)
+            if group["shard"] != index:
+                continue
+            for relative in group["sidecars"]:
+                path = root / relative
+                if stat(path):
+                    scan.json_paths.append(path)
+            for relative, sidecar in group["media"]:
+                path = root / relative
+                if stat(path):
+                    scan.media_index.setdefault(group["title"], []).append(path)
+                    if sidecar is not None:
+                        scan.sidecar_index[path] = root / sidecar
+    return root, scan
+
+def run_shard(manifest_path, shard, root=None, output_path=None, report_format="csv", **options):
+    """Process one ``(index, count)`` shard of a manifest with :func:`process_metadata_files`.
+
+    The shard stats only the files the manifest lists for it, modifies only
+    its own media, keeps its own run state and writes its own report, so
+    shards can run as separate processes or on separate machines. Returns the report path.
+    """
+    index, count = shard
+    header = read_manifest_header(manifest_path)
+    if header["shards"] != count:
+        raise ValueError(f"The manifest has {header['shards']} shards, not {count}")
+    root, scan = load_shard(manifest_path, index, root)
+    output_path = output_path or shard_report_path(manifest_path, index, count, report_format)
+    return process_metadata_files(
+        root,
+        scan=scan,
+        state_filename=shard_state_filename(index, count),
+        output_path=output_path,
+        report_format=report_format,
+        **options,
+    )
+
+def merge_state(root, count):
+    """Copy the run state and content hashes of every shard into the main run state.
+
+    Returns the number of shard states merged.
+    """
+    root = Path(root)
+    paths = [root / shard_state_filename(index, count) for index in range(1, count + 1)]
+    paths = [path for path in paths if path.exists()]
+    if not paths:
+        return 0
+    with RunState(root) as state:
+        HashCache(state.conn)  # creates the hashes table
+        for path in paths:
+            state.conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+            try:
+                for table in ("files", "hashes"):
+                    try:
+                        state.conn.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM shard.{table}")
+                    except sqlite3.OperationalError:
+                        pass  # the shard never created this table
+                state.conn.commit()
+            finally:
+                state.conn.execute("DETACH DATABASE shard")
+    return len(paths)
+
+def merge_shards(manifest_path, output_path=None, report_format="csv", root=None, reports=None):
+    """Combine every shard's report into one and merge their run states.
+
+    Shard reports are looked up next to the manifest unless ``reports`` lists
+    them. Raises :class:`~photo_metadata_patch.PipelineError` if a shard
+    report is missing.
+    """
+    header = read_manifest_header(manifest_path)
+    count = header["shards"]
+    if reports is None:
+        reports = []
+        missing = []
+        for index in range(1, count + 1):
+            found = [
+                shard_report_path(manifest_path, index, count, fmt)
+                for fmt in REPORT_FORMATS
+                if shard_report_path(manifest_path, index, count, fmt).exists()
+            ]
+            if found:
+                reports.append(found[0])
+            else:
+                missing.append(str(index))
+        if missing:
+            raise PipelineError(f"No report found for shard(s) {', '.join(missing)} of {count}.")
+    output_path = default_report_path(output_path, report_format)
+    write_csv_report((row for path in reports for row in read_report(path)), output_path, report_format)
+    root = Path(root or header["root"]).expanduser()
+    merged = merge_state(root, count) if root.exists() else 0
+    if merged:
+        print(f"Merged the run state of {merged} shard(s) into {root / STATE_FILENAME}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split an export into shards, run them independently and merge the results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Scan an export and write a sharded manifest")
+    plan.add_argument("root", help="Path to the Google Photos export root directory")
+    plan.add_argument("--manifest", required=True, help="Manifest file to write")
+    plan.add_argument("--shards", type=int, required=True, help="Number of shards")
+    plan.add_argument("--workers", type=parse_worker_count, default=AUTO,
+                      help="Sidecars read concurrently, or 'auto' (default)")
+
+    run = commands.add_parser("run", help="Process one shard of a manifest")
+    run.add_argument("manifest", help="Manifest written by 'plan'")
+    run.add_argument("--shard", required=True, metavar="i/N", help="Shard to process, numbered from 1")
+    run.add_argument("--root", help="Export location on this machine (default: the one in the manifest)")
+    run.add_argument("--output", help="Shard report (default: next to the manifest)")
+    run.add_argument("--report-format", choices=REPORT_FORMATS, default="csv")
+    run.add_argument("--dry-run", action="store_true", help="Show operations without running exiftool")
+    run.add_argument("--workers", type=parse_worker_count, default=AUTO)
+    run.add_argument("--scan-workers", type=parse_worker_count)
+    run.add_argument("--parse-workers", type=parse_worker_count)
+    run.add_argument("--exiftool-workers", type=parse_worker_count)
+    run.add_argument("--metrics-out", metavar="PATH")
+    run.add_argument("--no-content-dedup", action="store_true")
+    run.add_argument("--move-duplicates", action="store_true")
+    run.add_argument("--move-used-metadata", action="store_true")
+    run.add_argument("--no-read-check", action="store_true")
+    run.add_argument("--xmp-sidecar", action="append", metavar="EXT[:MIN_SIZE]")
+    run.add_argument("--no-native-writer", action="store_true")
+
+    merge = commands.add_parser("merge", help="Combine the shard reports and run states")
+    merge.add_argument("manifest", help="Manifest written by 'plan'")
+    merge.add_argument("--root", help="Export location on this machine (default: the one in the manifest)")
+    merge.add_argument("--output", help="Merged report (default: ~/Desktop/metadata_report.<format>)")
+    merge.add_argument("--report-format", choices=REPORT_FORMATS, default="csv")
+    merge.add_argument("--reports", nargs="+", help="Shard reports to merge (default: found next to the manifest)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "plan":
+            sizes = plan_manifest(args.root, args.manifest, args.shards, args.workers)
+            print(f"Wrote {args.manifest}: " + ", ".join(f"shard {i}: {n} sidecars" for i, n in sizes.items()))
+        elif args.command == "run":
+            report = run_shard(
+                args.manifest,
+                parse_shard(args.shard),
+                root=args.root,
+                output_path=args.output,
+                report_format=args.report_format,
+                dry_run=args.dry_run,
+                parallel_workers=args.workers,
+                scan_workers=args.scan_workers,
+                parse_workers=args.parse_workers,
+                exiftool_workers=args.exiftool_workers,
+                metrics_out=args.metrics_out,
+                content_dedup=not args.no_content_dedup,
+                move_duplicates=args.move_duplicates,
+                move_used_metadata=args.move_used_metadata,
+                read_check=not args.no_read_check,
+                xmp_sidecars=args.xmp_sidecar,
+                native_writer=not args.no_native_writer,
+            )
+            print(f"Shard report written to {report}")
+        else:
+            report = merge_shards(args.manifest, args.output, args.report_format, args.root, args.reports)
+            print(f"Merged report written to {report}")
+    except (OSError, ValueError, PipelineError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
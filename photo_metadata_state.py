@@ -0,0 +1,209 @@
+import json
+import sqlite3
+import time
+import hashlib
+from pathlib import Path
+
+STATE_FILENAME = ".photo_metadata_state.sqlite"
+
+# Outcomes that need no further work as long as the sidecar and its media are
+# unchanged. "planned" and "failed" rows are always processed again, which is
+# how an interrupted run resumes.
+FINAL_OUTCOMES = {"done", "skipped", "unmatched", "invalid"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    json_path TEXT PRIMARY KEY,
+    json_size INTEGER,
+    json_mtime REAL,
+    title TEXT,
+    media TEXT,
+    plan_hash TEXT,
+    outcome TEXT,
+    rows TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS files_outcome ON files (outcome);
+"""
+
+def plan_hash(cmd):
+    """Return a stable hash of an exiftool command (tag set and target)."""
+    if not cmd:
+        return ""
+    return hashlib.sha1("\0".join(cmd).encode("utf-8")).hexdigest()
+
+class RunState:
+    """SQLite store of per-sidecar outcomes kept in the export root.
+
+    Paths are stored relative to the export root so the store survives the
+    export being mounted somewhere else.
+    """
+
+    def __init__(self, root, readonly=False, filename=STATE_FILENAME):
+        self.root = Path(root)
+        self.path = self.root / filename
+        self.readonly = readonly
+        self.records = {}
+        self._pending = 0
+        if readonly and not self.path.exists():
+            self.conn = None
+            return
+        self.conn = sqlite3.connect(str(self.path))
+        if not readonly:
+            self.conn.executescript(_SCHEMA)
+        self._load()
+
+    def _load(self):
+        try:
+            cursor = self.conn.execute(
+                "SELECT json_path, json_size, json_mtime, title, media, plan_hash, outcome FROM files"
+            )
+        except sqlite3.OperationalError:
+            return
+        for json_path, size, mtime, title, media, digest, outcome in cursor:
+            self.records[json_path] = {
+                "json_stat": (size, mtime),
+                "title": title or "",
+                "media": json.loads(media) if media else {},
+                "plan_hash": digest or "",
+                "outcome": outcome,
+            }
+
+    def key(self, path):
+        path = Path(path)
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def _media_stats(self, scan, title):
+        return {
+            self.key(p): list(scan.file_stats.get(p, ("", None)))
+            for p in scan.media_index.get(title, [])
+        }
+
+    def is_current(self, json_path, scan):
+        """Return True if json_path finished earlier and nothing it touched changed."""
+        record = self.records.get(self.key(json_path))
+        if not record or record["outcome"] not in FINAL_OUTCOMES:
+            return False
+        if tuple(record["json_stat"]) != tuple(scan.file_stats.get(json_path, ())):
+            return False
+        return record["media"] == self._media_stats(scan, record["title"])
+
+    def already_applied(self, json_path, cmd, scan):
+        """Return True if cmd was already written and the media is untouched since."""
+        record = self.records.get(self.key(json_path))
+        return bool(
+            record
+            and record["outcome"] == "done"
+            and record["plan_hash"] == plan_hash(cmd)
+            and record["media"] == self._media_stats(scan, record["title"])
+        )
+
+    def record(self, json_path, json_stat, title, media_stats, cmd, outcome, rows):
+        """Store the outcome for one sidecar; media_stats maps media paths to (size, mtime)."""
+        if self.conn is None or self.readonly:
+            return
+        key = self.key(json_path)
+        media = {self.key(p): list(st) for p, st in media_stats.items()}
+        digest = plan_hash(cmd)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                json_stat[0] if json_stat else None,
+                json_stat[1] if json_stat else None,
+                title,
+                json.dumps(media, sort_keys=True),
+                digest,
+                outcome,
+                json.dumps(rows, default=str),
+                time.time(),
+            ),
+        )
+        self.records[key] = {
+            "json_stat": tuple(json_stat or ()),
+            "title": title,
+            "media": media,
+            "plan_hash": digest,
+            "outcome": outcome,
+        }
+        self._pending += 1
+        if self._pending >= 500:
+            self.commit()
+
+    def refresh_media(self, title, media_stats):
+        """Store new media stats for every sidecar of title, after this run wrote to that media."""
+        if self.conn is None or self.readonly:
+            return
+        media = {self.key(p): list(st) for p, st in media_stats.items()}
+        self.conn.execute(
+            "UPDATE files SET media = ? WHERE title = ?", (json.dumps(media, sort_keys=True), title)
+        )
+        for record in self.records.values():
+            if record["title"] == title:
+                record["media"] = media
+
+    def rows_for(self, json_path):
+        """Return the stored report rows for json_path."""
+        if self.conn is None:
+            return []
+        found = self.conn.execute(
+            "SELECT rows FROM files WHERE json_path = ?", (self.key(json_path),)
+        ).fetchone()
+        return json.loads(found[0]) if found and found[0] else []
+
+    def iter_rows(self):
+        """Yield every stored report row, ordered by sidecar path."""
+        if self.conn is None:
+            return
+        for (rows,) in self.conn.execute("SELECT rows FROM files ORDER BY json_path"):
+            if rows:
+                yield from json.loads(rows)
+
+    def prune(self, keep):
+        """Forget sidecars that are not in keep (they moved or were deleted)."""
+        if self.conn is None or self.readonly:
+            return
+        keep = {self.key(p) for p in keep}
+        stale = [k for k in self.records if k not in keep]
+        self.conn.executemany("DELETE FROM files WHERE json_path = ?", [(k,) for k in stale])
+        for key in stale:
+            del self.records[key]
+
+    def commit(self):
+        if self.conn is not None and not self.readonly:
+            self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def summarize_state(root, filename=STATE_FILENAME):
+    """Return ``(sidecars per outcome, time of the last update)`` from the run state in root, or None without one.
+
+    Unlike :class:`RunState` this runs two aggregate queries instead of
+    loading every record, so checking on a large export stays instant.
+    """
+    path = Path(root) / filename
+    if not path.exists():
+        return None
+    conn = sqlite3.connect(path.resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        counts = dict(conn.execute("SELECT outcome, COUNT(*) FROM files GROUP BY outcome"))
+        updated = conn.execute("SELECT MAX(updated) FROM files").fetchone()[0]
+    except sqlite3.OperationalError:
+        counts, updated = {}, None
+    finally:
+        conn.close()
+    return counts, updated
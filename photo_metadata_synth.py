@@ -0,0 +1,192 @@
+import json
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+
+SIDECAR_SUFFIX = ".supplemental-metadata.json"
+
+def _box(kind, payload=b""):
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+def _png_chunk(kind, payload):
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+# An 8x8 grey baseline JPEG: a single DC-only block coded with one-symbol
+# Huffman tables, which every decoder (and exiftool) accepts.
+JPEG_STUB = b"".join([
+    b"\xff\xd8",
+    b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00",
+    b"\xff\xdb" + struct.pack(">H", 67) + b"\x00" + b"\x01" * 64,
+    b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, 8, 8, 1) + b"\x01\x11\x00",
+    b"\xff\xc4" + struct.pack(">H", 20) + b"\x00" + b"\x01" + b"\x00" * 15 + b"\x00",
+    b"\xff\xc4" + struct.pack(">H", 20) + b"\x10" + b"\x01" + b"\x00" * 15 + b"\x00",
+    b"\xff\xda" + struct.pack(">HB", 8, 1) + b"\x01\x00\x00\x3f\x00",
+    b"\x3f",
+    b"\xff\xd9",
+])
+
+PNG_STUB = b"".join([
+    b"\x89PNG\r\n\x1a\n",
+    _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)),
+    _png_chunk(b"IDAT", zlib.compress(b"\x00\x80")),
+    _png_chunk(b"IEND", b""),
+])
+
+def _quicktime_stub(brand):
+    mvhd = _box(b"mvhd", b"\x00" * 4 + struct.pack(">IIII", 0, 0, 600, 0)
+                + struct.pack(">IH", 0x00010000, 0x0100) + b"\x00" * 10
+                + struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+                + b"\x00" * 24 + struct.pack(">I", 1))
+    return _box(b"ftyp", brand + b"\x00\x00\x02\x00" + brand) + _box(b"moov", mvhd) + _box(b"mdat")
+
+MP4_STUB = _quicktime_stub(b"isom")
+MOV_STUB = _quicktime_stub(b"qt  ")
+HEIC_STUB = (
+    _box(b"ftyp", b"heic\x00\x00\x00\x00mif1heic")
+    + _box(b"meta", b"\x00" * 4 + _box(b"hdlr", b"\x00" * 8 + b"pict" + b"\x00" * 13))
+)
+
+STUBS = {".jpg": JPEG_STUB, ".png": PNG_STUB, ".heic": HEIC_STUB, ".mp4": MP4_STUB, ".mov": MOV_STUB}
+
+def stub_media(ext, tag):
+    """Return the stub for ext with tag (bytes) embedded, so every photo has its own content.
+
+    JPEGs get a comment segment after APP0, PNGs a ``tEXt`` chunk and the
+    ISO media files a trailing ``free`` box; none of them changes how the
+    file decodes.
+    """
+    stub = STUBS[ext]
+    if ext == ".jpg":
+        return stub[:20] + b"\xff\xfe" + struct.pack(">H", len(tag) + 2) + tag + stub[20:]
+    if ext == ".png":
+        end = len(stub) - 12
+        return stub[:end] + _png_chunk(b"tEXt", b"Comment\x00" + tag) + stub[end:]
+    return stub + _box(b"free", tag)
+
+@dataclass
+class SynthConfig:
+    """Shape of a synthetic Google Takeout export.
+
+    ``count`` is the number of distinct photos. ``album_ratio`` of them are
+    also copied (with the same sidecar url) into an album folder, and
+    ``misleading_ratio`` reuse the filename of an earlier, different photo.
+    Every photo's media bytes are distinct, so content dedup keeps the two
+    kinds apart.
+    ``media_mix`` maps extensions to relative weights.
+    """
+    count: int = 1000
+    depth: int = 1
+    albums: int = 20
+    album_ratio: float = 0.2
+    misleading_ratio: float = 0.05
+    missing_geo_rate: float = 0.1
+    invalid_json_rate: float = 0.01
+    media_mix: dict = field(default_factory=lambda: {".jpg": 0.6, ".heic": 0.25, ".mp4": 0.1, ".png": 0.05})
+    seed: int = 0
+
+def _sidecar(name, url, timestamp, geo):
+    data = {
+        "title": name,
+        "description": "",
+        "imageViews": "0",
+        "creationTime": {"timestamp": str(timestamp)},
+        "photoTakenTime": {
+            "timestamp": str(timestamp),
+            "formatted": datetime.fromtimestamp(timestamp, timezone.utc).strftime("%b %d, %Y, %I:%M:%S %p UTC"),
+        },
+        "url": url,
+        "googlePhotosOrigin": {"mobileUpload": {"deviceType": "IOS_PHONE"}},
+    }
+    if geo:
+        data["geoData"] = data["geoDataExif"] = geo
+    return data
+
+def generate_export(root, config=None):
+    """Write a synthetic Takeout export under root and return a summary of what was written.
+
+    The tree mimics ``Takeout/Google Photos/Photos from YYYY`` plus album
+    folders, ``config.depth`` directory levels deep, with a sidecar next to
+    every media file. Output is deterministic for a given ``config.seed``.
+    """
+    config = config or SynthConfig()
+    rng = random.Random(config.seed)
+    base = Path(root, "Takeout", "Google Photos")
+    for level in range(1, config.depth):
+        base = base / f"Part {level}"
+    exts = list(config.media_mix)
+    weights = [config.media_mix[e] for e in exts]
+    summary = {"photos": 0, "album_copies": 0, "misleading": 0, "invalid_json": 0, "missing_geo": 0, "files": 0}
+    names = []
+    made = set()
+
+    def write(folder, name, data, invalid, media):
+        if folder not in made:
+            folder.mkdir(parents=True, exist_ok=True)
+            made.add(folder)
+        (folder / name).write_bytes(media)
+        text = json.dumps(data, indent=2)
+        (folder / (name + SIDECAR_SUFFIX)).write_text(text[: len(text) // 2] if invalid else text, encoding="utf-8")
+        summary["files"] += 2
+
+    for i in range(config.count):
+        timestamp = 1262304000 + rng.randrange(15 * 365 * 86400)
+        year = datetime.fromtimestamp(timestamp, timezone.utc).year
+        if names and rng.random() < config.misleading_ratio:
+            name = rng.choice(names)
+            summary["misleading"] += 1
+        else:
+            ext = rng.choices(exts, weights)[0]
+            name = f"IMG_{i:07d}{ext.upper()}"
+            names.append(name)
+        geo = None
+        if rng.random() < config.missing_geo_rate:
+            summary["missing_geo"] += 1
+        else:
+            geo = {"latitude": round(rng.uniform(-80, 80), 6), "longitude": round(rng.uniform(-180, 180), 6),
+                   "altitude": 0.0, "latitudeSpan": 0.0, "longitudeSpan": 0.0}
+        invalid = rng.random() < config.invalid_json_rate
+        summary["invalid_json"] += invalid
+        url = f"https://photos.google.com/photo/synthetic-{i}"
+        data = _sidecar(name, url, timestamp, geo)
+        media = stub_media(Path(name).suffix.lower(), url.encode())
+        folder = base / f"Photos from {year}"
+        # A reused name must not overwrite the earlier photo in the same folder.
+        while (folder / name).exists():
+            folder = folder / "more"
+        write(folder, name, data, invalid, media)
+        summary["photos"] += 1
+        if rng.random() < config.album_ratio:
+            album = base / f"Album {rng.randrange(config.albums)}"
+            while (album / name).exists():
+                album = album / "more"
+            write(album, name, data, invalid, media)
+            summary["album_copies"] += 1
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Google Takeout export")
+    parser.add_argument("root", help="Directory to write the export into")
+    parser.add_argument("--count", type=int, default=1000, help="Number of distinct photos")
+    parser.add_argument("--depth", type=int, default=1, help="Directory levels above the year folders")
+    parser.add_argument("--albums", type=int, default=20, help="Number of album folders")
+    parser.add_argument("--album-ratio", type=float, default=0.2, help="Share of photos copied into an album")
+    parser.add_argument("--misleading-ratio", type=float, default=0.05,
+                        help="Share of photos reusing another photo's filename")
+    parser.add_argument("--missing-geo-rate", type=float, default=0.1, help="Share of sidecars without GPS")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.01, help="Share of truncated sidecars")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(generate_export(args.root, SynthConfig(
+        count=args.count,
+        depth=args.depth,
+        albums=args.albums,
+        album_ratio=args.album_ratio,
+        misleading_ratio=args.misleading_ratio,
+        missing_geo_rate=args.missing_geo_rate,
+        invalid_json_rate=args.invalid_json_rate,
+        seed=args.seed,
+    )), indent=2))
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import deque
+
+AUTO = "auto"
+# Upper bound for auto-tuned stages; they are I/O bound, so this may exceed the CPU count.
+MAX_AUTO_WORKERS = min(64, (os.cpu_count() or 1) * 4)
+
+def locality_order(paths, inodes):
+    """Sort paths by directory, then by inode number within each directory.
+
+    Files in one directory are handled together, and within it inode order
+    roughly follows on-disk layout, which keeps spinning disks and network
+    shares from seeking back and forth. Paths without an inode sort by name.
+    """
+    return sorted(paths, key=lambda p: (str(p.parent), inodes.get(p, 0), p.name))
+
+class ConcurrencyTuner:
+    """Choose the worker count of one stage from the throughput it measures.
+
+    The stage starts with ``start`` workers. At the end of every ``window``
+    seconds of work :meth:`observe` compares items per second with the best
+    window so far: while the rate improves by at least ``gain`` and mean
+    latency stays within ``max_latency_growth`` times that of the first
+    window, the worker count doubles (up to ``maximum``). Once it stops
+    paying off, the tuner settles on the best count seen. A ``pinned``
+    count skips tuning altogether.
+    """
+
+    def __init__(self, stage, start=1, maximum=MAX_AUTO_WORKERS, window=0.5, gain=1.15,
+                 max_latency_growth=4.0, pinned=None, clock=time.monotonic):
+        self.stage = stage
+        self.pinned = pinned
+        self.workers = max(1, int(pinned or start))
+        self.maximum = max(self.workers, maximum)
+        self.window = window
+        self.gain = gain
+        self.max_latency_growth = max_latency_growth
+        self.settled = pinned is not None
+        self.history = []
+        self._best = None
+        self._baseline_latency = None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window_start = None
+        self._items = 0
+        self._latency = 0.0
+
+    @property
+    def chosen(self):
+        """The settled worker count, or the best one measured so far."""
+        if self.settled or self._best is None:
+            return self.workers
+        return self._best[0]
+
+    def observe(self, latency=0.0, items=1):
+        """Record items finished by the stage; return True if ``workers`` changed."""
+        if self.settled:
+            return False
+        with self._lock:
+            if self.settled:
+                return False
+            now = self._clock()
+            if self._window_start is None:
+                # The first completion opens the window; its work happened before it.
+                self._window_start = now
+                return False
+            self._items += items
+            self._latency += latency
+            elapsed = now - self._window_start
+            if elapsed < self.window:
+                return False
+            rate = self._items / elapsed
+            mean_latency = self._latency / self._items
+            self._window_start, self._items, self._latency = now, 0, 0.0
+            self.history.append({
+                "workers": self.workers,
+                "items_per_sec": round(rate, 1),
+                "mean_latency_ms": round(mean_latency * 1000, 3),
+            })
+            if self._baseline_latency is None:
+                self._baseline_latency = mean_latency
+            improved = self._best is None or rate >= self._best[1] * self.gain
+            if improved and mean_latency <= max(self._baseline_latency, 1e-6) * self.max_latency_growth:
+                self._best = (self.workers, rate)
+                if self.workers >= self.maximum:
+                    self.settled = True
+                    return False
+                self.workers = min(self.maximum, self.workers * 2)
+                return True
+            self.settled = True
+            previous, self.workers = self.workers, self._best[0] if self._best else self.workers
+            return self.workers != previous
+
+    def to_dict(self):
+        return {
+            "workers": self.chosen,
+            "tuned": self.pinned is None,
+            "settled": self.settled,
+            "history": list(self.history),
+        }
+
+def make_tuner(stage, value):
+    """Return a tuner for ``value``: :data:`AUTO` or a fixed worker count."""
+    if value == AUTO:
+        return ConcurrencyTuner(stage)
+    return ConcurrencyTuner(stage, pinned=int(value))
+
+def _timed(func, item):
+    start = time.perf_counter()
+    result = func(item)
+    return result, time.perf_counter() - start
+
+def tuned_map(func, items, tuner):
+    """Yield ``(item, func(item))`` as calls finish, keeping ``tuner.workers`` in flight.
+
+    Every finished call is reported to ``tuner``, so concurrency follows its
+    decisions while the map runs. If items is a :class:`collections.deque`,
+    items are taken from its right end and it may be extended while results
+    are being consumed (for walking a tree, say).
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if not isinstance(items, deque):
+        items = iter(items)
+        take = lambda: next(items)
+    else:
+        take = items.pop
+    pending = {}
+    with ThreadPoolExecutor(max_workers=tuner.maximum) as executor:
+        while True:
+            while len(pending) < tuner.workers:
+                try:
+                    item = take()
+                except (StopIteration, IndexError):
+                    break
+                pending[executor.submit(_timed, func, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                result, latency = future.result()
+                tuner.observe(latency)
+                yield item, result
+
+def parse_worker_count(value):
+    """Parse a ``--*-workers`` option: :data:`AUTO` or a positive integer."""
+    if value == AUTO:
+        return value
+    count = int(value)
+    if count < 1:
+        raise ValueError(f"worker count must be at least 1, got {count}")
+    return count
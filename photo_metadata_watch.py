@@ -0,0 +1,346 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+import argparse
+
+from photo_metadata_dedup import DUPLICATES_DIRNAME
+from photo_metadata_match import candidate_keys, sidecar_media_name
+from photo_metadata_patch import (
+    MEDIA_EXTENSIONS,
+    USED_METADATA_DIRNAME,
+    ExportScan,
+    PipelineError,
+    load_sidecars,
+    process_metadata_files,
+    run_pipeline,
+)
+from photo_metadata_report import REPORT_FORMATS
+from photo_metadata_tuning import AUTO, locality_order, make_tuner, parse_worker_count
+
+# Directories modified this recently are listed again on every poll, since
+# coarse timestamps (FAT, SMB) may not change when another file is added
+# within the same second or two.
+MTIME_SLACK = 2.0
+
+class ExportWatcher:
+    """In-memory export index kept current by polling.
+
+    Each :meth:`poll` stats every known directory but lists only the ones
+    whose mtime changed, so an idle tree costs one ``stat`` per directory.
+    A new or changed file is indexed once its size and mtime are the same
+    on two consecutive polls, so files still being extracted are not used.
+    ``scan`` holds the same indexes :func:`photo_metadata_patch.scan_export`
+    builds.
+    """
+
+    def __init__(self, root, media_exts=MEDIA_EXTENSIONS, exclude=(), clock=time.time):
+        self.root = Path(root)
+        self.media_exts = media_exts
+        self.exclude = {os.fspath(p) for p in exclude}
+        self.scan = ExportScan()
+        self._clock = clock
+        self._dirs = {}        # directory -> (mtime, subdirectories)
+        self._dir_files = {}   # directory -> set of indexed paths
+        self._unsettled = {}   # path -> (size, mtime) seen on the last poll
+        self._adjacent = {}    # media path -> sidecar path named after it
+        self._sidecars = {}    # indexed sidecars, in the order found (values unused)
+        self._copies = {}      # lowercase media name -> {media path: None}
+        self._stale = set()    # media names whose scan.media_index list is out of date
+        self._sidecars_stale = False
+
+    def poll(self):
+        """Refresh the index; return the sidecars (new or changed) and new media that settled since the last poll."""
+        new_sidecars, new_media = [], []
+        now = self._clock()
+        unsettled_dirs = {os.path.dirname(p) for p in self._unsettled}
+        pending = [os.fspath(self.root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                self._forget_directory(directory)
+                continue
+            known = self._dirs.get(directory)
+            if known and known[0] == mtime and now - mtime > MTIME_SLACK and directory not in unsettled_dirs:
+                pending.extend(known[1])
+                continue
+            subdirs = self._list(directory, new_sidecars, new_media)
+            for gone in set(known[1]).difference(subdirs) if known else ():
+                self._forget_directory(gone)
+            self._dirs[directory] = (mtime, subdirs)
+            pending.extend(subdirs)
+        self._sync()
+        return new_sidecars, new_media
+
+    def _list(self, directory, new_sidecars, new_media):
+        subdirs = []
+        present = set()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            return subdirs
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self.exclude:
+                            subdirs.append(entry.path)
+                        continue
+                    name = entry.name
+                    is_sidecar = sidecar_media_name(name, self.media_exts) is not None
+                    if not is_sidecar and os.path.splitext(name)[1].lower() not in self.media_exts:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                path = Path(entry.path)
+                present.add(path)
+                stat = (st.st_size, st.st_mtime)
+                if self.scan.file_stats.get(path) == stat:
+                    continue
+                if self._unsettled.get(path) != stat:
+                    self._unsettled[path] = stat
+                    continue
+                del self._unsettled[path]
+                is_new = path not in self.scan.file_stats
+                self.scan.file_stats[path] = stat
+                self.scan.inodes[path] = st.st_ino
+                if is_new:
+                    self._add(path, is_sidecar)
+                # Media changes are usually our own writes; only new media can match anything new.
+                if is_sidecar:
+                    new_sidecars.append(path)
+                elif is_new:
+                    new_media.append(path)
+        known = self._dir_files.setdefault(directory, set())
+        for path in known - present:
+            self._remove(path)
+        for path in [p for p in self._unsettled if os.path.dirname(p) == directory and p not in present]:
+            del self._unsettled[path]
+        known &= present
+        known.update(p for p in present if p in self.scan.file_stats)
+        return subdirs
+
+    def _add(self, path, is_sidecar):
+        scan = self.scan
+        if is_sidecar:
+            self._sidecars[path] = None
+            scan.json_paths.append(path)
+            media = path.with_name(sidecar_media_name(path.name, self.media_exts))
+            self._adjacent[media] = path
+            if media in scan.file_stats:
+                scan.sidecar_index[media] = path
+        else:
+            self._copies.setdefault(path.name.lower(), {})[path] = None
+            scan.media_index.setdefault(path.name.lower(), []).append(path)
+            sidecar = self._adjacent.get(path)
+            if sidecar in scan.file_stats:
+                scan.sidecar_index[path] = sidecar
+
+    def _remove(self, path):
+        # The scan's lists are rebuilt once per poll by _sync, not searched here.
+        scan = self.scan
+        scan.file_stats.pop(path, None)
+        scan.inodes.pop(path, None)
+        media_name = sidecar_media_name(path.name, self.media_exts)
+        if media_name is not None:
+            self._sidecars.pop(path, None)
+            self._sidecars_stale = True
+            media = path.with_name(media_name)
+            if self._adjacent.get(media) == path:
+                del self._adjacent[media]
+            if scan.sidecar_index.get(media) == path:
+                del scan.sidecar_index[media]
+        else:
+            copies = self._copies.get(path.name.lower())
+            if copies is not None and path in copies:
+                del copies[path]
+                self._stale.add(path.name.lower())
+            scan.sidecar_index.pop(path, None)
+
+    def _sync(self):
+        """Bring ``scan.json_paths`` and ``scan.media_index`` up to date after removals."""
+        scan = self.scan
+        if self._sidecars_stale:
+            scan.json_paths = list(self._sidecars)
+            self._sidecars_stale = False
+        for name in self._stale:
+            if self._copies.get(name):
+                scan.media_index[name] = list(self._copies[name])
+            else:
+                self._copies.pop(name, None)
+                scan.media_index.pop(name, None)
+        self._stale.clear()
+
+    def _forget_directory(self, directory):
+        for path in self._dir_files.pop(directory, set()):
+            self._remove(path)
+        known = self._dirs.pop(directory, None)
+        for subdir in known[1] if known else ():
+            self._forget_directory(subdir)
+
+def _title(data):
+    return data.get("title", "").lower() if isinstance(data, dict) else ""
+
+def watch_export(project_root, interval=5.0, idle_exit=None, reconcile=True, output_path=None,
+                 report_format="csv", max_polls=None, sleep=time.sleep, **options):
+    """Patch sidecar/media pairs as they appear under project_root.
+
+    The export is polled every ``interval`` seconds with an
+    :class:`ExportWatcher`. As soon as a sidecar and a media file it matches
+    both exist, :func:`photo_metadata_patch.process_metadata_files` runs on
+    just those files. Sidecars whose media has not arrived yet (including
+    ones an earlier run moved to ``Unmatched_Metadata``) are parked in
+    memory and retried when media they may match (by name or title, see
+    :func:`~photo_metadata_match.candidate_keys`) shows up; sidecars of a
+    name that gains another copy are processed again so duplicates are
+    classified with every copy in view.
+
+    Watching stops on Ctrl-C, after ``idle_exit`` seconds without new
+    files, or after ``max_polls`` polls. With ``reconcile``, a normal run
+    over the whole export then writes the report to ``output_path``: the run
+    state lets it skip every pair handled while watching, and it moves the
+    sidecars that never found their media to ``Unmatched_Metadata``.
+    Other ``options`` are passed to :func:`process_metadata_files`.
+    Returns the number of sidecars processed while watching; raises
+    :class:`~photo_metadata_patch.PipelineError` if root does not exist.
+    """
+    root = Path(project_root).expanduser()
+    if not root.exists():
+        raise PipelineError(f"Project root '{root}' does not exist.")
+    watcher = ExportWatcher(root, exclude=[root / DUPLICATES_DIRNAME, root / USED_METADATA_DIRNAME])
+    candidates = {}  # sidecar -> lowercase media names it may match
+    keys = {}        # sidecar -> media name it matched when processed
+    parked = {}      # media name -> sidecars waiting for it
+    handled = {}     # media name -> sidecars already processed
+    processed = 0
+    polls = 0
+    last_change = time.monotonic()
+    scratch = tempfile.TemporaryDirectory(prefix="photo_metadata_watch")
+    print(f"Watching {root} (Ctrl-C to stop)")
+    try:
+        while True:
+            new_sidecars, new_media = watcher.poll()
+            polls += 1
+            ready = set()
+            workers = options.get("parallel_workers", 4)
+            documents = load_sidecars(new_sidecars, tuner=make_tuner("parse", workers)) if new_sidecars else {}
+            media_index = watcher.scan.media_index
+            for sidecar, data in documents.items():
+                for key in candidates.get(sidecar, ()):
+                    parked.get(key, set()).discard(sidecar)
+                handled.get(keys.get(sidecar), set()).discard(sidecar)
+                candidates[sidecar] = candidate_keys(sidecar.name, _title(data), watcher.media_exts)
+                if any(key in media_index for key in candidates[sidecar]):
+                    ready.add(sidecar)
+                else:
+                    for key in candidates[sidecar]:
+                        parked.setdefault(key, set()).add(sidecar)
+            for media in new_media:
+                name = media.name.lower()
+                ready |= parked.pop(name, set())
+                ready |= handled.get(name, set())
+            ready = {s for s in ready if s in watcher.scan.file_stats}
+            if new_sidecars or new_media:
+                last_change = time.monotonic()
+            if ready:
+                for sidecar in ready:
+                    for key in candidates[sidecar]:
+                        parked.get(key, set()).discard(sidecar)
+                    keys[sidecar] = next((k for k in candidates[sidecar] if k in media_index), "")
+                processed += _process_batch(watcher.scan, root, ready, keys, scratch.name, options)
+                for sidecar in ready:
+                    handled.setdefault(keys[sidecar], set()).add(sidecar)
+                waiting = len(set().union(*parked.values()))
+                print(f"Processed {len(ready)} sidecar(s); {waiting} waiting for their media")
+            if max_polls is not None and polls >= max_polls:
+                break
+            if idle_exit is not None and time.monotonic() - last_change >= idle_exit:
+                print(f"No new files for {idle_exit:g}s; stopping")
+                break
+            sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        scratch.cleanup()
+
+    if reconcile:
+        process_metadata_files(root, output_path=output_path, report_format=report_format, **options)
+    return processed
+
+def _process_batch(full, root, sidecars, keys, scratch, options):
+    """Run the pipeline on sidecars and the media they matched only."""
+    scan = ExportScan()
+    # Stat again: media written by an earlier batch may not have been re-listed yet.
+    def stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        scan.file_stats[path] = (st.st_size, st.st_mtime)
+        return True
+
+    scan.json_paths = [p for p in locality_order(sidecars, full.inodes) if stat(p)]
+    for sidecar in scan.json_paths:
+        media = [p for p in full.media_index.get(keys[sidecar], []) if stat(p)]
+        scan.media_index[keys[sidecar]] = media
+        for path in media:
+            if path in full.sidecar_index:
+                scan.sidecar_index[path] = full.sidecar_index[path]
+    try:
+        summary = run_pipeline(
+            root,
+            scan=scan,
+            prune_state=False,
+            output_path=Path(scratch) / "batch.jsonl",
+            report_format="jsonl",
+            **options,
+        )
+    except PipelineError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 0
+    if summary.failures:
+        # Failures are in the run state; the final reconciliation retries them.
+        print("Some files in this batch failed; they will be retried", file=sys.stderr)
+    return len(scan.json_paths)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Patch Google Photos metadata while Takeout parts are still being extracted"
+    )
+    parser.add_argument("root", help="Path to the Google Photos export root directory")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls (default: 5)")
+    parser.add_argument("--idle-exit", type=float, metavar="SECONDS",
+                        help="Stop after this long without new files (default: run until Ctrl-C)")
+    parser.add_argument("--no-reconcile", action="store_true",
+                        help="Skip the final run over the whole export after watching")
+    parser.add_argument("--output", help="Path to the final report (default: ~/Desktop/metadata_report.<format>)")
+    parser.add_argument("--report-format", choices=REPORT_FORMATS, default="csv")
+    parser.add_argument("--dry-run", action="store_true", help="Show operations without running exiftool")
+    parser.add_argument("--workers", type=parse_worker_count, default=AUTO,
+                        help="Number of parallel workers, or 'auto' to tune each stage to the storage (default)")
+    parser.add_argument("--no-content-dedup", action="store_true")
+    parser.add_argument("--move-duplicates", action="store_true")
+    parser.add_argument("--xmp-sidecar", action="append", metavar="EXT[:MIN_SIZE]")
+    args = parser.parse_args()
+
+    try:
+        watch_export(
+            args.root,
+            interval=args.interval,
+            idle_exit=args.idle_exit,
+            reconcile=not args.no_reconcile,
+            output_path=args.output,
+            report_format=args.report_format,
+            dry_run=args.dry_run,
+            parallel_workers=args.workers,
+            content_dedup=not args.no_content_dedup,
+            move_duplicates=args.move_duplicates,
+            xmp_sidecars=args.xmp_sidecar,
+        )
+    except PipelineError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
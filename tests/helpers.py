@@ -0,0 +1,27 @@
+from concurrent.futures import Future
+
+
+class FakePool:
+    """Stand-in for ExifToolPool that records commands instead of running them."""
+    submitted = []
+
+    def __init__(self, workers=1, on_latency=None, fast_path=None, tuner=None):
+        FakePool.submitted = []
+
+    def submit(self, cmd):
+        FakePool.submitted.append(cmd)
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def close(self):
+        pass
+
+
+class WritingPool(FakePool):
+    """A FakePool that changes each target file, as a real write would."""
+
+    def submit(self, cmd):
+        with open(cmd[-1], "ab") as f:
+            f.write(b" patched")
+        return super().submit(cmd)
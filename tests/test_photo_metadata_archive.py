@@ -0,0 +1,91 @@
+import io
+import json
+import tarfile
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from photo_metadata_archive import extract_matched_media
+from photo_metadata_journal import FileJournal
+from photo_metadata_patch import MEDIA_EXTENSIONS
+
+PREFIX = "Takeout/Google Photos/Trip/"
+
+
+def sidecar(title):
+    return json.dumps({"title": title, "photoTakenTime": {"timestamp": "1504122706"}}).encode()
+
+
+def add_tar_member(tf, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tf.addfile(info, io.BytesIO(data))
+
+
+class TestArchiveInput(unittest.TestCase):
+    def make_parts(self, tmp):
+        part1 = Path(tmp) / "takeout-001.zip"
+        with zipfile.ZipFile(part1, "w") as zf:
+            zf.writestr(PREFIX + "IMG_1.JPG.supplemental-metadata.json", sidecar("IMG_1.JPG"))
+            zf.writestr(PREFIX + "IMG_2.JPG.supplemental-metadata.json", sidecar("IMG_2.JPG"))
+            zf.writestr(PREFIX + "IMG_1.JPG", b"photo one")
+            zf.writestr("../escape.json", b"{}")
+        part2 = Path(tmp) / "takeout-002.tgz"
+        with tarfile.open(part2, "w:gz") as tf:
+            add_tar_member(tf, PREFIX + "IMG_2.JPG", b"photo two")
+            add_tar_member(tf, PREFIX + "NO_SIDECAR.JPG", b"orphan")
+        return [part1, part2]
+
+    def test_extracts_sidecars_and_matched_media_across_parts(self):
+        with TemporaryDirectory() as tmp:
+            parts = self.make_parts(tmp)
+            dest = Path(tmp) / "export"
+            sidecars, extracted = extract_matched_media(parts, dest, MEDIA_EXTENSIONS)
+
+            self.assertEqual((sidecars, extracted), (2, 2))
+            trip = dest / PREFIX
+            self.assertEqual((trip / "IMG_1.JPG").read_bytes(), b"photo one")
+            self.assertEqual((trip / "IMG_2.JPG").read_bytes(), b"photo two")
+            self.assertTrue((trip / "IMG_2.JPG.supplemental-metadata.json").exists())
+            self.assertFalse((trip / "NO_SIDECAR.JPG").exists())
+            self.assertFalse((Path(tmp) / "escape.json").exists())
+            self.assertEqual(list(dest.rglob("*.partial")), [])
+
+    def test_extracts_counter_suffixed_media_for_a_missing_photo(self):
+        with TemporaryDirectory() as tmp:
+            part = Path(tmp) / "takeout-001.zip"
+            with zipfile.ZipFile(part, "w") as zf:
+                zf.writestr(PREFIX + "img.jpg.supplemental-metadata.json", sidecar("img.jpg"))
+                zf.writestr(PREFIX + "img(1).jpg", b"numbered copy")
+            dest = Path(tmp) / "export"
+            self.assertEqual(extract_matched_media([part], dest, MEDIA_EXTENSIONS), (1, 1))
+            self.assertEqual((dest / PREFIX / "img(1).jpg").read_bytes(), b"numbered copy")
+
+    def test_rerun_does_not_overwrite_patched_media(self):
+        with TemporaryDirectory() as tmp:
+            parts = self.make_parts(tmp)
+            dest = Path(tmp) / "export"
+            extract_matched_media(parts, dest, MEDIA_EXTENSIONS)
+            (dest / PREFIX / "IMG_2.JPG").write_bytes(b"patched")
+
+            self.assertEqual(extract_matched_media(parts, dest, MEDIA_EXTENSIONS)[1], 0)
+            self.assertEqual((dest / PREFIX / "IMG_2.JPG").read_bytes(), b"patched")
+
+    def test_rerun_skips_sidecars_moved_by_a_run(self):
+        with TemporaryDirectory() as tmp:
+            parts = self.make_parts(tmp)
+            dest = Path(tmp) / "export"
+            extract_matched_media(parts, dest, MEDIA_EXTENSIONS)
+            sidecar_path = dest / PREFIX / "IMG_1.JPG.supplemental-metadata.json"
+            journal = FileJournal(dest)
+            journal.move(sidecar_path, dest / "Used_Metadata" / PREFIX / sidecar_path.name)
+            journal.flush()
+
+            extract_matched_media(parts, dest, MEDIA_EXTENSIONS)
+            self.assertFalse(sidecar_path.exists())
+            self.assertTrue((dest / PREFIX / "IMG_2.JPG.supplemental-metadata.json").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from photo_metadata_bench import benchmark_export, benchmark_startup, compare, write_exiftool_stub
+from photo_metadata_patch import MEDIA_EXTENSIONS, Pipeline, load_sidecars, scan_export
+from photo_metadata_synth import JPEG_STUB, PNG_STUB, SynthConfig, generate_export
+
+
+class TestSyntheticExport(unittest.TestCase):
+    def test_generate_export_matches_config(self):
+        with TemporaryDirectory() as tmp:
+            config = SynthConfig(count=200, depth=3, album_ratio=0.5, invalid_json_rate=0.1, seed=7)
+            summary = generate_export(tmp, config)
+            self.assertEqual(summary["photos"], 200)
+            self.assertGreater(summary["album_copies"], 50)
+            self.assertGreater(summary["misleading"], 0)
+
+            scan = scan_export(tmp, MEDIA_EXTENSIONS)
+            self.assertEqual(len(scan.json_paths), summary["photos"] + summary["album_copies"])
+            self.assertEqual(len(scan.sidecar_index), len(scan.json_paths))
+            self.assertTrue(all("Part 2" in str(p) for p in scan.json_paths))
+            documents = load_sidecars(scan.json_paths)
+            invalid = sum(1 for data in documents.values() if data is None)
+            self.assertGreater(invalid, 0)
+
+            with TemporaryDirectory() as other:
+                self.assertEqual(generate_export(other, config), summary)
+
+    def match_types(self, root):
+        with Pipeline(root, dry_run=True, parallel_workers=1, use_state=False, read_check=False) as pipeline:
+            planned = pipeline.plan(pipeline.index(pipeline.load(pipeline.changed())))
+            return [p.rows[0]["Match Type"] for p in planned]
+
+    def test_duplicate_kinds_survive_content_classification(self):
+        with TemporaryDirectory() as tmp:
+            config = SynthConfig(count=200, album_ratio=0.0, misleading_ratio=0.1, invalid_json_rate=0.0)
+            summary = generate_export(tmp, config)
+            groups = [paths for paths in scan_export(tmp, MEDIA_EXTENSIONS).media_index.values() if len(paths) > 1]
+            types = self.match_types(tmp)
+            self.assertEqual(types.count("Misleading Duplicate"), sum(len(paths) for paths in groups))
+            self.assertGreater(types.count("Misleading Duplicate"), summary["misleading"])
+            self.assertEqual(types.count("Exact Duplicate"), 0)
+
+        with TemporaryDirectory() as tmp:
+            config = SynthConfig(count=200, album_ratio=0.3, misleading_ratio=0.0, invalid_json_rate=0.0)
+            summary = generate_export(tmp, config)
+            types = self.match_types(tmp)
+            self.assertEqual(types.count("Exact Duplicate"), 2 * summary["album_copies"])
+            self.assertEqual(types.count("Misleading Duplicate"), 0)
+
+    def test_stub_media_headers(self):
+        self.assertTrue(JPEG_STUB.startswith(b"\xff\xd8\xff\xe0") and JPEG_STUB.endswith(b"\xff\xd9"))
+        self.assertTrue(PNG_STUB.startswith(b"\x89PNG"))
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_benchmark_export_times_every_phase(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp) / "export"
+            generate_export(root, SynthConfig(count=50))
+            phases = benchmark_export(root, workers=2, work_dir=tmp)
+            for phase in ("scan", "parse", "decode_generic", "decode", "classify", "plan", "report"):
+                self.assertGreater(phases[phase]["items"], 0)
+            self.assertIn("exiftool", phases)
+
+            lines = compare({"runs": {"50": phases}}, {"runs": {"50": phases}})
+            self.assertTrue(any("1.00x" in line for line in lines[1:]))
+
+    def test_benchmark_startup_times_imports_and_quick_commands(self):
+        timings = benchmark_startup(repeat=1, count=5)
+        for name in ("python", "import photo_metadata_patch", "cli status", "cli plan"):
+            self.assertGreater(timings[name], 0)
+        lines = compare({"runs": {}, "startup": timings}, {"runs": {}, "startup": timings})
+        self.assertTrue(any(line.startswith("cli plan") and "1.00x" in line for line in lines))
+
+    def test_exiftool_stub_speaks_stay_open_protocol(self):
+        with TemporaryDirectory() as tmp:
+            stub = write_exiftool_stub(tmp)
+            out = subprocess.run(
+                [str(stub), "-stay_open", "True", "-@", "-"],
+                input="-AllDates=x\nfile.jpg\n-echo4\n{ready7}\n-execute7\n-stay_open\nFalse\n",
+                capture_output=True, text=True, check=True,
+            )
+            self.assertTrue(out.stdout.endswith("{ready7}\n"))
+            self.assertEqual(out.stderr, "{ready7}\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
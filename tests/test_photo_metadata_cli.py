@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from photo_metadata_cli import export_status, plan_to_argfile
+from photo_metadata_exiftool import write_argfile
+from photo_metadata_state import RunState, summarize_state
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+class TestQuickCommands(unittest.TestCase):
+    def test_status_reads_run_state(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.assertIsNone(export_status(root))
+            with RunState(root) as state:
+                for name, outcome in [("a.json", "done"), ("b.json", "done"), ("c.json", "failed")]:
+                    state.record(root / name, (1, 1.0), "a.jpg", {}, None, outcome, [])
+            counts, updated = summarize_state(root)
+            self.assertEqual(counts, {"done": 2, "failed": 1})
+            self.assertIsNotNone(updated)
+            lines = export_status(root)
+            self.assertTrue(lines[0].startswith("3 sidecars"))
+            self.assertIn("1 sidecars still to write", lines[-1])
+
+    def test_plan_writes_argfile_without_touching_media(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ("A.JPG", "B.JPG"):
+                (root / name).write_bytes(b"img")
+                (root / (name + ".supplemental-metadata.json")).write_text(json.dumps({
+                    "title": name,
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            argfile = root / "plan.args"
+            outcomes = plan_to_argfile(root, argfile)
+            self.assertEqual(outcomes, {"planned": 2})
+            lines = argfile.read_text(encoding="utf-8").splitlines()
+            self.assertEqual(lines.count("-execute"), 1)
+            self.assertIn("-AllDates=2017:08:30 19:51:46", lines)
+            self.assertEqual(sorted(l for l in lines if l.endswith(".JPG")),
+                             [str(root / "A.JPG"), str(root / "B.JPG")])
+            self.assertEqual((root / "A.JPG").read_bytes(), b"img")
+            self.assertEqual(sorted(p.name for p in root.iterdir()), [
+                "A.JPG", "A.JPG.supplemental-metadata.json", "B.JPG", "B.JPG.supplemental-metadata.json", "plan.args",
+            ])
+
+    def test_plan_writes_each_identical_copy_once_with_absolute_paths(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            for album in ("Trip", "Photos from 2017"):
+                (root / album).mkdir()
+                (root / album / "IMG.JPG").write_bytes(b"img")
+                (root / album / "IMG.JPG.supplemental-metadata.json").write_text(json.dumps({
+                    "title": "IMG.JPG",
+                    "url": "https://photos.google.com/photo/A",
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            argfile = root / "plan.args"
+            outcomes = plan_to_argfile(os.path.relpath(root), argfile)
+            self.assertEqual(outcomes, {"planned": 1, "skipped": 1})
+            lines = argfile.read_text(encoding="utf-8").splitlines()
+            targets = [l for l in lines if l.endswith(".JPG")]
+            self.assertEqual(lines.count("-execute"), 0)
+            self.assertEqual(len(targets), 1)
+            self.assertTrue(Path(targets[0]).is_absolute())
+            self.assertEqual(Path(targets[0]).parent.parent, root)
+
+    def test_argfile_escapes_what_exiftool_would_change(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cmds.args"
+            self.assertEqual(write_argfile([["-XPComment=two\nlines", " padded", "#hash", "file.jpg"]], path), 1)
+            self.assertEqual(path.read_text(encoding="utf-8").splitlines(),
+                             ["#[CSTR]-XPComment=two\\nlines", "#[CSTR] padded", "#[CSTR]#hash", "file.jpg"])
+
+    def test_heavy_modules_load_lazily(self):
+        heavy = ("concurrent", "argparse", "csv", "exiftool", "photo_metadata_exif", "subprocess", "multiprocessing")
+        code = (
+            "import sys, photo_metadata_patch, photo_metadata_cli\n"
+            f"print(sorted(m for m in sys.modules if m.split('.')[0] in {heavy!r}))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
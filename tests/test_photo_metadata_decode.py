@@ -0,0 +1,76 @@
+import unittest
+
+from photo_metadata_decode import SidecarDecoder, compile_shape, decode_generic, flatten_json, sidecar_shape
+
+
+def takeout_sidecar(**extra):
+    data = {
+        "title": "IMG_0001.JPG",
+        "description": "",
+        "imageViews": "3",
+        "creationTime": {"timestamp": "1600000000", "formatted": "Sep 13, 2020"},
+        "photoTakenTime": {"timestamp": "1500000000", "formatted": "Jul 14, 2017"},
+        "geoData": {"latitude": 1.5, "longitude": 2.5, "altitude": 10.0},
+        "geoDataExif": {"latitude": 3.5, "longitude": 4.5},
+        "people": [{"name": "A"}],
+        "url": "https://photos.google.com/photo/1",
+        "googlePhotosOrigin": {"mobileUpload": {"deviceFolder": {"localFolderName": ""}, "deviceType": "IOS_PHONE"}},
+    }
+    data.update(extra)
+    return data
+
+
+def fields_of(decoded):
+    return {name: getattr(decoded, name) for name in decoded.__slots__}
+
+
+class TestSidecarDecoder(unittest.TestCase):
+    def test_compiled_matches_generic(self):
+        variants = [
+            takeout_sidecar(),
+            takeout_sidecar(geoDataExif={}),
+            takeout_sidecar(geoDataExif={"latitude": 0.0}, geoData={}),
+            takeout_sidecar(photoTakenTime={"timestamp": ""}),
+            {"title": "x.jpg"},
+            {},
+        ]
+        for data in variants:
+            with self.subTest(data=data):
+                expected = fields_of(decode_generic(data))
+                self.assertEqual(fields_of(compile_shape(sidecar_shape(data))(data)), expected)
+                self.assertEqual(list(decode_generic(data).flat), list(flatten_json(data)))
+
+    def test_location_and_timestamp_fallbacks(self):
+        decoded = SidecarDecoder()(takeout_sidecar())
+        self.assertEqual(decoded.geo, (3.5, 4.5, 0.0))
+        self.assertEqual(decoded.timestamp, "1500000000")
+        self.assertEqual(decoded.device_type, "IOS_PHONE")
+        self.assertEqual(decoded.flat["googlePhotosOrigin:mobileUpload:deviceType"], "IOS_PHONE")
+        decoded = SidecarDecoder()(takeout_sidecar(geoDataExif={}, photoTakenTime={"timestamp": ""}))
+        self.assertEqual(decoded.geo, (1.5, 2.5, 10.0))
+        self.assertEqual(decoded.timestamp, "1600000000")
+
+    def test_learns_each_shape_once(self):
+        decode = SidecarDecoder()
+        for i in range(5):
+            decode(takeout_sidecar(title=f"IMG_{i}.JPG"))
+        self.assertEqual(len(decode.by_shape), 1)
+        # Same top-level keys, different nested layout: the compiled
+        # function notices and the decoder picks the right one.
+        changed = takeout_sidecar(geoData={"latitude": 1.0, "longitude": 2.0})
+        self.assertEqual(fields_of(decode(changed)), fields_of(decode_generic(changed)))
+        nested_dict = takeout_sidecar(description={"text": "hi"})
+        self.assertEqual(fields_of(decode(nested_dict)), fields_of(decode_generic(nested_dict)))
+        self.assertEqual(len(decode.by_shape), 3)
+        self.assertEqual(fields_of(decode(takeout_sidecar())), fields_of(decode_generic(takeout_sidecar())))
+
+    def test_stops_compiling_past_max_shapes(self):
+        decode = SidecarDecoder(max_shapes=1)
+        decode(takeout_sidecar())
+        odd = {"title": "a.jpg", "other": 1}
+        self.assertEqual(fields_of(decode(odd)), fields_of(decode_generic(odd)))
+        self.assertEqual(len(decode.by_shape), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import sqlite3
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_dedup import PARTIAL_BYTES, HashCache, canonical_copies, find_content_groups
+
+
+def stats(paths):
+    return {p: (p.stat().st_size, p.stat().st_mtime) for p in paths}
+
+
+class TestContentGroups(unittest.TestCase):
+    def test_only_same_sized_files_are_read(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            a, b, c = root / "a.jpg", root / "b.jpg", root / "c.jpg"
+            a.write_bytes(b"x" * 10)
+            b.write_bytes(b"x" * 10)
+            c.write_bytes(b"x" * 11)
+            cache = HashCache()
+            self.assertEqual(find_content_groups([a, b, c], stats([a, b, c]), cache), [[a, b]])
+            self.assertEqual(cache.bytes_hashed, 20)
+
+    def test_full_hash_only_when_ends_collide(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            ends = b"h" * PARTIAL_BYTES
+            same1, same2, middle, tail = (root / n for n in ("s1.mov", "s2.mov", "m.mov", "t.mov"))
+            for path, mid, end in ((same1, b"a", ends), (same2, b"a", ends),
+                                   (middle, b"b", ends), (tail, b"a", b"t" * PARTIAL_BYTES)):
+                path.write_bytes(ends + mid * 100 + end)
+            paths = [same1, same2, middle, tail]
+            cache = HashCache()
+            self.assertEqual(find_content_groups(paths, stats(paths), cache), [[same1, same2]])
+            partial = 4 * 2 * PARTIAL_BYTES
+            self.assertEqual(cache.bytes_hashed, partial + 3 * same1.stat().st_size)
+
+    def test_hashes_are_cached_by_path_size_and_mtime(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            a, b = root / "a.jpg", root / "b.jpg"
+            a.write_bytes(b"same")
+            b.write_bytes(b"same")
+            conn = sqlite3.connect(str(root / "state.sqlite"))
+            find_content_groups([a, b], stats([a, b]), HashCache(conn, root=root))
+            conn.commit()
+
+            cache = HashCache(conn, readonly=True, root=root)
+            with patch("photo_metadata_dedup.partial_hash") as mock_hash:
+                self.assertEqual(find_content_groups([a, b], stats([a, b]), cache), [[a, b]])
+            mock_hash.assert_not_called()
+
+            b.write_bytes(b"diff")
+            changed = stats([a, b])
+            changed[b] = (changed[b][0], changed[b][1] + 1)
+            self.assertEqual(find_content_groups([a, b], changed, cache), [])
+            conn.close()
+
+    def test_canonical_copies(self):
+        a, b, c = Path("b/x.jpg"), Path("a/x.jpg"), Path("c/y.jpg")
+        self.assertEqual(canonical_copies([[b, a]]), {b: b, a: b})
+        self.assertEqual(canonical_copies(find_content_groups([], {})), {})
+        self.assertNotIn(c, canonical_copies([[a, b]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import json
+import shutil
+import struct
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from photo_metadata_exif import (
+    EXIF_HEADER,
+    GPS_ALT_REF,
+    GPS_LAT,
+    GPS_LAT_REF,
+    GPS_LON_REF,
+    MAKER_NOTE,
+    UNDEFINED,
+    Entry,
+    UnsupportedFile,
+    build_tiff,
+    parse_tiff,
+    write_native,
+)
+from photo_metadata_exiftool import ExifToolPool, READ_TAGS, read_tags
+from photo_metadata_patch import PlanContext, plan_sidecar
+from photo_metadata_synth import HEIC_STUB, JPEG_STUB, PNG_STUB
+
+SIDECAR = {
+    "url": "https://photos.google.com/photo/A",
+    "photoTakenTime": {"timestamp": "1504122706"},
+    "geoData": {"latitude": -33.8688, "longitude": 151.2093, "altitude": 12.5},
+}
+
+SAMPLE_JPEG = Path(__file__).parent / "Sample Photos" / "IMG_9993.JPG"
+
+CMD = [
+    "-overwrite_original_in_place",
+    "-AllDates=2017:08:30 19:51:46",
+    "-XPComment=https://photos.google.com/photo/A  Device: Views:",
+    "-GPSLatitude=-33.8688",
+    "-GPSLongitude=151.2093",
+    "-GPSAltitude=12.5",
+    "-GPSLatitudeRef=-33.8688",
+    "-GPSLongitudeRef=151.2093",
+    "-GPSAltitudeRef=12.5",
+]
+
+
+def jpeg_tiff(data):
+    start = data.index(b"\xff\xe1") + 4
+    assert data[start:start + 6] == EXIF_HEADER
+    (length,) = struct.unpack(">H", data[start - 2:start])
+    return data[start + 6:start - 2 + length]
+
+
+def png_tiff(data):
+    start = data.index(b"eXIf")
+    (length,) = struct.unpack(">I", data[start - 4:start])
+    return data[start + 4:start + 4 + length]
+
+
+def gps_tags(paths):
+    out = subprocess.run(
+        ["exiftool", "-json", "-G1", "-n", "-GPS:all"] + [str(p) for p in paths],
+        capture_output=True, check=True,
+    ).stdout
+    return {record.pop("SourceFile"): record for record in json.loads(out)}
+
+
+def ascii_value(entry):
+    return entry.data.rstrip(b"\x00").decode("ascii")
+
+
+class TestNativeWriter(unittest.TestCase):
+    def write(self, tmp, name, data, cmd=CMD):
+        path = Path(tmp) / name
+        path.write_bytes(data)
+        inode = path.stat().st_ino
+        self.assertTrue(write_native(cmd + [str(path)]))
+        self.assertEqual(path.stat().st_ino, inode)
+        return path.read_bytes()
+
+    def check_tags(self, tiff):
+        bo, ifds, _ = parse_tiff(tiff)
+        self.assertEqual(ascii_value(ifds["ifd0"][0x0132]), "2017:08:30 19:51:46")
+        self.assertEqual(ascii_value(ifds["exif"][0x9003]), "2017:08:30 19:51:46")
+        self.assertEqual(ascii_value(ifds["exif"][0x9004]), "2017:08:30 19:51:46")
+        comment = ifds["ifd0"][0x9C9C].data.decode("utf-16-le").rstrip("\x00")
+        self.assertEqual(comment, "https://photos.google.com/photo/A  Device: Views:")
+        self.assertEqual(ascii_value(ifds["gps"][GPS_LAT_REF]), "S")
+        self.assertEqual(ascii_value(ifds["gps"][GPS_LON_REF]), "E")
+        d, _, m, _, s, s_den = struct.unpack(bo + "6I", ifds["gps"][GPS_LAT].data)
+        self.assertAlmostEqual(d + m / 60 + s / s_den / 3600, 33.8688, places=6)
+        return ifds
+
+    def test_jpeg_without_exif(self):
+        with TemporaryDirectory() as tmp:
+            data = self.write(tmp, "a.jpg", JPEG_STUB)
+            self.check_tags(jpeg_tiff(data))
+            # The image data after the headers is copied unchanged.
+            self.assertTrue(data.endswith(JPEG_STUB[JPEG_STUB.index(b"\xff\xda"):]))
+            # Rewriting replaces the segment instead of adding another.
+            again = self.write(tmp, "a.jpg", data, CMD[:2])
+            self.assertEqual(again.count(EXIF_HEADER), 1)
+            self.check_tags(jpeg_tiff(again))
+
+    def test_png_without_exif(self):
+        with TemporaryDirectory() as tmp:
+            data = self.write(tmp, "a.png", PNG_STUB)
+            self.assertLess(data.index(b"eXIf"), data.index(b"IDAT"))
+            self.check_tags(png_tiff(data))
+            again = self.write(tmp, "a.png", data)
+            self.assertEqual(again.count(b"eXIf"), 1)
+            self.assertEqual(again, data)
+
+    def test_existing_tags_and_thumbnail_are_kept(self):
+        tiff = build_tiff("<", {
+            "ifd0": {0x010F: Entry(2, 6, b"Apple\x00")},
+            "exif": {0x829A: Entry(5, 1, struct.pack("<II", 1, 120))},
+        }, thumbnail=b"\xff\xd8thumb\xff\xd9")
+        segment = EXIF_HEADER + tiff
+        data = JPEG_STUB[:2] + b"\xff\xe1" + struct.pack(">H", len(segment) + 2) + segment + JPEG_STUB[2:]
+        with TemporaryDirectory() as tmp:
+            bo, ifds, thumbnail = parse_tiff(jpeg_tiff(self.write(tmp, "a.jpg", data)))
+        self.assertEqual(bo, "<")
+        self.assertEqual(ifds["ifd0"][0x010F].data, b"Apple\x00")
+        self.assertEqual(ifds["exif"][0x829A].data, struct.pack("<II", 1, 120))
+        self.assertEqual(thumbnail, b"\xff\xd8thumb\xff\xd9")
+
+    def test_sample_photo_only_changes_exif(self):
+        with TemporaryDirectory() as tmp:
+            original = SAMPLE_JPEG.read_bytes()
+            data = self.write(tmp, "a.jpg", original, CMD[:2])
+            _, before, thumb_before = parse_tiff(jpeg_tiff(original))
+            _, after, thumb_after = parse_tiff(jpeg_tiff(data))
+            self.assertEqual(thumb_before, thumb_after)
+            self.assertEqual(ascii_value(after["exif"][0x9003]), "2017:08:30 19:51:46")
+            self.assertEqual(set(before["exif"]), set(after["exif"]))
+            sos = original.index(b"\xff\xda")
+            self.assertEqual(data[data.index(b"\xff\xda"):], original[sos:])
+
+    def test_falls_back_to_exiftool(self):
+        tiff = build_tiff(">", {"ifd0": {}, "exif": {MAKER_NOTE: Entry(UNDEFINED, 8, b"Nikon\x00\x02\x00")}})
+        with self.assertRaises(UnsupportedFile):
+            parse_tiff(tiff)
+        segment = EXIF_HEADER + tiff
+        data = JPEG_STUB[:2] + b"\xff\xe1" + struct.pack(">H", len(segment) + 2) + segment + JPEG_STUB[2:]
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "maker.jpg").write_bytes(data)
+            (root / "a.heic").write_bytes(HEIC_STUB)
+            (root / "a.jpg").write_bytes(JPEG_STUB)
+            self.assertFalse(write_native(CMD + [str(root / "maker.jpg")]))
+            self.assertEqual((root / "maker.jpg").read_bytes(), data)
+            self.assertFalse(write_native(CMD + [str(root / "a.heic")]))
+            self.assertFalse(write_native(["-Rating=5", str(root / "a.jpg")]))
+            self.assertFalse(write_native(["-GPSLatitude=None", str(root / "a.jpg")]))
+            self.assertEqual((root / "a.jpg").read_bytes(), JPEG_STUB)
+            self.assertEqual(sorted(p.name for p in root.iterdir()), ["a.heic", "a.jpg", "maker.jpg"])
+
+    def test_truncated_files_fall_back_to_exiftool(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name, data in (("a.jpg", JPEG_STUB[:5]), ("b.jpg", b"\xff\xd8\xff\xff"),
+                               ("c.png", PNG_STUB[:8] + struct.pack(">I", 13) + b"IH")):
+                (root / name).write_bytes(data)
+                self.assertFalse(write_native(CMD + [str(root / name)]))
+                self.assertEqual((root / name).read_bytes(), data)
+            self.assertEqual(sorted(p.name for p in root.iterdir()), ["a.jpg", "b.jpg", "c.png"])
+
+    def test_pool_tries_fast_path_first(self):
+        handled = []
+        fast_path = lambda cmd: handled.append(cmd[-1]) or True
+        with ExifToolPool(workers=1, executable="/nonexistent/exiftool", fast_path=fast_path) as pool:
+            future = pool.submit(CMD + ["a.jpg"])
+        self.assertIsNone(future.result())
+        self.assertEqual(handled, ["a.jpg"])
+
+    def test_ref_tags_set_the_hemisphere(self):
+        with TemporaryDirectory() as tmp:
+            cmd = ["-GPSLatitude=33.8688", "-GPSLatitudeRef=-33.8688", "-GPSAltitude=12.5", "-GPSAltitudeRef=-12.5"]
+            bo, ifds, _ = parse_tiff(jpeg_tiff(self.write(tmp, "a.jpg", JPEG_STUB, cmd)))
+            self.assertEqual(ascii_value(ifds["gps"][GPS_LAT_REF]), "S")
+            self.assertEqual(ifds["gps"][GPS_ALT_REF].data, b"\x01")
+
+    @unittest.skipUnless(shutil.which("exiftool"), "exiftool not installed")
+    def test_matches_exiftool(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name, data in (("jpg", JPEG_STUB), ("png", PNG_STUB), ("sample.jpg", SAMPLE_JPEG.read_bytes())):
+                native, reference = root / f"native.{name}", root / f"exiftool.{name}"
+                native.write_bytes(data)
+                reference.write_bytes(data)
+                # The command the planner builds, so both writers get the same arguments.
+                media = Path(f"IMG.{name}")
+                ctx = PlanContext(
+                    media_index={media.name.lower(): [media]}, group_urls={}, file_stats={media: (1, 0.0)},
+                    dry_run=False,
+                )
+                _, cmd, _ = plan_sidecar(Path(f"{media}.json"), dict(SIDECAR, title=media.name), ctx)
+                self.assertTrue(write_native(cmd[:-1] + [str(native)]))
+                with ExifToolPool(workers=1) as pool:
+                    pool.submit(cmd[:-1] + [str(reference)]).result()
+                tags = read_tags([native, reference])
+                self.assertEqual(
+                    {tag: tags[str(native)].get(tag) for tag in READ_TAGS},
+                    {tag: tags[str(reference)].get(tag) for tag in READ_TAGS},
+                )
+                gps = gps_tags([native, reference])
+                self.assertEqual(gps[str(native)], gps[str(reference)])
+                self.assertEqual(gps[str(native)]["GPS:GPSLatitudeRef"], "S")
+                self.assertEqual(gps[str(native)]["GPS:GPSLongitudeRef"], "E")
+                self.assertEqual(gps[str(native)]["GPS:GPSAltitudeRef"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import stat
+import sys
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_exiftool import (
+    ExifToolError,
+    ExifToolPool,
+    already_written,
+    planned_tags,
+    read_tags,
+)
+
+# Answers "exiftool -json ... -@ argfile" with fixed tags for every listed file.
+READ_STUB = """
+import json, sys
+argfile = sys.argv[sys.argv.index("-@") + 1]
+files = [line.strip() for line in open(argfile, encoding="utf-8") if line.strip()]
+print(json.dumps([{"SourceFile": f, "ExifIFD:DateTimeOriginal": "2017:08:30 19:51:46"}
+                  for f in files if not f.startswith("missing")]))
+"""
+
+
+class FakeExifTool:
+    """Mimics pyexiftool's stay-open ExifTool closely enough for the pool."""
+    instances = []
+
+    def __init__(self, executable=None):
+        self.executed = []
+        self.last_status = 0
+        self.last_stderr = ""
+        self.thread = None
+        FakeExifTool.instances.append(self)
+
+    def __enter__(self):
+        self.thread = threading.current_thread().name
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, *params):
+        params = [p.decode() for p in params]
+        self.executed.append(params)
+        failed = params[-1].startswith("bad")
+        self.last_status = 1 if failed else 0
+        self.last_stderr = f"Error: cannot write {params[-1]}" if failed else ""
+        return "    1 image files updated" if not failed else ""
+
+
+class TestExifToolPool(unittest.TestCase):
+    def setUp(self):
+        FakeExifTool.instances = []
+        patcher = patch("photo_metadata_exiftool.ExifTool", FakeExifTool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reports_per_file_results(self):
+        with ExifToolPool(workers=3) as pool:
+            futures = {
+                name: pool.submit(["-overwrite_original_in_place", "-AllDates=2017:08:30 19:51:46", name])
+                for name in ["a.jpg", "bad.jpg", "c.jpg"]
+            }
+        self.assertIsNone(futures["a.jpg"].result())
+        self.assertIsNone(futures["c.jpg"].result())
+        with self.assertRaises(ExifToolError):
+            futures["bad.jpg"].result()
+        self.assertIn("cannot write bad.jpg", str(futures["bad.jpg"].exception()))
+
+    def test_starts_one_process_per_worker_and_splits_by_file(self):
+        with ExifToolPool(workers=2) as pool:
+            futures = [pool.submit(["-AllDates=x", f"{i}.jpg"]) for i in range(20)]
+        for future in futures:
+            future.result()
+        self.assertEqual(len(FakeExifTool.instances), 2)
+        executed = [cmd for et in FakeExifTool.instances for cmd in et.executed]
+        self.assertEqual(sorted(cmd[-1] for cmd in executed), sorted(f"{i}.jpg" for i in range(20)))
+
+    def test_start_failure_fails_each_file(self):
+        with patch("photo_metadata_exiftool.ExifTool", side_effect=OSError("boom")):
+            with ExifToolPool(workers=1) as pool:
+                future = pool.submit(["-AllDates=x", "a.jpg"])
+        self.assertIn("boom", str(future.exception()))
+
+
+class TestReadBeforeWrite(unittest.TestCase):
+    CMD = [
+        "-overwrite_original_in_place",
+        "-AllDates=2017:08:30 19:51:46",
+        "-XPComment=https://photos.google.com/photo/A",
+        "-GPSLatitude=-33.8688",
+        "-GPSLongitude=151.2093",
+        "-GPSAltitude=0.0",
+        "IMG.JPG",
+    ]
+    CURRENT = {
+        "ExifIFD:DateTimeOriginal": "2017:08:30 19:51:46",
+        "ExifIFD:CreateDate": "2017:08:30 19:51:46",
+        "IFD0:ModifyDate": "2017:08:30 19:51:46",
+        "IFD0:XPComment": "https://photos.google.com/photo/A",
+        "Composite:GPSLatitude": -33.8688000000001,
+        "Composite:GPSLongitude": 151.2093,
+        "Composite:GPSAltitude": 0,
+    }
+
+    def test_planned_tags(self):
+        planned = planned_tags(self.CMD)
+        self.assertEqual(planned["IFD0:ModifyDate"], "2017:08:30 19:51:46")
+        self.assertEqual(planned["Composite:GPSLatitude"], "-33.8688")
+        self.assertIsNone(planned_tags(["-Rating=5", "IMG.JPG"]))
+
+    def test_already_written(self):
+        self.assertTrue(already_written(self.CMD, self.CURRENT))
+        self.assertFalse(already_written(self.CMD, None))
+        self.assertFalse(already_written(self.CMD, {**self.CURRENT, "Composite:GPSLatitude": 33.8688}))
+        missing = dict(self.CURRENT)
+        del missing["IFD0:XPComment"]
+        self.assertFalse(already_written(self.CMD, missing))
+
+    def test_read_tags_in_batches(self):
+        with TemporaryDirectory() as tmp:
+            stub = Path(tmp) / "exiftool"
+            stub.write_text(f"#!{sys.executable}\n{READ_STUB}", encoding="utf-8")
+            stub.chmod(stub.stat().st_mode | stat.S_IXUSR)
+            paths = [f"{i}.jpg" for i in range(5)] + ["missing.jpg"]
+            current = read_tags(paths, executable=str(stub), batch_size=2, workers=2)
+            self.assertEqual(sorted(current), sorted(paths[:5]))
+            self.assertEqual(current["3.jpg"], {"ExifIFD:DateTimeOriginal": "2017:08:30 19:51:46"})
+            self.assertEqual(read_tags(paths, executable=str(Path(tmp) / "absent")), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
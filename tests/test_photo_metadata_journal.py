@@ -0,0 +1,115 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_journal import JOURNAL_FILENAME, FileJournal, read_journal, undo
+from photo_metadata_patch import process_metadata_files
+
+
+class TestFileJournal(unittest.TestCase):
+    def test_moves_run_in_batches_and_undo_restores(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ("a", "b", "c"):
+                (root / "album").mkdir(exist_ok=True)
+                (root / "album" / name).write_text(name)
+            journal = FileJournal(root, batch_size=2)
+            self.assertEqual(journal.move(root / "album" / "a", root / "Moved" / "album" / "a"), [])
+            results = journal.move(root / "album" / "b", root / "Moved" / "album" / "b")
+            self.assertEqual([error for *_, error in results], [None, None])
+            journal.move(root / "album" / "c", root / "Moved" / "album" / "a")
+            (src, dst, error), = journal.flush()
+            self.assertIsInstance(error, FileExistsError)
+            self.assertTrue(src.exists())
+            self.assertEqual(read_journal(root / JOURNAL_FILENAME),
+                             [("album/a", "Moved/album/a"), ("album/b", "Moved/album/b")])
+
+            self.assertEqual(undo(root), (2, 0))
+            self.assertEqual(sorted(p.name for p in (root / "album").iterdir()), ["a", "b", "c"])
+            self.assertFalse((root / "Moved").exists())
+            self.assertFalse((root / JOURNAL_FILENAME).exists())
+
+    def test_undo_after_crash_mid_batch(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "Moved").mkdir()
+            (root / "Moved" / "a").write_text("a")
+            (root / "b").write_text("b")
+            # Intent written, first move done, then the process died.
+            (root / JOURNAL_FILENAME).write_text(
+                json.dumps({"op": "move", "batch": "x", "moves": [["a", "Moved/a"], ["b", "Moved/b"]]}) + "\n"
+                + '{"op": "do', encoding="utf-8",
+            )
+            self.assertEqual(undo(root), (1, 0))
+            self.assertEqual((root / "a").read_text(), "a")
+            self.assertEqual((root / "b").read_text(), "b")
+
+    def test_conflicts_stay_in_journal(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "a").write_text("old")
+            journal = FileJournal(root)
+            journal.move(root / "a", root / "Moved" / "a")
+            journal.flush()
+            (root / "a").write_text("new")
+            self.assertEqual(undo(root), (0, 1))
+            self.assertEqual(read_journal(root / JOURNAL_FILENAME), [("a", "Moved/a")])
+            (root / "a").unlink()
+            self.assertEqual(undo(root), (1, 0))
+            self.assertEqual((root / "a").read_text(), "old")
+
+    def test_run_moves_are_journaled(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            album = root / "album"
+            album.mkdir()
+            (album / "IMG.JPG").write_bytes(b"img")
+            for name in ("IMG.JPG", "GONE.JPG"):
+                (album / (name + ".supplemental-metadata.json")).write_text(json.dumps({
+                    "title": name,
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            with patch("photo_metadata_patch.ExifToolPool") as mock_pool, \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None):
+                future = mock_pool.return_value.submit.return_value
+                future.exception.return_value = None
+                future.cancelled.return_value = False
+                process_metadata_files(
+                    root, dry_run=False, parallel_workers=1, output_path=root / "report.csv",
+                    use_state=False, read_check=False, native_writer=False, move_used_metadata=True,
+                )
+            self.assertTrue((root / "Unmatched_Metadata" / "GONE.JPG.supplemental-metadata.json").exists())
+            self.assertTrue((root / "Used_Metadata" / "album" / "IMG.JPG.supplemental-metadata.json").exists())
+            self.assertEqual(list(album.iterdir()), [album / "IMG.JPG"])
+            self.assertIn("moved JSON", (root / "report.csv").read_text(encoding="utf-8"))
+
+            self.assertEqual(undo(root), (2, 0))
+            self.assertEqual(len(list(album.iterdir())), 3)
+            self.assertFalse((root / "Used_Metadata").exists())
+
+    def test_rerun_leaves_unmatched_sidecars_in_place(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for album in ("a", "b"):
+                (root / album).mkdir()
+                (root / album / "GONE.JPG.supplemental-metadata.json").write_text(json.dumps({
+                    "title": "GONE.JPG",
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            report = root / "report.csv"
+            for _ in range(2):
+                process_metadata_files(root, dry_run=True, parallel_workers=1, output_path=report, use_state=False)
+                text = report.read_text(encoding="utf-8")
+                self.assertNotIn("Failed", text)
+            self.assertEqual(text.count("already in Unmatched_Metadata"), 2)
+            unmatched = root / "Unmatched_Metadata"
+            self.assertEqual(sorted(p.relative_to(unmatched).as_posix() for p in unmatched.rglob("*.json")),
+                             ["GONE.JPG.supplemental-metadata.json", "b/GONE.JPG.supplemental-metadata.json"])
+            self.assertEqual(len(read_journal(root / JOURNAL_FILENAME)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_match import MatchIndex, candidate_keys, sidecar_media_name, strip_counter
+from photo_metadata_patch import MEDIA_EXTENSIONS, process_metadata_files, scan_export
+from helpers import FakePool
+
+
+def write_sidecar(path, title):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "title": title,
+        "url": f"https://photos.google.com/photo/{path.name}",
+        "photoTakenTime": {"timestamp": "1504122706"},
+    }))
+
+
+class TestNames(unittest.TestCase):
+    def test_sidecar_media_name(self):
+        cases = {
+            "IMG.JPG.supplemental-metadata.json": "IMG.JPG",
+            "IMG.JPG.supplemental-me.json": "IMG.JPG",
+            "IMG.JPG.json": "IMG.JPG",
+            "IMG.JPG.supplemental-metadata(1).json": "IMG(1).JPG",
+            "IMG.JPG(2).json": "IMG(2).JPG",
+            "IMG(1).JPG.supplemental-metadata.json": "IMG(1).JPG",
+            "clip.avi.supplemental-metadata.json": "clip.avi",
+            "metadata.json": None,
+            "IMG.JPG": None,
+        }
+        for name, media in cases.items():
+            self.assertEqual(sidecar_media_name(name, MEDIA_EXTENSIONS), media, name)
+
+    def test_candidate_keys(self):
+        title = "a" * 50 + ".jpg"
+        self.assertEqual(
+            candidate_keys("x.jpg.supplemental-metadata(1).json", title, MEDIA_EXTENSIONS),
+            ["x(1).jpg", title, "a" * 47 + ".jpg", "a" * 50 + "-edited.jpg"],
+        )
+        self.assertEqual(candidate_keys("notes.json", "", MEDIA_EXTENSIONS), [])
+        self.assertEqual(strip_counter("img(12).jpg"), "img.jpg")
+
+    def test_resolve_prefers_the_sidecar_name(self):
+        index = MatchIndex(
+            {"img.jpg": [], "img(1).jpg": [], "b-edited.jpg": [], "c(1).jpg": []}, MEDIA_EXTENSIONS
+        )
+        self.assertEqual(index.resolve("IMG.JPG.supplemental-metadata(1).json", "img.jpg"), "img(1).jpg")
+        self.assertEqual(index.resolve("IMG.JPG.supplemental-metadata.json", "img.jpg"), "img.jpg")
+        self.assertEqual(index.resolve("x.json", "b.jpg"), "b-edited.jpg")
+        self.assertEqual(index.resolve("x.json", "c.jpg"), "c(1).jpg")
+        self.assertEqual(index.resolve("x.json", "gone.jpg"), "gone.jpg")
+
+
+class TestMangledExport(unittest.TestCase):
+    def test_mangled_names_are_matched(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            album = root / "Album"
+            album.mkdir()
+            # Two different photos with the same title: Takeout numbers the second.
+            (album / "IMG.JPG").write_bytes(b"first")
+            (album / "IMG(1).JPG").write_bytes(b"second")
+            write_sidecar(album / "IMG.JPG.supplemental-metadata.json", "IMG.JPG")
+            write_sidecar(album / "IMG.JPG.supplemental-metadata(1).json", "IMG.JPG")
+            # A long name cut to 47 characters, its sidecar kept in another folder.
+            long_title = "Screenshot_20200830-184422_Samsung Internet Beta.jpg"
+            (album / (long_title[:47] + ".jpg")).write_bytes(b"shot")
+            write_sidecar(root / "Metadata" / "Screenshot.json.supplemental-metadata.json", long_title)
+            # Only the edited copy was exported.
+            (album / "PXL-edited.jpg").write_bytes(b"edit")
+            write_sidecar(root / "Metadata" / "PXL.jpg.supplemental-metadata.json", "PXL.jpg")
+
+            scan = scan_export(root, MEDIA_EXTENSIONS)
+            self.assertEqual(scan.sidecar_index[album / "IMG(1).JPG"].name, "IMG.JPG.supplemental-metadata(1).json")
+
+            with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch("photo_metadata_patch.read_tags", return_value={}):
+                process_metadata_files(root, dry_run=False, parallel_workers=1, output_path=root / "r.csv")
+            written = sorted(Path(cmd[-1]).name for cmd in FakePool.submitted)
+            self.assertEqual(written, sorted(["IMG.JPG", "IMG(1).JPG", long_title[:47] + ".jpg", "PXL-edited.jpg"]))
+            self.assertEqual(list((root / "Unmatched_Metadata").iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
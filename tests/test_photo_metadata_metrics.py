@@ -0,0 +1,67 @@
+import json
+import pstats
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_metrics import Metrics, ProgressReporter, describe_progress
+from photo_metadata_patch import process_metadata_files
+
+
+class TestMetrics(unittest.TestCase):
+    def test_phases_counters_and_histogram(self):
+        metrics = Metrics()
+        with metrics.phase("parse", items=4):
+            pass
+        metrics.add("parse", "parse_failures")
+        metrics.add("parse", "bytes_read", 100)
+        metrics.observe_exiftool(0.003)
+        metrics.observe_exiftool(0.2)
+        metrics.observe_exiftool(120)
+
+        summary = metrics.to_dict()
+        parse = summary["phases"]["parse"]
+        self.assertEqual((parse["items"], parse["parse_failures"], parse["bytes_read"]), (4, 1, 100))
+        latency = summary["exiftool_latency"]
+        self.assertEqual(latency["calls"], 3)
+        self.assertEqual(latency["histogram"]["<=0.005s"], 1)
+        self.assertEqual(latency["histogram"]["<=0.25s"], 1)
+        self.assertEqual(latency["histogram"][">60.0s"], 1)
+        self.assertEqual(latency["max_seconds"], 120)
+
+    def test_progress_reporter_throttles(self):
+        draws = []
+        progress = ProgressReporter(1000, interval=3600, draw=lambda *args: draws.append(args[0]))
+        for i in range(1, 1001):
+            progress.update(i)
+        self.assertEqual(draws, [1, 1000])
+
+    def test_describe_progress(self):
+        self.assertEqual(describe_progress(0, 100, 0.0), "0/100")
+        self.assertEqual(describe_progress(50, 4050, 10.0), "50/4050 \u00b7 5.0 files/s \u00b7 ETA 0:13:20")
+        self.assertEqual(describe_progress(7, None, 2.0), "7 \u00b7 3.5 files/s")
+
+    def test_process_metadata_files_writes_metrics_and_profile(self):
+        with TemporaryDirectory() as tmp:
+            metrics_path = Path(tmp) / "metrics.json"
+            profile_path = Path(tmp) / "parse.prof"
+            with patch("photo_metadata_patch.apply_metadata_batch"):
+                process_metadata_files(
+                    "tests", dry_run=True, parallel_workers=2, output_path=Path(tmp) / "r.csv",
+                    use_state=False, metrics_out=metrics_path, profile_out=profile_path,
+                )
+            phases = json.loads(metrics_path.read_text(encoding="utf-8"))["phases"]
+            for phase in ("scan", "parse", "classify", "apply", "report"):
+                self.assertIn(phase, phases)
+            self.assertEqual(phases["parse"]["items"], 2)
+            self.assertEqual(phases["parse"]["parse_failures"], 0)
+            self.assertGreater(phases["parse"]["bytes_read"], 0)
+            self.assertGreater(phases["scan"]["bytes_stated"], 0)
+            stats = pstats.Stats(str(profile_path))
+            self.assertTrue(any(func[2] == "load_json_metadata" for func in stats.stats))
+
+
+if __name__ == "__main__":
+    unittest.main()
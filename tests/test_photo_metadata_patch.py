@@ -6,11 +6,26 @@ from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
 from photo_metadata_patch import (
+    scan_export,
     index_media_files,
     load_json_metadata,
     get_duplicate_type,
     process_metadata_files,
+    PlanContext,
+    plan_sidecar,
+    plan_sidecars,
+    choose_executor,
+    parse_xmp_policy,
+    Pipeline,
+    PipelineError,
+    RunCancelled,
+    SidecarRecord,
+    classify_records,
+    match_records,
+    plan_records,
+    run_pipeline,
 )
+from helpers import FakePool
 
 
 class TestPhotoMetadataPatch(unittest.TestCase):
@@ -28,6 +43,34 @@ class TestPhotoMetadataPatch(unittest.TestCase):
             self.assertIn("img.jpg", index)
             self.assertEqual(len(index["img.jpg"]), 2)
 
+    def test_scan_export_indexes_sidecars_in_one_pass(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "a").mkdir()
+            (root / "b").mkdir()
+            with_sidecar = root / "a" / "IMG.JPG"
+            without_sidecar = root / "b" / "IMG.JPG"
+            with_sidecar.write_bytes(b"abc")
+            without_sidecar.touch()
+            sidecar = root / "a" / "IMG.JPG.supplemental-metadata.json"
+            sidecar.write_text(json.dumps({"url": "A"}))
+            (root / "a" / "notes.txt").touch()
+
+            scan = scan_export(root, {".jpg"})
+            self.assertEqual(len(scan.media_index["img.jpg"]), 2)
+            self.assertEqual(scan.json_paths, [sidecar])
+            self.assertEqual(scan.sidecar_index, {with_sidecar: sidecar})
+            self.assertEqual(scan.file_stats[with_sidecar][0], 3)
+            self.assertIn(sidecar, scan.file_stats)
+            self.assertNotIn(root / "a" / "notes.txt", scan.file_stats)
+
+            self.assertEqual(
+                get_duplicate_type(
+                    scan.media_index["img.jpg"], "A", scan.media_index, scan.sidecar_index
+                ),
+                "Exact Duplicate",
+            )
+
     def test_load_json_metadata(self):
         with TemporaryDirectory() as tmp:
             root = Path(tmp)
@@ -69,6 +112,114 @@ class TestPhotoMetadataPatch(unittest.TestCase):
                 get_duplicate_type([file1], "A", media_index), "Unique"
             )
 
+    def test_duplicate_classification_parses_each_sidecar_once(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for i in range(5):
+                album = root / f"album{i}"
+                album.mkdir()
+                (album / "IMG.JPG").touch()
+                (album / "IMG.JPG.supplemental-metadata.json").write_text(json.dumps({
+                    "title": "IMG.JPG",
+                    "url": "A",
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            report = root / "report.csv"
+            with patch("photo_metadata_patch.apply_metadata_batch") as mock_apply, \
+                    patch("photo_metadata_patch.load_json_metadata",
+                          wraps=load_json_metadata) as mock_load:
+                mock_apply.return_value = True
+                process_metadata_files(
+                    root, dry_run=True, parallel_workers=2, output_path=report, use_state=False,
+                    content_dedup=False,
+                )
+            self.assertEqual(mock_load.call_count, 5)
+            self.assertEqual(mock_apply.call_args[0][0], [])
+            self.assertIn("Exact Duplicate", report.read_text(encoding="utf-8"))
+
+    def test_identical_copies_are_patched_once(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for i, content in enumerate([b"same", b"same", b"same", b"diff"]):
+                album = root / f"album{i}"
+                album.mkdir()
+                name = "IMG.JPG" if i < 3 else "OTHER.JPG"
+                (album / name).write_bytes(content)
+                (album / (name + ".supplemental-metadata.json")).write_text(json.dumps({
+                    "title": name,
+                    "url": f"A{i}",
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            (root / "album3" / "IMG.JPG").write_bytes(b"same")
+            report = root / "report.csv"
+            with patch("photo_metadata_patch.ExifToolPool") as mock_pool, \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None):
+                mock_pool.return_value.submit.return_value.exception.return_value = None
+                process_metadata_files(
+                    root, dry_run=False, parallel_workers=2, output_path=report,
+                    use_state=False, move_duplicates=True,
+                )
+            targets = [c.args[0][-1] for c in mock_pool.return_value.submit.call_args_list]
+            self.assertEqual(sorted(Path(t).name for t in targets), ["IMG.JPG", "OTHER.JPG"])
+            self.assertEqual(
+                sorted(p.relative_to(root / "Duplicates").as_posix() for p in (root / "Duplicates").rglob("*.JPG")),
+                ["album1/IMG.JPG", "album2/IMG.JPG", "album3/IMG.JPG"],
+            )
+            self.assertTrue((root / "album0" / "IMG.JPG").exists())
+            text = report.read_text(encoding="utf-8")
+            self.assertIn("Identical copy already patched", text)
+            self.assertNotIn("Misleading Duplicate", text)
+
+    def test_plan_sidecar_is_pure(self):
+        media = Path("album/IMG.JPG")
+        ctx = PlanContext(
+            media_index={"img.jpg": [media]},
+            group_urls={"img.jpg": {"A"}},
+            file_stats={media: (3, 0.0)},
+            dry_run=False,
+        )
+        data = {"title": "IMG.JPG", "url": "A", "photoTakenTime": {"timestamp": "1504122706"}}
+        rows, cmd, outcome = plan_sidecar(Path("album/IMG.JPG.json"), data, ctx)
+        self.assertEqual(outcome, "planned")
+        self.assertEqual(cmd[-1], str(media))
+        self.assertEqual(rows[0]["File Size in bytes"], 3)
+
+        rows, cmd, outcome = plan_sidecar(Path("x.json"), {"title": "other.jpg"}, ctx)
+        self.assertEqual((cmd, outcome), (None, "unmatched"))
+        self.assertEqual(rows[0]["Notes"], "")
+
+    def test_plan_sidecars_processes_match_threads(self):
+        ctx = PlanContext(media_index={}, group_urls={}, file_stats={})
+        items = [(Path(f"{i}.json"), {"title": f"{i}.jpg"} if i % 3 else None) for i in range(10)]
+        threads = list(plan_sidecars(items, ctx, workers=2, mode="threads", chunk_size=3))
+        processes = list(plan_sidecars(items, ctx, workers=2, mode="processes", chunk_size=3))
+        self.assertEqual(threads, processes)
+        self.assertEqual([r[2] for r in threads][:2], ["invalid", "unmatched"])
+
+    def test_plan_sidecars_streams_with_workers(self):
+        ctx = PlanContext(media_index={}, group_urls={}, file_stats={})
+        taken = []
+
+        def items():
+            for i in range(10000):
+                taken.append(i)
+                yield Path(f"{i}.json"), {"title": f"{i}.jpg"}
+
+        for mode in ("threads", "processes"):
+            taken.clear()
+            planned = plan_sidecars(items(), ctx, workers=2, mode=mode, chunk_size=10)
+            next(planned)
+            # Only two chunks per worker were read ahead.
+            self.assertLessEqual(len(taken), 2 * 2 * 10)
+            planned.close()
+
+    def test_choose_executor(self):
+        self.assertEqual(choose_executor("threads", 10 ** 6, 8), "threads")
+        self.assertEqual(choose_executor("auto", 10, 8), "threads")
+        with patch("os.cpu_count", return_value=8):
+            self.assertEqual(choose_executor("auto", 10 ** 6, 8), "processes")
+        self.assertEqual(choose_executor("auto", 10 ** 6, 1), "threads")
+
     def test_commands_include_overwrite_flag(self):
         report = Path("tests/output.csv")
         if report.exists():
@@ -86,6 +237,48 @@ class TestPhotoMetadataPatch(unittest.TestCase):
             self.assertTrue(cmds and all(cmd[0] == "-overwrite_original_in_place" for cmd in cmds))
         report.unlink()
 
+    def test_parse_xmp_policy(self):
+        self.assertEqual(
+            parse_xmp_policy([".mov", "MP4:1.5K", "heic:20MB"]),
+            {".mov": 0, ".mp4": 1536, ".heic": 20 * 1024 ** 2},
+        )
+        with self.assertRaises(ValueError):
+            parse_xmp_policy(["mov:big"])
+
+    def test_xmp_sidecar_commands(self):
+        with TemporaryDirectory() as tmp:
+            with patch("photo_metadata_patch.apply_metadata_batch") as mock_apply:
+                process_metadata_files(
+                    "tests", dry_run=True, parallel_workers=1, output_path=Path(tmp) / "r.csv",
+                    use_state=False, xmp_sidecars=[".heic", ".jpg:1G"],
+                )
+            cmds = {Path(cmd[-1]).name: cmd for cmd in mock_apply.call_args[0][0]}
+        self.assertEqual(sorted(cmds), ["IMG_0300.xmp", "IMG_9993.JPG"])
+        xmp = cmds["IMG_0300.xmp"]
+        self.assertEqual(xmp[0], "-overwrite_original")
+        self.assertIn("-XMP-exif:DateTimeOriginal=2020:09:15 21:13:18", xmp)
+        self.assertTrue(any(arg.startswith("-XMP-exif:GPSLatitude=") for arg in xmp))
+        self.assertFalse(any(arg.startswith("-AllDates") for arg in xmp))
+        self.assertEqual(cmds["IMG_9993.JPG"][0], "-overwrite_original_in_place")
+
+    def test_live_photo_pair_does_not_share_an_xmp_sidecar(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ("IMG_0001.HEIC", "IMG_0001.MOV", "IMG_0002.HEIC"):
+                (root / name).write_bytes(b"media")
+                (root / (name + ".supplemental-metadata.json")).write_text(json.dumps({
+                    "title": name,
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            with patch("photo_metadata_patch.apply_metadata_batch") as mock_apply:
+                report = process_metadata_files(
+                    root, dry_run=True, parallel_workers=1, output_path=root / "r.csv",
+                    use_state=False, xmp_sidecars=[".heic", ".mov"],
+                )
+            targets = sorted(Path(cmd[-1]).name for cmd in mock_apply.call_args[0][0])
+            self.assertEqual(targets, ["IMG_0001.HEIC", "IMG_0001.MOV", "IMG_0002.xmp"])
+            self.assertEqual(report.read_text(encoding="utf-8").count("another file shares IMG_0001.xmp"), 2)
+
     def test_csv_header_deduplicates_title_url(self):
         report = Path("tests/output.csv")
         if report.exists():
@@ -106,6 +299,120 @@ class TestPhotoMetadataPatch(unittest.TestCase):
         report.unlink()
 
 
+class TestPipeline(unittest.TestCase):
+    def make_export(self, root):
+        for name in ("IMG_A.JPG", "IMG_B.JPG"):
+            media = root / "Album" / name
+            media.parent.mkdir(exist_ok=True)
+            media.write_bytes(name.encode())
+            media.with_name(name + ".supplemental-metadata.json").write_text(json.dumps({
+                "title": name,
+                "url": f"https://photos.google.com/photo/{name}",
+                "photoTakenTime": {"timestamp": "1504122706"},
+            }))
+
+    def test_stages_compose_to_plan_sidecar(self):
+        media = Path("album/IMG.JPG")
+        ctx = PlanContext(
+            media_index={"img.jpg": [media]},
+            group_urls={"img.jpg": {"A"}},
+            file_stats={media: (3, 0.0)},
+        )
+        records = [
+            SidecarRecord(Path("album/IMG.JPG.json"), {"title": "IMG.JPG", "url": "A"}),
+            SidecarRecord(Path("bad.json"), None),
+        ]
+        planned = list(plan_records(classify_records(match_records(records, ctx), ctx), ctx))
+        self.assertEqual(
+            [(p.rows, p.cmd, p.outcome) for p in planned],
+            [plan_sidecar(r.path, r.data, ctx) for r in records],
+        )
+        self.assertFalse(hasattr(planned[0], "__dict__"))
+
+    def test_errors_raise_instead_of_exiting(self):
+        with TemporaryDirectory() as tmp:
+            with self.assertRaises(PipelineError):
+                run_pipeline(Path(tmp) / "missing", output_path=Path(tmp) / "r.csv")
+            with self.assertRaises(PipelineError):
+                Pipeline(tmp, xmp_sidecars=["mov:lots"])
+
+    def test_native_writer_runs_without_exiftool(self):
+        from photo_metadata_synth import JPEG_STUB
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name, data in (("IMG.JPG", JPEG_STUB), ("CLIP.MOV", b"movie")):
+                (root / name).write_bytes(data)
+                (root / (name + ".supplemental-metadata.json")).write_text(json.dumps({
+                    "title": name,
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            with patch("photo_metadata_patch.exiftool_unavailable", return_value="exiftool missing"), \
+                    patch("photo_metadata_patch.ExifToolPool") as mock_pool:
+                summary = run_pipeline(
+                    root, output_path=root / "r.csv", dry_run=False, parallel_workers=1, use_state=False,
+                )
+            mock_pool.assert_not_called()
+            self.assertEqual(summary.failures, 1)
+            self.assertNotEqual((root / "IMG.JPG").read_bytes(), JPEG_STUB)
+            self.assertEqual((root / "CLIP.MOV").read_bytes(), b"movie")
+            text = (root / "r.csv").read_text(encoding="utf-8")
+            self.assertEqual(text.count("Exiftool error: exiftool missing"), 1)
+
+    def test_stages_can_be_filtered_and_sunk(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.make_export(root)
+            with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch("photo_metadata_patch.read_tags", return_value={}):
+                with Pipeline(root, dry_run=False, parallel_workers=1, use_state=False) as pipeline:
+                    records = pipeline.index(pipeline.load(pipeline.changed()))
+                    planned = (p for p in pipeline.plan(records) if p.title == "img_a.jpg")
+                    results = list(pipeline.apply(planned))
+                self.assertEqual([r.outcome for r in results], ["done"])
+                self.assertEqual([cmd[-1] for cmd in FakePool.submitted], [str(root / "Album" / "IMG_A.JPG")])
+
+                seen = []
+                summary = run_pipeline(
+                    root, output_path=root / "r.jsonl", report_format="jsonl",
+                    dry_run=False, parallel_workers=1, use_state=False, sinks=[seen.append],
+                )
+            self.assertEqual((summary.sidecars, summary.failures), (2, 0))
+            self.assertEqual(sorted(r.title for r in seen), ["img_a.jpg", "img_b.jpg"])
+
+    def test_progress_and_cancel_between_files(self):
+        import threading
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.make_export(root)
+            cancel = threading.Event()
+            progress = []
+            with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch("photo_metadata_patch.read_tags", return_value={}):
+                with self.assertRaises(RunCancelled):
+                    run_pipeline(
+                        root, output_path=root / "r.jsonl", report_format="jsonl",
+                        dry_run=False, parallel_workers=1,
+                        on_progress=lambda *event: progress.append(event),
+                        cancel=cancel, sinks=[lambda result: cancel.set()],
+                    )
+                self.assertEqual(len(FakePool.submitted), 1)
+                self.assertEqual(len((root / "r.jsonl").read_text().splitlines()), 1)
+                self.assertEqual(
+                    [phase for phase in ("scan", "parse", "apply") if any(e[0] == phase for e in progress)],
+                    ["scan", "parse", "apply"],
+                )
+
+                # The next run skips the finished file and writes the other one.
+                summary = run_pipeline(
+                    root, output_path=root / "r.jsonl", report_format="jsonl",
+                    dry_run=False, parallel_workers=1,
+                )
+            self.assertEqual(summary.sidecars, 2)
+            self.assertEqual(len(FakePool.submitted), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,70 @@
+import csv
+import json
+import sqlite3
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_patch import process_metadata_files
+from photo_metadata_report import ReportWriter
+
+
+class TestReportWriter(unittest.TestCase):
+    def test_csv_header_is_union_of_streamed_rows(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.csv"
+            with ReportWriter(path) as report:
+                report.write_rows([{"Title": "a", "x": 1}])
+                report.write_rows([{"Title": "b", "y": 2}])
+                self.assertTrue(path.with_name("report.csv.rows.jsonl").exists())
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(list(rows[0].keys()), ["Title", "x", "y"])
+            self.assertEqual([r["y"] for r in rows], ["", "2"])
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ["report.csv"])
+
+    def test_jsonl_rows_are_on_disk_before_close(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.jsonl"
+            report = ReportWriter(path, "jsonl")
+            report.write_rows([{"Title": "a"}])
+            report.flush()
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8")), {"Title": "a"})
+            report.close()
+
+    def test_sqlite_report_keeps_extra_fields_as_json(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.sqlite"
+            with ReportWriter(path, "sqlite") as report:
+                report.write_rows([{"Title": "a", "Match Type": "Unique", "views": "3"}])
+            conn = sqlite3.connect(str(path))
+            title, match_type, data = conn.execute(
+                'SELECT "Title", "Match Type", data FROM report'
+            ).fetchone()
+            indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            conn.close()
+            self.assertEqual((title, match_type), ("a", "Unique"))
+            self.assertEqual(json.loads(data), {"views": "3"})
+            self.assertIn("report_match_type", indexes)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ReportWriter("report.txt", "txt")
+
+    def test_process_metadata_files_writes_jsonl(self):
+        with TemporaryDirectory() as tmp:
+            report = Path(tmp) / "report.jsonl"
+            with patch("photo_metadata_patch.apply_metadata_batch"):
+                process_metadata_files(
+                    "tests", dry_run=True, parallel_workers=1, output_path=report,
+                    use_state=False, report_format="jsonl",
+                )
+            rows = [json.loads(line) for line in report.read_text(encoding="utf-8").splitlines()]
+            self.assertEqual(len(rows), 2)
+            self.assertTrue(all(row["Notes"] == "Dry run only" for row in rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
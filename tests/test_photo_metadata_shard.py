@@ -0,0 +1,127 @@
+import csv
+import json
+import shutil
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_patch import PipelineError
+from photo_metadata_report import ReportWriter, read_report
+from photo_metadata_shard import (
+    load_shard,
+    merge_shards,
+    parse_shard,
+    plan_manifest,
+    run_shard,
+    shard_report_path,
+    shard_state_filename,
+)
+from photo_metadata_state import RunState
+from helpers import FakePool
+
+
+def make_export(root):
+    """Ten photos in one folder plus two same-named copies in two albums."""
+    for i in range(10):
+        media = root / "Photos" / f"IMG_{i:04}.JPG"
+        media.parent.mkdir(parents=True, exist_ok=True)
+        media.write_bytes(f"jpeg {i}".encode())
+        media.with_name(media.name + ".supplemental-metadata.json").write_text(json.dumps({
+            "title": media.name,
+            "url": f"https://photos.google.com/photo/{i}",
+            "photoTakenTime": {"timestamp": str(1504122706 + i)},
+        }))
+    for album, content in (("Trip", b"one"), ("Party", b"two")):
+        media = root / album / "DSC_0001.JPG"
+        media.parent.mkdir()
+        media.write_bytes(content)
+        media.with_name(media.name + ".supplemental-metadata.json").write_text(json.dumps({
+            "title": "DSC_0001.JPG",
+            "url": f"https://photos.google.com/photo/{album}",
+            "photoTakenTime": {"timestamp": "1504122706"},
+        }))
+
+
+class TestShards(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/8"), (2, 8))
+        for bad in ("0/4", "5/4", "3", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_plan_keeps_duplicate_groups_together(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp) / "export"
+            make_export(root)
+            manifest = Path(tmp) / "manifest.jsonl"
+            sizes = plan_manifest(root, manifest, 3, workers=1)
+            self.assertEqual(sum(sizes.values()), 12)
+            self.assertLessEqual(max(sizes.values()) - min(sizes.values()), 2)
+
+            scans = [load_shard(manifest, i)[1] for i in (1, 2, 3)]
+            self.assertEqual(sum(len(scan.json_paths) for scan in scans), 12)
+            holders = [scan for scan in scans if "dsc_0001.jpg" in scan.media_index]
+            self.assertEqual(len(holders), 1)
+            self.assertEqual(len(holders[0].media_index["dsc_0001.jpg"]), 2)
+            self.assertEqual(len([p for p in holders[0].json_paths if p.name.startswith("DSC")]), 2)
+
+    def test_run_shards_then_merge(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp) / "export"
+            make_export(root)
+            manifest = Path(tmp) / "manifest.jsonl"
+            plan_manifest(root, manifest, 2, workers=1)
+
+            # The export moved between planning and running.
+            moved = Path(tmp) / "mounted" / "export"
+            shutil.move(str(root), moved)
+            submitted = []
+            with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch("photo_metadata_patch.read_tags", return_value={}):
+                for index in (1, 2):
+                    run_shard(manifest, (index, 2), root=moved, dry_run=False, parallel_workers=1,
+                              report_format="jsonl" if index == 2 else "csv")
+                    submitted += FakePool.submitted
+                    self.assertTrue((moved / shard_state_filename(index, 2)).exists())
+            # Each photo is written once; the two different DSC_0001 files are left alone.
+            self.assertEqual(len(submitted), 10)
+            self.assertEqual(len({cmd[-1] for cmd in submitted}), 10)
+
+            merged = merge_shards(manifest, Path(tmp) / "merged.csv", root=moved)
+            with open(merged, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            # Misleading duplicates get a row per candidate file.
+            self.assertEqual(len(rows), 14)
+            self.assertEqual(len({row["JSON Filename"] for row in rows}), 11)
+            with RunState(moved, readonly=True) as state:
+                self.assertEqual(len(state.records), 12)
+                self.assertEqual({r["outcome"] for r in state.records.values()}, {"done", "skipped"})
+
+    def test_merge_reports_missing_shards(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp) / "export"
+            make_export(root)
+            manifest = Path(tmp) / "manifest.jsonl"
+            plan_manifest(root, manifest, 2, workers=1)
+            with ReportWriter(shard_report_path(manifest, 1, 2)) as writer:
+                writer.write_rows([{"JSON Filename": "a.json"}])
+            with self.assertRaisesRegex(PipelineError, "shard\\(s\\) 2 of 2"):
+                merge_shards(manifest, Path(tmp) / "merged.csv")
+
+    def test_read_report_round_trips_every_format(self):
+        rows = [{"JSON Filename": "a.json", "Notes": "ok", "extra:field": "1"}]
+        with TemporaryDirectory() as tmp:
+            for fmt in ("csv", "jsonl", "sqlite"):
+                path = Path(tmp) / f"report.{fmt}"
+                with ReportWriter(path, fmt) as writer:
+                    writer.write_rows(rows)
+                read = list(read_report(path))
+                self.assertEqual(len(read), 1)
+                self.assertEqual((read[0]["Notes"], read[0]["extra:field"]), ("ok", "1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_patch import process_metadata_files
+from photo_metadata_state import RunState, STATE_FILENAME
+from helpers import FakePool, WritingPool
+
+
+def make_export(root):
+    album = root / "Album"
+    album.mkdir()
+    media = album / "IMG_0001.JPG"
+    media.write_bytes(b"jpeg")
+    sidecar = album / "IMG_0001.JPG.supplemental-metadata.json"
+    sidecar.write_text(json.dumps({
+        "title": "IMG_0001.JPG",
+        "url": "https://photos.google.com/photo/A",
+        "photoTakenTime": {"timestamp": "1504122706"},
+    }))
+    return media, sidecar
+
+
+class TestRunState(unittest.TestCase):
+    def run_patch(self, root, report, **kwargs):
+        FakePool.submitted = []
+        with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                patch("photo_metadata_patch.exiftool_unavailable", return_value=None):
+            process_metadata_files(
+                root, dry_run=False, parallel_workers=1, output_path=report, **kwargs
+            )
+        return FakePool.submitted
+
+    def test_rerun_skips_unchanged_pairs(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            media, sidecar = make_export(root)
+            report = root / "report.csv"
+
+            self.assertEqual(len(self.run_patch(root, report)), 1)
+            self.assertTrue((root / STATE_FILENAME).exists())
+            self.assertEqual(self.run_patch(root, report), [])
+
+            # The sidecar changed but the planned tags did not: nothing to rewrite.
+            os.utime(sidecar, (1, 1))
+            self.assertEqual(self.run_patch(root, report), [])
+
+            # The media changed behind our back: write it again.
+            media.write_bytes(b"jpeg, edited elsewhere")
+            self.assertEqual(len(self.run_patch(root, report)), 1)
+
+            with open(report, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([r["Matched Media"] for r in rows], ["IMG_0001.JPG"])
+
+    def test_rerun_keeps_identical_copies_classified(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for album in ("Album", "Copies"):
+                (root / album).mkdir()
+                (root / album / "IMG.JPG").write_bytes(b"jpeg")
+                (root / album / "IMG.JPG.supplemental-metadata.json").write_text(json.dumps({
+                    "title": "IMG.JPG",
+                    "url": f"https://photos.google.com/photo/{album}",
+                    "photoTakenTime": {"timestamp": "1504122706"},
+                }))
+            report = root / "report.csv"
+            with patch("photo_metadata_patch.ExifToolPool", WritingPool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None):
+                process_metadata_files(root, dry_run=False, parallel_workers=1, output_path=report,
+                                       read_check=False)
+                self.assertEqual(len(FakePool.submitted), 1)
+                first = report.read_text(encoding="utf-8")
+                process_metadata_files(root, dry_run=False, parallel_workers=1, output_path=report,
+                                       read_check=False)
+                self.assertEqual(FakePool.submitted, [])
+            self.assertEqual(report.read_text(encoding="utf-8"), first)
+            self.assertNotIn("Misleading", first)
+
+    def test_files_already_carrying_the_tags_are_not_rewritten(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            media, sidecar = make_export(root)
+            report = root / "report.csv"
+            current = {str(media): {
+                "ExifIFD:DateTimeOriginal": "2017:08:30 19:51:46",
+                "ExifIFD:CreateDate": "2017:08:30 19:51:46",
+                "IFD0:ModifyDate": "2017:08:30 19:51:46",
+                "IFD0:XPComment": "https://photos.google.com/photo/A  Device: Views:",
+            }}
+            with patch("photo_metadata_patch.read_tags", return_value=current):
+                self.assertEqual(self.run_patch(root, report, use_state=False), [])
+            with open(report, newline="", encoding="utf-8") as f:
+                row = next(csv.DictReader(f))
+            self.assertEqual((row["Notes"], row["Modified?"]), ("Already correct", "No"))
+
+            with patch("photo_metadata_patch.read_tags", return_value=current):
+                self.assertEqual(len(self.run_patch(root, report, use_state=False, read_check=False)), 1)
+
+    def test_interrupted_run_resumes(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_export(root)
+            report = root / "report.csv"
+            with patch("photo_metadata_patch.ExifToolPool", FakePool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch.object(FakePool, "submit", side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    process_metadata_files(
+                        root, dry_run=False, parallel_workers=1, output_path=report
+                    )
+            with RunState(root, readonly=True) as state:
+                self.assertEqual(
+                    [r["outcome"] for r in state.records.values()], ["planned"]
+                )
+            self.assertEqual(len(self.run_patch(root, report)), 1)
+
+    def test_report_only_uses_saved_rows(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_export(root)
+            self.run_patch(root, root / "first.csv")
+
+            rebuilt = root / "rebuilt.csv"
+            with patch("photo_metadata_patch.scan_export") as mock_scan:
+                process_metadata_files(root, output_path=rebuilt, report_only=True)
+                mock_scan.assert_not_called()
+            self.assertEqual(
+                rebuilt.read_text(encoding="utf-8"),
+                (root / "first.csv").read_text(encoding="utf-8"),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
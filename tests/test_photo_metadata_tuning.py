@@ -0,0 +1,156 @@
+import json
+import threading
+import unittest
+from collections import deque
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_exiftool import ExifToolPool
+from photo_metadata_patch import process_metadata_files, scan_export
+from photo_metadata_tuning import ConcurrencyTuner, locality_order, parse_worker_count, tuned_map
+from test_photo_metadata_exiftool import FakeExifTool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_window(tuner, clock, rate, latency=0.01):
+    """Complete items at rate per second until the tuner closes a window; return its answer."""
+    windows = len(tuner.history)
+    for _ in range(10 * rate):
+        clock.now += 1.0 / rate
+        changed = tuner.observe(latency)
+        if len(tuner.history) > windows:
+            return changed
+    return False
+
+
+class TestConcurrencyTuner(unittest.TestCase):
+    def test_doubles_while_throughput_improves_then_settles_on_best(self):
+        clock = FakeClock()
+        tuner = ConcurrencyTuner("parse", window=1.0, maximum=64, clock=clock)
+        for rate in (10, 20, 40):
+            self.assertTrue(run_window(tuner, clock, rate))
+        self.assertEqual(tuner.workers, 8)
+        # Eight workers are no faster than four: go back to four and stay there.
+        self.assertTrue(run_window(tuner, clock, 41))
+        self.assertTrue(tuner.settled)
+        self.assertEqual((tuner.workers, tuner.chosen), (4, 4))
+        self.assertFalse(run_window(tuner, clock, 100))
+        self.assertEqual([h["workers"] for h in tuner.history], [1, 2, 4, 8])
+
+    def test_stops_when_latency_explodes(self):
+        clock = FakeClock()
+        tuner = ConcurrencyTuner("exiftool", window=1.0, clock=clock)
+        run_window(tuner, clock, 10, latency=0.1)
+        run_window(tuner, clock, 20, latency=0.5)
+        self.assertTrue(tuner.settled)
+        self.assertEqual(tuner.workers, 1)
+
+    def test_pinned_count_never_changes(self):
+        clock = FakeClock()
+        tuner = ConcurrencyTuner("scan", pinned=3, clock=clock)
+        self.assertFalse(run_window(tuner, clock, 50))
+        self.assertEqual(tuner.to_dict(), {"workers": 3, "tuned": False, "settled": True, "history": []})
+
+    def test_parse_worker_count(self):
+        self.assertEqual(parse_worker_count("auto"), "auto")
+        self.assertEqual(parse_worker_count("6"), 6)
+        with self.assertRaises(ValueError):
+            parse_worker_count("0")
+
+
+class TestScheduling(unittest.TestCase):
+    def test_locality_order_groups_directories_by_inode(self):
+        a1, a2, b1 = Path("a/x.json"), Path("a/y.json"), Path("b/z.json")
+        inodes = {a1: 30, a2: 10, b1: 1}
+        self.assertEqual(locality_order([b1, a1, a2], inodes), [a2, a1, b1])
+
+    def test_tuned_map_accepts_work_added_while_running(self):
+        pending = deque([1])
+        seen = []
+        for item, result in tuned_map(lambda n: n * 2, pending, ConcurrencyTuner("t", pinned=4)):
+            seen.append(result)
+            if item < 5:
+                pending.extend([item + 1, item + 10])
+        self.assertEqual(sorted(seen), sorted(2 * n for n in [1, 2, 11, 3, 12, 4, 13, 5, 14]))
+
+    def test_concurrent_scan_matches_serial_scan(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for album in range(5):
+                folder = root / f"Album {album}" / "nested"
+                folder.mkdir(parents=True)
+                for i in range(3):
+                    (folder / f"IMG_{i}.JPG").write_bytes(b"x" * i)
+                    (folder / f"IMG_{i}.JPG.supplemental-metadata.json").write_text("{}")
+            serial = scan_export(root, {".jpg"})
+            concurrent = scan_export(root, {".jpg"}, tuner=ConcurrencyTuner("scan", pinned=4))
+            self.assertEqual(concurrent.file_stats, serial.file_stats)
+            self.assertEqual(concurrent.sidecar_index, serial.sidecar_index)
+            self.assertEqual(sorted(concurrent.json_paths), sorted(serial.json_paths))
+            self.assertEqual(set(concurrent.inodes), set(serial.file_stats))
+
+    def test_auto_workers_are_logged_in_metrics(self):
+        with TemporaryDirectory() as tmp:
+            metrics_path = Path(tmp) / "metrics.json"
+            with patch("photo_metadata_patch.apply_metadata_batch"), \
+                    patch("builtins.print") as mock_print:
+                process_metadata_files(
+                    "tests", dry_run=True, parallel_workers="auto", parse_workers=2,
+                    output_path=Path(tmp) / "r.csv", use_state=False, metrics_out=metrics_path,
+                )
+            concurrency = json.loads(metrics_path.read_text(encoding="utf-8"))["concurrency"]
+            self.assertTrue(concurrency["scan"]["tuned"])
+            self.assertEqual(concurrency["parse"], {"workers": 2, "tuned": False, "settled": True, "history": []})
+            self.assertNotIn("exiftool", concurrency)
+            printed = " ".join(str(call.args[0]) for call in mock_print.call_args_list if call.args)
+            self.assertIn("--parse-workers 2", printed)
+
+
+class StepTuner:
+    """Tuner double that asks for three workers, then drops back to one."""
+
+    def __init__(self):
+        self.workers = 1
+        self.maximum = 3
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def observe(self, latency=0.0, items=1):
+        with self.lock:
+            self.calls += 1
+            if self.calls == 2:
+                self.workers = 3
+                return True
+            if self.calls == 10:
+                self.workers = 1
+                return True
+            return False
+
+
+class TestTunedExifToolPool(unittest.TestCase):
+    def test_pool_grows_and_shrinks_with_its_tuner(self):
+        FakeExifTool.instances = []
+        with patch("photo_metadata_exiftool.ExifTool", FakeExifTool):
+            with ExifToolPool(tuner=StepTuner()) as pool:
+                futures = [pool.submit(["-AllDates=x", f"{i}.jpg"]) for i in range(10)]
+                for future in futures:
+                    future.result()
+                futures += [pool.submit(["-AllDates=x", f"{i}.jpg"]) for i in range(10, 40)]
+        for future in futures:
+            self.assertIsNone(future.result())
+        self.assertEqual(len(FakeExifTool.instances), 3)
+        executed = sorted(cmd[-1] for et in FakeExifTool.instances for cmd in et.executed)
+        self.assertEqual(executed, sorted(f"{i}.jpg" for i in range(40)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import csv
+import json
+import os
+import shutil
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from unittest.mock import patch
+
+from photo_metadata_watch import ExportWatcher, watch_export
+from helpers import FakePool
+
+
+def write_sidecar(path, title):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "title": title,
+        "url": f"https://photos.google.com/photo/{title}",
+        "photoTakenTime": {"timestamp": "1504122706"},
+    }))
+
+
+class TestExportWatcher(unittest.TestCase):
+    def test_files_are_indexed_once_they_stop_changing(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            media = root / "Part 1" / "IMG.JPG"
+            media.parent.mkdir()
+            media.write_bytes(b"half")
+            watcher = ExportWatcher(root)
+            self.assertEqual(watcher.poll(), ([], []))
+            with open(media, "ab") as f:
+                f.write(b" and the rest")
+            self.assertEqual(watcher.poll(), ([], []))
+            self.assertEqual(watcher.poll(), ([], [media]))
+            self.assertEqual(watcher.scan.media_index, {"img.jpg": [media]})
+
+            sidecar = root / "Part 1" / "IMG.JPG.supplemental-metadata.json"
+            write_sidecar(sidecar, "IMG.JPG")
+            watcher.poll()
+            self.assertEqual(watcher.poll(), ([sidecar], []))
+            self.assertEqual(watcher.scan.sidecar_index, {media: sidecar})
+
+            copy = root / "Part 2" / "IMG.JPG"
+            copy.parent.mkdir()
+            copy.write_bytes(b"copy")
+            watcher.poll()
+            watcher.poll()
+            self.assertEqual(sorted(watcher.scan.media_index["img.jpg"]), [media, copy])
+
+            os.remove(media)
+            watcher.poll()
+            self.assertEqual(watcher.scan.media_index, {"img.jpg": [copy]})
+            self.assertEqual(watcher.scan.sidecar_index, {})
+            self.assertEqual(watcher.scan.json_paths, [sidecar])
+
+            os.remove(sidecar)
+            shutil.rmtree(copy.parent)
+            watcher.poll()
+            self.assertEqual(watcher.scan.media_index, {})
+            self.assertEqual(watcher.scan.json_paths, [])
+
+
+class TestWatchExport(unittest.TestCase):
+    def test_pairs_are_patched_as_their_halves_arrive(self):
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            write_sidecar(root / "Part 1" / "IMG_A.JPG.supplemental-metadata.json", "IMG_A.JPG")
+            # Parked by an earlier run that could not find the photo.
+            write_sidecar(root / "Unmatched_Metadata" / "IMG_B.JPG.supplemental-metadata.json", "IMG_B.JPG")
+
+            def second_part_lands():
+                (root / "Part 2").mkdir()
+                (root / "Part 2" / "IMG_A.JPG").write_bytes(b"a")
+                (root / "Part 2" / "IMG_B.JPG").write_bytes(b"b")
+
+            steps = [lambda: None, second_part_lands, lambda: None]
+            submitted = []
+
+            class RecordingPool(FakePool):
+                def submit(self, cmd):
+                    submitted.append(cmd)
+                    return super().submit(cmd)
+
+            report = root / "report.csv"
+            with patch("photo_metadata_patch.ExifToolPool", RecordingPool), \
+                    patch("photo_metadata_patch.exiftool_unavailable", return_value=None), \
+                    patch("photo_metadata_patch.read_tags", return_value={}):
+                processed = watch_export(
+                    root, max_polls=4, sleep=lambda _: steps.pop(0)(), output_path=report,
+                    dry_run=False, parallel_workers=1,
+                )
+            self.assertEqual(processed, 2)
+            # Both photos were written while watching; the final reconciliation wrote nothing.
+            self.assertEqual(sorted(Path(cmd[-1]).name for cmd in submitted), ["IMG_A.JPG", "IMG_B.JPG"])
+            with open(report, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(sorted(row["Matched Media"] for row in rows), ["IMG_A.JPG", "IMG_B.JPG"])
+            self.assertTrue((root / "Part 1" / "IMG_A.JPG.supplemental-metadata.json").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()